@@ -1,9 +1,13 @@
 import os
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterator
+from typing import Any, Callable, Iterator
+
+from app.metrics import METRICS_ENABLED, record_db, record_fetch
 
 
 DEFAULT_DB_PATH = Path(__file__).resolve().parent / "lights.db"
@@ -14,21 +18,212 @@ SEED_RESTAURANT_ID = 1
 SEED_INITIAL_STATE = "off"
 SEED_INITIAL_BRIGHTNESS = 0
 
+# Connection tuning (applied once per pooled connection, not per request)
+SQLITE_JOURNAL_MODE = "WAL"  # readers never block on the writer
+SQLITE_SYNCHRONOUS = "NORMAL"  # safe with WAL; fsync only at checkpoints
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("LIGHTS_DB_CACHE_SIZE_KIB", "16384"))
+SQLITE_MMAP_SIZE_BYTES = int(os.getenv("LIGHTS_DB_MMAP_SIZE_BYTES", str(128 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("LIGHTS_DB_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+
+# Secondary indexes owned by init_db(): table -> {index name: indexed columns}.
+# The rowid (light_history.id) is implicitly the last key of every index.
+SQLITE_INDEXES: dict[str, dict[str, str]] = {
+    "restaurant_lights": {
+        "idx_restaurant_lights_last_updated": "last_updated",  # SQLitePollingSource change feed
+    },
+    "light_history": {
+        "idx_light_history_restaurant_timestamp": "restaurant_id, timestamp",
+        "idx_light_history_timestamp": "timestamp",
+    },
+    "telemetry": {
+        "idx_telemetry_restaurant_timestamp": "restaurant_id, timestamp",
+        "idx_telemetry_timestamp": "timestamp",  # rollup passes read by time across devices
+    },
+}
+
+
+# Called with each new pooled connection, e.g. to attach a statement tracer
+CONNECTION_HOOKS: list[Callable[[sqlite3.Connection], None]] = []
+
+
+def add_connection_hook(hook: Callable[[sqlite3.Connection], None]) -> None:
+    """Register before the first query; connections already open are not revisited."""
+    CONNECTION_HOOKS.append(hook)
+
+
+# SQL text -> leading keyword, the operation label of db_operation_seconds
+_SQL_VERBS: dict[str, str] = {}
+
+
+def _sql_verb(sql: str) -> str:
+    verb = _SQL_VERBS.get(sql)
+    if verb is None:
+        verb = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "EMPTY"
+        if len(_SQL_VERBS) < 1024:  # SQL is parameterized; only PRAGMAs and DDL vary
+            _SQL_VERBS[sql] = verb
+    return verb
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Times each statement as one round trip and counts the rows it modified or
+    fetched (fetchone/fetchmany/fetchall; plain iteration is not counted).
+    """
+
+    _verb = ""
+
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._verb = _sql_verb(sql)
+            record_db("sqlite", self._verb, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._verb = _sql_verb(sql)
+            record_db("sqlite", self._verb, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def fetchone(self) -> Any:
+        started = time.perf_counter()
+        row = super().fetchone()
+        record_fetch("sqlite", self._verb, time.perf_counter() - started, row is not None)
+        return row
+
+    def fetchmany(self, size: int | None = None) -> list[Any]:
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        record_fetch("sqlite", self._verb, time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self) -> list[Any]:
+        started = time.perf_counter()
+        rows = super().fetchall()
+        record_fetch("sqlite", self._verb, time.perf_counter() - started, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """conn.execute() and conn.cursor() both go through InstrumentedCursor."""
+
+    def cursor(self, factory: Any = InstrumentedCursor) -> Any:
+        return super().cursor(factory)
+
+    # The C shortcuts create a plain Cursor, bypassing cursor() above
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> sqlite3.Cursor:
+        return self.cursor().executemany(sql, seq_of_parameters)
+
 
 def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+class SQLiteConnectionPool:
+    """
+    One long-lived connection per thread, opened lazily and reused for every
+    repository call on that thread. FastAPI runs sync handlers on a threadpool,
+    so this keeps connection setup (mkdir, open, pragmas) off the hot path.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        self._directory_ready = False
+
+    def _open(self) -> sqlite3.Connection:
+        if not self._directory_ready:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._directory_ready = True
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,  # closed from the shutdown thread
+            cached_statements=SQLITE_STATEMENT_CACHE_SIZE,
+            factory=InstrumentedConnection if METRICS_ENABLED else sqlite3.Connection,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE_BYTES}")
+        conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        for hook in CONNECTION_HOOKS:
+            hook(conn)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yield this thread's connection. Only the outermost block commits, so
+        nested repository calls share one transaction.
+        """
+        conn = self.acquire()
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.rollback()
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.commit()
+
+    @property
+    def size(self) -> int:
+        return len(self._connections)
+
+    def close_all(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error:
+                pass
+        # Threads that come back after shutdown (tests, reloads) reopen lazily.
+        self._local = threading.local()
+
+
+_pool = SQLiteConnectionPool(DB_PATH)
+
+
+def get_pool() -> SQLiteConnectionPool:
+    return _pool
+
+
 @contextmanager
 def get_connection() -> Iterator[sqlite3.Connection]:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
+    with _pool.connection() as conn:
         yield conn
-        conn.commit()
-    finally:
-        conn.close()
+
+
+def close_all_connections() -> None:
+    """Shutdown hook: close every pooled connection (wired into the FastAPI lifespan)."""
+    _pool.close_all()
 
 
 def init_db() -> None:
@@ -56,6 +251,52 @@ def init_db() -> None:
             )
             """
         )
+        # Time_Data readings for the placeholder, keyed by restaurant_id
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS telemetry (
+                restaurant_id INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                voltage REAL NOT NULL,
+                current REAL NOT NULL,
+                power REAL NOT NULL,
+                uptime INTEGER NOT NULL
+            )
+            """
+        )
+        # 1m/1h/1d aggregates from app.services.rollups; resolution is the bucket width in seconds
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS telemetry_rollups (
+                restaurant_id INTEGER NOT NULL,
+                resolution INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                v_min REAL NOT NULL,
+                v_max REAL NOT NULL,
+                v_sum REAL NOT NULL,
+                i_min REAL NOT NULL,
+                i_max REAL NOT NULL,
+                i_sum REAL NOT NULL,
+                p_min REAL NOT NULL,
+                p_max REAL NOT NULL,
+                p_sum REAL NOT NULL,
+                wh REAL NOT NULL,
+                PRIMARY KEY (restaurant_id, resolution, bucket)
+            ) WITHOUT ROWID
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS telemetry_rollup_state (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            """
+        )
+        for table, indexes in SQLITE_INDEXES.items():
+            for index_name, columns in indexes.items():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
         cursor.execute(
             """
             INSERT OR IGNORE INTO restaurant_lights (
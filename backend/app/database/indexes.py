@@ -0,0 +1,255 @@
+"""
+Index bootstrapper for the SD_IoT collections and the SQLite placeholder schema.
+
+Runs at startup (see app.main lifespan). INDEX_BOOTSTRAP_MODE controls it:
+  create - create missing indexes, then verify and log the report (default)
+  check  - only verify; fail fast with IndexCheckError if any index is missing
+  off    - skip entirely
+Can also be run by hand: python -m app.database.indexes [--check]
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Any
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.database import Database
+
+from app.database.db import SQLITE_INDEXES, get_connection
+from app.models.collections import CollectionNames
+
+logger = logging.getLogger(__name__)
+
+INDEX_BOOTSTRAP_MODE = os.getenv("INDEX_BOOTSTRAP_MODE", "create")
+MODE_CREATE = "create"
+MODE_CHECK = "check"
+MODE_OFF = "off"
+
+# The default index every MongoDB collection has; never reported as unused
+MONGO_ID_INDEX_NAME = "_id_"
+
+
+@dataclass(frozen=True)
+class MongoIndexSpec:
+    name: str
+    keys: tuple[tuple[str, int], ...]
+    unique: bool = False
+    sparse: bool = False
+
+    def to_model(self) -> IndexModel:
+        return IndexModel(list(self.keys), name=self.name, unique=self.unique, sparse=self.sparse)
+
+
+# Indexes backing every query the repositories run, keyed by collection.
+MONGO_INDEXES: dict[str, tuple[MongoIndexSpec, ...]] = {
+    CollectionNames.DEVICES: (
+        # _device_for_restaurant_id: find_one({"legacyId": ...}) through the prefix;
+        # get_light_version: covered find_one({"legacyId": ...}, {"_id": 0, "updatedAt": 1})
+        MongoIndexSpec(
+            "legacyId_1_updatedAt_1", (("legacyId", ASCENDING), ("updatedAt", ASCENDING)), sparse=True
+        ),
+        # MongoPollingSource: find({"updatedAt": {"$gte": mark}}).sort("updatedAt")
+        MongoIndexSpec("updatedAt_1", (("updatedAt", ASCENDING),)),
+    ),
+    CollectionNames.SCHEDULES: (
+        # get_full_schedule / save_full_schedule: find_one({"deviceId": ...})
+        MongoIndexSpec("deviceId_1", (("deviceId", ASCENDING),)),
+        # get_schedule_version: covered find_one({"deviceId": ...}, {"_id": 0, "updatedAt": 1})
+        MongoIndexSpec("deviceId_1_updatedAt_1", (("deviceId", ASCENDING), ("updatedAt", ASCENDING))),
+        # MongoPollingSource: find({"updatedAt": {"$gte": mark}}).sort("updatedAt")
+        MongoIndexSpec("updatedAt_1", (("updatedAt", ASCENDING),)),
+    ),
+    CollectionNames.LIGHT_HISTORY: (
+        # get_history(restaurant_id): filter legacyId, keyset on (timestamp, _id) desc
+        MongoIndexSpec(
+            "legacyId_1_timestamp_-1__id_-1",
+            (("legacyId", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)),
+        ),
+        # get_history(): whole fleet, keyset on (timestamp, _id) desc;
+        # MongoPollingSource reads it forward from its timestamp mark
+        MongoIndexSpec("timestamp_-1__id_-1", (("timestamp", DESCENDING), ("_id", DESCENDING))),
+    ),
+    CollectionNames.TIME_DATA: (
+        MongoIndexSpec(
+            "metadata.deviceId_1_timestamp_1",
+            (("metadata.deviceId", ASCENDING), ("timestamp", ASCENDING)),
+        ),
+    ),
+    CollectionNames.TIME_DATA_ROLLUPS: (
+        # rollup merges (upsert key) and GET /telemetry/{restaurantId} bucket ranges
+        MongoIndexSpec(
+            "deviceId_1_resolution_1_bucket_1",
+            (("deviceId", ASCENDING), ("resolution", ASCENDING), ("bucket", ASCENDING)),
+            unique=True,
+        ),
+    ),
+}
+
+
+# Collections that need options at creation time. Time_Data is a time-series
+# collection bucketed by metadata (the device), filled by app.services.telemetry.
+MONGO_COLLECTION_OPTIONS: dict[str, dict[str, Any]] = {
+    CollectionNames.TIME_DATA: {
+        "timeseries": {"timeField": "timestamp", "metaField": "metadata", "granularity": "seconds"},
+    },
+}
+
+
+class IndexCheckError(RuntimeError):
+    """Raised in check mode when a required index is missing."""
+
+
+@dataclass
+class IndexReport:
+    backend: str
+    missing: list[str] = field(default_factory=list)
+    unused: list[str] = field(default_factory=list)
+    unexpected: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing
+
+    def log(self) -> None:
+        for name in self.missing:
+            logger.warning("%s: missing index %s", self.backend, name)
+        for name in self.unused:
+            logger.info("%s: index %s has not been used since server start", self.backend, name)
+        for name in self.unexpected:
+            logger.info("%s: index %s is not managed by the bootstrapper", self.backend, name)
+
+
+# ---------------------------------------------------------------------------
+# MongoDB
+# ---------------------------------------------------------------------------
+
+def ensure_mongo_collections(db: Database) -> None:
+    """Create collections that need options; an existing collection is left as it is."""
+    existing = set(db.list_collection_names())
+    for collection_name, options in MONGO_COLLECTION_OPTIONS.items():
+        if collection_name not in existing:
+            db.create_collection(collection_name, **options)
+
+
+def ensure_mongo_indexes(db: Database) -> None:
+    for collection_name, specs in MONGO_INDEXES.items():
+        db[collection_name].create_indexes([spec.to_model() for spec in specs])
+
+
+def verify_mongo_indexes(db: Database) -> IndexReport:
+    report = IndexReport(backend="mongodb")
+    existing_collections = set(db.list_collection_names())
+    for collection_name, specs in MONGO_INDEXES.items():
+        if collection_name not in existing_collections:
+            report.missing.extend(f"{collection_name}.{spec.name}" for spec in specs)
+            continue
+        collection = db[collection_name]
+        existing = {info["name"]: info for info in collection.list_indexes()}
+        expected_names = {spec.name for spec in specs}
+        for spec in specs:
+            info = existing.get(spec.name)
+            if info is None or list(info["key"].items()) != list(spec.keys):
+                report.missing.append(f"{collection_name}.{spec.name}")
+        for name in existing:
+            if name != MONGO_ID_INDEX_NAME and name not in expected_names:
+                report.unexpected.append(f"{collection_name}.{name}")
+        report.unused.extend(_unused_mongo_indexes(collection))
+    return report
+
+
+def _unused_mongo_indexes(collection: Any) -> list[str]:
+    try:
+        stats = list(collection.aggregate([{"$indexStats": {}}]))
+    except Exception:  # $indexStats needs clusterMonitor on Atlas shared tiers
+        return []
+    return [
+        f"{collection.name}.{stat['name']}"
+        for stat in stats
+        if stat["name"] != MONGO_ID_INDEX_NAME and int(stat.get("accesses", {}).get("ops", 0)) == 0
+    ]
+
+
+# ---------------------------------------------------------------------------
+# SQLite
+# ---------------------------------------------------------------------------
+
+def verify_sqlite_indexes() -> IndexReport:
+    """SQLite keeps no usage statistics, so only missing/unexpected are reported."""
+    report = IndexReport(backend="sqlite")
+    with get_connection() as conn:
+        for table, indexes in SQLITE_INDEXES.items():
+            existing = {
+                row["name"]: row["origin"]
+                for row in conn.execute(f"PRAGMA index_list({table})")
+            }
+            for index_name, columns in indexes.items():
+                if index_name not in existing:
+                    report.missing.append(f"{table}.{index_name}")
+                    continue
+                indexed = [row["name"] for row in conn.execute(f"PRAGMA index_info({index_name})")]
+                if indexed != [column.strip() for column in columns.split(",")]:
+                    report.missing.append(f"{table}.{index_name}")
+            for index_name, origin in existing.items():
+                # origin "c" = CREATE INDEX; "pk"/"u" are implicit constraint indexes
+                if origin == "c" and index_name not in indexes:
+                    report.unexpected.append(f"{table}.{index_name}")
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Startup entry point
+# ---------------------------------------------------------------------------
+
+def bootstrap_indexes(mode: str = INDEX_BOOTSTRAP_MODE) -> IndexReport | None:
+    """
+    Create and/or verify indexes for the active backend (MongoDB when
+    MONGODB_URI is set, otherwise SQLite). SQLite indexes are created by
+    init_db(), so create mode only verifies them here.
+    """
+    if mode == MODE_OFF:
+        return None
+    if mode not in (MODE_CREATE, MODE_CHECK):
+        raise ValueError(f"INDEX_BOOTSTRAP_MODE must be create, check or off (got {mode!r})")
+
+    if os.getenv("MONGODB_URI"):
+        from app.database.mongo import get_mongo_db
+
+        db = get_mongo_db()
+        if mode == MODE_CREATE:
+            ensure_mongo_collections(db)
+            ensure_mongo_indexes(db)
+        report = verify_mongo_indexes(db)
+    else:
+        report = verify_sqlite_indexes()
+
+    report.log()
+    if mode == MODE_CHECK and not report.ok:
+        raise IndexCheckError(
+            f"{report.backend} is missing required indexes: {', '.join(report.missing)}"
+        )
+    return report
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    check_only = "--check" in sys.argv[1:]
+    if not os.getenv("MONGODB_URI"):
+        from app.database.db import init_db
+
+        init_db()
+    try:
+        result = bootstrap_indexes(MODE_CHECK if check_only else MODE_CREATE)
+    except IndexCheckError as exc:
+        print(exc)
+        sys.exit(1)
+    if result is not None:
+        print(
+            f"{result.backend}: {len(result.missing)} missing, "
+            f"{len(result.unused)} unused, {len(result.unexpected)} unexpected"
+        )
@@ -4,15 +4,30 @@ MongoDB connection for SD_IoT database. Set MONGODB_URI and optional MONGODB_DB_
 from __future__ import annotations
 
 import os
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.asynchronous.database import AsyncDatabase
 from pymongo.database import Database
 
+from app.metrics import mongo_event_listeners
+
 MONGODB_URI = os.getenv("MONGODB_URI", "")
 MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "SD_IoT")
 
+# Shared by the sync and async clients
+MONGO_CLIENT_OPTIONS: dict[str, Any] = {
+    "maxPoolSize": 10,
+    "minPoolSize": 1,
+    "maxIdleTimeMS": 60000,
+    "retryWrites": True,
+    "retryReads": True,
+    # Command timings and pool usage for /metrics; listeners are fixed at client creation
+    "event_listeners": mongo_event_listeners(),
+}
+
 _client: MongoClient | None = None
+_async_client: AsyncMongoClient | None = None
 
 
 def get_mongo_client() -> MongoClient:
@@ -20,16 +35,34 @@ def get_mongo_client() -> MongoClient:
         raise RuntimeError("MONGODB_URI is not set; add it to .env to use MongoDB.")
     global _client
     if _client is None:
-        _client = MongoClient(
-        MONGODB_URI,
-        maxPoolSize=10,          
-        minPoolSize=1,           
-        maxIdleTimeMS=60000,     
-        retryWrites=True,          
-        retryReads=True          
-        )
+        _client = MongoClient(MONGODB_URI, **MONGO_CLIENT_OPTIONS)
     return _client
 
 
 def get_mongo_db() -> Database:
     return get_mongo_client()[MONGODB_DB_NAME]
+
+
+def get_async_mongo_client() -> AsyncMongoClient:
+    """Native asyncio client used by the request path; connects lazily on first use."""
+    if not MONGODB_URI:
+        raise RuntimeError("MONGODB_URI is not set; add it to .env to use MongoDB.")
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(MONGODB_URI, **MONGO_CLIENT_OPTIONS)
+    return _async_client
+
+
+def get_async_mongo_db() -> AsyncDatabase:
+    return get_async_mongo_client()[MONGODB_DB_NAME]
+
+
+async def close_mongo_clients() -> None:
+    """Shutdown hook for the FastAPI lifespan."""
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -1,14 +1,90 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from dotenv import load_dotenv
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
 load_dotenv()
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database.db import init_db
-from app.routes.lights import router as lights_router
+from app.database.db import close_all_connections, get_pool, init_db
+from app.database.indexes import bootstrap_indexes
+from app.database.mongo import close_mongo_clients
+from app.metrics import (
+    METRICS_CONTENT_TYPE,
+    METRICS_ENABLED,
+    SERVER_TIMING_HEADER,
+    Callback,
+    MetricsMiddleware,
+    register_stats,
+    registry,
+)
+from app.routes.lights import (
+    NEXT_CURSOR_HEADER,
+    command_dispatcher,
+    event_bus,
+    fanout,
+    history_writer,
+    router as lights_router,
+    scheduler,
+    service,
+    status_cache,
+)
+from app.routes.telemetry import (
+    analytics as telemetry_analytics,
+    archiver,
+    ingestor as telemetry_ingestor,
+    mqtt_subscriber,
+    rollups as telemetry_rollups,
+    router as telemetry_router,
+)
+from app.services.archive import ARCHIVE_ENABLED
+from app.services.events import default_source
+from app.services.rollups import TELEMETRY_ROLLUPS_ENABLED
+from app.services.scheduler import SCHEDULER_ENABLED
 
-app = FastAPI(title="Restaurant Lighting API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    init_db()
+    bootstrap_indexes()
+    await history_writer.start()
+    if status_cache is not None:
+        await status_cache.start()
+    if command_dispatcher is not None:
+        await command_dispatcher.start()
+    await telemetry_ingestor.start()
+    if mqtt_subscriber is not None:
+        await mqtt_subscriber.start()
+    await event_bus.start(default_source())
+    if SCHEDULER_ENABLED:
+        await scheduler.start()
+    if TELEMETRY_ROLLUPS_ENABLED:
+        await telemetry_rollups.start()
+    if ARCHIVE_ENABLED:
+        await archiver.start()
+    yield
+    await archiver.stop()
+    await telemetry_rollups.stop()
+    await scheduler.stop()
+    await event_bus.stop()
+    await fanout.shutdown()
+    if command_dispatcher is not None:
+        await command_dispatcher.stop()
+    telemetry_analytics.shutdown()
+    if mqtt_subscriber is not None:
+        await mqtt_subscriber.stop()
+    await telemetry_ingestor.close()
+    await history_writer.close()  # flush buffered history before the clients close
+    if status_cache is not None:
+        await status_cache.close()
+    await close_mongo_clients()
+    close_all_connections()
+
+
+app = FastAPI(title="Restaurant Lighting API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,12 +92,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified", SERVER_TIMING_HEADER],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)  # outermost, so it times CORS and errors too
+    registry.register(Callback("sqlite_pool_connections", "gauge", "Open SQLite connections (one per thread)",
+                               lambda: get_pool().size))
+    register_stats("history_writer", "Background history writer", history_writer.stats,
+                   counters=("written", "batches", "dropped"), gauges=("pending",))
+    if status_cache is not None:
+        register_stats("status_cache", "Light status cache", status_cache.stats,
+                       counters=("hits", "redisHits", "misses", "coalesced", "evictions", "redisErrors"),
+                       gauges=("size", "hitRatio"))
+    device_cache = getattr(service.repository, "device_cache", None)
+    if device_cache is not None:
+        register_stats("device_cache", "Mongo device resolution cache", device_cache.stats,
+                       counters=("hits", "misses", "evictions"), gauges=("size", "hitRatio"))
+    if command_dispatcher is not None:
+        register_stats("commands", "Device command dispatcher", command_dispatcher.stats,
+                       counters=("published", "acked", "failed", "coalesced"), gauges=("queued", "inflight"))
 
-@app.on_event("startup")
-def on_startup() -> None:
-    init_db()
+    @app.get("/metrics", include_in_schema=False)
+    def metrics() -> PlainTextResponse:
+        return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 
 @app.get("/health")
@@ -30,3 +124,4 @@ def health() -> dict[str, str]:
 
 
 app.include_router(lights_router)
+app.include_router(telemetry_router)
@@ -0,0 +1,430 @@
+"""
+Request and database instrumentation, served from GET /metrics in the
+Prometheus text format (0.0.4) without the prometheus_client dependency.
+
+What is recorded:
+  http_request_duration_seconds   per method, route template and status
+  http_request_db_*               DB time, round trips and rows of each request
+  db_operation_seconds / db_rows  per backend and operation: MongoDB commands
+                                  (CommandListener) and SQLite statements
+                                  (InstrumentedConnection in app.database.db)
+  light_repository_seconds        per repository method (instrument_repository)
+  pool, cache and queue gauges    read from the live objects at scrape time
+
+Each request gets a RequestStats through a context variable, which follows
+the request into asyncio.to_thread workers and pymongo's listener callbacks, so
+DB time and round trips are attributed to the request that caused them. The
+Server-Timing response header reports them:
+  Server-Timing: db;dur=1.832;desc="round_trips=3, rows=12", app;dur=4.107
+
+Recording an operation is a context-variable read, a bisect and a few
+increments under an uncontended lock: about 1-2 microseconds. METRICS_ENABLED=0
+turns all of it off.
+
+This module sits below both app.database and app.services (it imports neither),
+so the connection code can record into it without depending on the service layer.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+from pymongo import monitoring
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SERVER_TIMING_HEADER = "Server-Timing"
+
+# Seconds; request buckets reach further than single DB operations
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OPERATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250, 1000, 10000)
+# Requests no route matched share one label instead of one per probed URL
+UNMATCHED_ROUTE = "unmatched"
+
+
+# ---------------------------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Metrics are written from outside the event loop too: every SQLite statement
+# runs (and is recorded by InstrumentedConnection) in the asyncio.to_thread
+# pool, and paho's MQTT network thread runs the telemetry subscriber and
+# command publisher callbacks. So each update takes a lock.
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "lock")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = REQUEST_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._children: dict[tuple[str, ...], _HistogramChild] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.labels(*labels).observe(value)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, child in list(self._children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Callback:
+    """Gauge or counter whose value is read from a live object at scrape time (no hot-path cost)."""
+
+    def __init__(self, name: str, kind: str, help: str,
+                 read: Callable[[], float | dict[str, float] | None], labelname: str = "") -> None:
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.read = read
+        self.labelname = labelname
+
+    def render(self) -> Iterable[str]:
+        value = self.read()
+        if value is None:
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        if isinstance(value, dict):
+            for label, sample in value.items():
+                yield f"{self.name}{_labels((self.labelname,), (label,))} {_number(sample)}"
+        else:
+            yield f"{self.name} {_number(value)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Histogram | Counter | Callback] = {}
+
+    def register(self, metric: Any) -> Any:
+        self._metrics[metric.name] = metric  # re-registering replaces, e.g. after a reload
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body", ("method", "route", "status")
+))
+REQUEST_DB_SECONDS = registry.register(Histogram(
+    "http_request_db_seconds", "Database time spent by one request", ("route",), OPERATION_BUCKETS
+))
+REQUEST_ROUND_TRIPS = registry.register(Histogram(
+    "http_request_db_round_trips", "Database round trips made by one request", ("route",), COUNT_BUCKETS
+))
+REQUEST_ROWS = registry.register(Histogram(
+    "http_request_db_rows", "Rows or documents read and written by one request", ("route",), COUNT_BUCKETS
+))
+DB_OPERATION_SECONDS = registry.register(Histogram(
+    "db_operation_seconds", "One MongoDB command or SQLite statement", ("backend", "operation"), OPERATION_BUCKETS
+))
+DB_ROWS = registry.register(Counter(
+    "db_rows_total", "Rows or documents returned or modified", ("backend", "operation")
+))
+DB_ERRORS = registry.register(Counter("db_errors_total", "Failed MongoDB commands", ("backend", "operation")))
+REPOSITORY_SECONDS = registry.register(Histogram(
+    "light_repository_seconds", "LightService repository calls", ("method",), OPERATION_BUCKETS
+))
+
+
+# ---------------------------------------------------------------------------
+# Per-request database accounting
+# ---------------------------------------------------------------------------
+
+@dataclass(slots=True)
+class RequestStats:
+    db_seconds: float = 0.0
+    round_trips: int = 0
+    rows: int = 0
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def record_db(backend: str, operation: str, seconds: float, rows: int = 0) -> None:
+    """One round trip (a command or statement) taking `seconds`."""
+    DB_OPERATION_SECONDS.labels(backend, operation).observe(seconds)
+    if rows:
+        DB_ROWS.inc(rows, backend, operation)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+        stats.round_trips += 1
+        stats.rows += rows
+
+
+def record_fetch(backend: str, operation: str, seconds: float, rows: int) -> None:
+    """Rows fetched after the statement's round trip (SQLite steps lazily)."""
+    if rows:
+        DB_ROWS.inc(rows, backend, operation)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+        stats.rows += rows
+
+
+def _reply_rows(reply: dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+    value = reply.get("value")  # findAndModify
+    if value is not None:
+        return 1
+    return int(reply.get("n", 0) or 0)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Passed to the Mongo clients as an event listener."""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        record_db("mongo", event.command_name, event.duration_micros / 1_000_000, _reply_rows(event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        record_db("mongo", event.command_name, event.duration_micros / 1_000_000)
+        DB_ERRORS.inc(1, "mongo", event.command_name)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Open and checked-out connections across the Mongo clients' pools, locked
+    like the other counters in this module (see _HistogramChild).
+    """
+
+    def __init__(self) -> None:
+        self.open = 0
+        self.checked_out = 0
+        self.wait_failures = 0
+        self._lock = threading.Lock()
+
+    def connection_created(self, event: Any) -> None:
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event: Any) -> None:
+        with self._lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event: Any) -> None:
+        with self._lock:
+            self.checked_out += 1
+
+    def connection_checked_in(self, event: Any) -> None:
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_failed(self, event: Any) -> None:
+        with self._lock:
+            self.wait_failures += 1
+
+    def pool_created(self, event: Any) -> None:
+        pass
+
+    def pool_ready(self, event: Any) -> None:
+        pass
+
+    def pool_cleared(self, event: Any) -> None:
+        pass
+
+    def pool_closed(self, event: Any) -> None:
+        pass
+
+    def connection_ready(self, event: Any) -> None:
+        pass
+
+    def connection_check_out_started(self, event: Any) -> None:
+        pass
+
+
+mongo_pool = MongoPoolMetrics()
+registry.register(Callback("mongodb_pool_connections", "gauge", "Open MongoDB connections",
+                           lambda: mongo_pool.open if METRICS_ENABLED else None))
+registry.register(Callback("mongodb_pool_checked_out", "gauge", "MongoDB connections in use",
+                           lambda: mongo_pool.checked_out if METRICS_ENABLED else None))
+
+
+def mongo_event_listeners() -> list[Any]:
+    """For MONGO_CLIENT_OPTIONS; listeners must be given when a client is created."""
+    return [MongoCommandMetrics(), mongo_pool] if METRICS_ENABLED else []
+
+
+# ---------------------------------------------------------------------------
+# Repository methods
+# ---------------------------------------------------------------------------
+
+def _timed(method: Callable[..., Awaitable[Any]], name: str) -> Callable[..., Awaitable[Any]]:
+    histogram = REPOSITORY_SECONDS.labels(name)
+
+    @functools.wraps(method)
+    async def timed(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return timed
+
+
+def instrument_repository(repository: Any) -> Any:
+    """
+    Time every public coroutine method of this repository instance. The
+    wrappers are instance attributes, so everything holding the instance
+    (service, fan-out, scheduler) is measured and attributes set on it later
+    still land on the real object.
+    """
+    for name, method in inspect.getmembers(type(repository), inspect.iscoroutinefunction):
+        if not name.startswith("_"):
+            setattr(repository, name, _timed(getattr(repository, name), name))
+    return repository
+
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: route latency, per-request DB stats and the Server-Timing header."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = (
+                    f'db;dur={stats.db_seconds * 1000:.3f};desc="round_trips={stats.round_trips}, '
+                    f'rows={stats.rows}", app;dur={(time.perf_counter() - started) * 1000:.3f}'
+                )
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", UNMATCHED_ROUTE)
+            REQUEST_SECONDS.labels(scope["method"], path, str(status)).observe(time.perf_counter() - started)
+            REQUEST_DB_SECONDS.labels(path).observe(stats.db_seconds)
+            REQUEST_ROUND_TRIPS.labels(path).observe(stats.round_trips)
+            REQUEST_ROWS.labels(path).observe(stats.rows)
+
+
+def register_stats(prefix: str, help: str, read: Callable[[], dict[str, Any] | None],
+                   counters: tuple[str, ...] = (), gauges: tuple[str, ...] = ()) -> None:
+    """
+    Export fields of an object's stats() dict: each counter as
+    <prefix>_<field>_total, each gauge as <prefix>_<field>.
+    """
+    def field(name: str) -> Callable[[], float | None]:
+        def read_field() -> float | None:
+            stats = read()
+            return None if stats is None else float(stats[name])
+        return read_field
+
+    for name in counters:
+        registry.register(Callback(f"{prefix}_{_snake(name)}_total", "counter", f"{help}: {name}", field(name)))
+    for name in gauges:
+        registry.register(Callback(f"{prefix}_{_snake(name)}", "gauge", f"{help}: {name}", field(name)))
+
+
+def _snake(name: str) -> str:
+    return "".join(f"_{char.lower()}" if char.isupper() else char for char in name)
@@ -51,12 +51,24 @@ class LastReading(BaseModel):
     power: float = Field(..., alias="P", description="Power")
 
 
+class LastCommand(BaseModel):
+    """Newest light command published to the device, in status.lastCommand."""
+    id: str = Field(..., description="commandId sent in the MQTT payload")
+    state: str = Field(..., description="Commanded light state")
+    brightness: int = Field(..., description="Commanded brightness")
+    sentAt: datetime = Field(..., description="When the command was published")
+    ackedAt: datetime | None = Field(None, description="When the device acknowledged it")
+    ok: bool | None = Field(None, description="Device result; None until acknowledged")
+    error: str | None = Field(None, description="Device error message when ok is false")
+
+
 class DeviceStatus(BaseModel):
     """Status sub-document on Devices."""
     lastSeen: datetime = Field(..., description="Last time device reported in")
     isOnline: bool = Field(..., description="Whether device is currently online")
     lastUptime: int | None = Field(None, description="Last reported uptime in seconds")
     lastReading: LastReading | None = Field(None, description="Last V/I/P reading")
+    lastCommand: LastCommand | None = Field(None, description="Last light command and its ack")
 
 
 class DeviceDocument(BaseModel):
@@ -201,5 +213,7 @@ class CollectionNames:
     DEVICES = "Devices"
     SCHEDULES = "Schedules"
     TIME_DATA = "Time_Data"
+    TIME_DATA_ROLLUPS = "Time_Data_rollups"
+    TIME_DATA_ROLLUP_STATE = "Time_Data_rollup_state"
     USERS = "users"
     LIGHT_HISTORY = "light_history"
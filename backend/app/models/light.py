@@ -3,6 +3,12 @@ from typing import Literal, List, Optional
 
 from pydantic import BaseModel, Field
 
+# Largest batch accepted by the /lights/*/batch endpoints
+BATCH_MAX_SIZE = 1000
+
+# Schedule times: HH:MM on a 24h clock; the hour's leading zero is optional
+TIME_OF_DAY_PATTERN = r"^([01]?[0-9]|2[0-3]):[0-5][0-9]$"
+
 
 class ToggleLightRequest(BaseModel):
     restaurantId: int
@@ -12,8 +18,8 @@ class ToggleLightRequest(BaseModel):
 class DayScheduleRule(BaseModel):
     """One rule for a specific day or set of days"""
     days: List[str] = Field(..., description="e.g. ['MON', 'TUES', 'WED']")
-    startTime: str = Field(..., description="HH:MM (24h) start time")
-    endTime: str = Field(..., description="HH:MM (24h) end time")
+    startTime: str = Field(..., pattern=TIME_OF_DAY_PATTERN, description="HH:MM (24h) start time")
+    endTime: str = Field(..., pattern=TIME_OF_DAY_PATTERN, description="HH:MM (24h) end time")
     enabled: bool = Field(True, description="Whether this rule is active")
 
 
@@ -25,8 +31,8 @@ class FullScheduleRequest(BaseModel):
 
 class ScheduleLightRequest(BaseModel):
     restaurantId: int
-    scheduleOn: str = Field(..., description="HH:MM (24h) schedule on time")
-    scheduleOff: str = Field(..., description="HH:MM (24h) schedule off time")
+    scheduleOn: str = Field(..., pattern=TIME_OF_DAY_PATTERN, description="HH:MM (24h) schedule on time")
+    scheduleOff: str = Field(..., pattern=TIME_OF_DAY_PATTERN, description="HH:MM (24h) schedule off time")
 
 
 class LightStatusResponse(BaseModel):
@@ -36,8 +42,102 @@ class LightStatusResponse(BaseModel):
     lastUpdated: datetime
 
 
+class BatchLightsRequest(BaseModel):
+    """Restaurants to read or toggle in one request"""
+    restaurantIds: List[int] = Field(..., min_length=1, max_length=BATCH_MAX_SIZE)
+
+
+class LightCommandItem(BaseModel):
+    """Set state and/or brightness; omitted fields keep their current value"""
+    restaurantId: int
+    state: Optional[Literal["on", "off"]] = None
+    brightness: Optional[int] = Field(None, ge=0, le=100)
+
+
+class BatchSetLightsRequest(BaseModel):
+    items: List[LightCommandItem] = Field(..., min_length=1, max_length=BATCH_MAX_SIZE)
+
+
+class BatchLightResult(BaseModel):
+    """Exactly one of status or error is set"""
+    restaurantId: int
+    status: Optional[LightStatusResponse] = None
+    error: Optional[str] = None
+
+
+class BatchLightsResponse(BaseModel):
+    results: List[BatchLightResult]
+
+
+class FanOutSelector(BaseModel):
+    """Devices fields to match; set fields are ANDed, at least one is required"""
+    state: Optional[str] = Field(None, description="address.state, e.g. 'TX'")
+    city: Optional[str] = Field(None, description="address.city")
+    ownerEmail: Optional[str] = None
+    firmware: Optional[str] = Field(None, description="device.firmware")
+
+
+class FanOutRequest(BaseModel):
+    selector: FanOutSelector
+    state: Literal["on", "off"]
+    brightness: Optional[int] = Field(None, ge=0, le=100)
+
+
+class FanOutJobResponse(BaseModel):
+    """Progress counters are updated as each chunk of devices is written"""
+    jobId: str
+    status: Literal["pending", "running", "completed", "failed", "cancelled"]
+    selector: dict[str, str]
+    state: Literal["on", "off"]
+    brightness: Optional[int] = None
+    matched: int = 0
+    modified: int = 0
+    historyWritten: int = 0
+    error: Optional[str] = None
+    createdAt: datetime
+    finishedAt: Optional[datetime] = None
+
+
+class CommandStatsResponse(BaseModel):
+    """MQTT command publisher counters since startup"""
+    connected: bool
+    queued: int
+    inflight: int = Field(..., description="Published, waiting for the broker's PUBACK")
+    published: int
+    delivered: int
+    acked: int
+    failed: int
+    coalesced: int = Field(..., description="Queued commands replaced by a newer state")
+    unchanged: int = Field(..., description="Commands skipped because the device already has that state")
+    unknownDevices: int
+
+
+class StatusCacheStatsResponse(BaseModel):
+    """Status cache counters since startup"""
+    redis: bool = Field(..., description="Whether the shared Redis tier is configured")
+    size: int = Field(..., description="Entries in the in-process tier")
+    hits: int
+    redisHits: int
+    misses: int = Field(..., description="Reads that went to the database")
+    coalesced: int = Field(..., description="Reads that waited on another read's load")
+    writes: int = Field(..., description="Statuses written through by the service or the event bus")
+    stale: int = Field(..., description="Statuses ignored because the cached one was newer")
+    evictions: int
+    redisErrors: int
+    hitRatio: float = Field(..., description="Share of reads that did not reach the database")
+
+
+class ScheduleEvaluationResponse(BaseModel):
+    """Devices whose compiled schedule says ON/OFF at `at`; unscheduled devices are not listed"""
+    at: datetime
+    timezone: str
+    devices: int
+    on: List[int]
+    off: List[int]
+
+
 class LightHistoryItem(BaseModel):
-    id: int
+    id: int | str = Field(..., description="SQLite row id or MongoDB ObjectId hex; stable across pages")
     restaurantId: int
     action: str
     timestamp: datetime
@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import Any, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+# Largest number of readings accepted by one POST /telemetry/batch
+TELEMETRY_REQUEST_MAX_READINGS = 50000
+# Points requested from GET /telemetry/{restaurantId}; also caps raw readings returned
+TELEMETRY_POINTS_DEFAULT = 500
+TELEMETRY_POINTS_MAX = 10000
+
+
+class TelemetryReading(BaseModel):
+    """
+    One reading as sent by a device. Only used to document the request body:
+    batches are validated by app.services.telemetry.decode_readings.
+    """
+    deviceId: str = Field(..., description="Devices._id, or the restaurant id on SQLite")
+    timestamp: Optional[str] = Field(None, description="ISO 8601 or epoch seconds; defaults to receive time")
+    V: float = Field(..., description="Voltage")
+    I: float = Field(..., description="Current")
+    P: float = Field(..., description="Power")
+    uptime: int = Field(..., ge=0, description="Device uptime in seconds")
+
+
+class TelemetryRejection(BaseModel):
+    index: Optional[int] = Field(None, description="Position in the batch; null when the whole body is invalid")
+    error: str
+
+
+class TelemetryIngestResponse(BaseModel):
+    """Accepted readings are buffered and written in the background"""
+    accepted: int
+    rejected: int
+    errors: List[TelemetryRejection] = Field(default_factory=list, description="First rejections only")
+
+
+class TelemetryStatsResponse(BaseModel):
+    accepted: int
+    rejected: int
+    pending: int
+    written: int
+    batches: int
+    dropped: int
+
+
+class MeasurementSummary(BaseModel):
+    min: float
+    max: float
+    mean: Optional[float] = None
+
+
+class TelemetryPoint(BaseModel):
+    """One bucket (or one raw reading, where min = max = mean and Wh is null)"""
+    t: datetime = Field(..., description="Bucket start or reading time")
+    count: int
+    V: MeasurementSummary
+    I: MeasurementSummary
+    P: MeasurementSummary
+    Wh: Optional[float] = Field(None, description="Energy integrated over the bucket")
+
+
+class TelemetrySeriesResponse(BaseModel):
+    restaurantId: int
+    deviceId: str
+    resolution: Literal["raw", "1m", "1h", "1d"]
+    from_: datetime = Field(..., alias="from")
+    to: datetime
+    points: List[TelemetryPoint]
+
+
+class EnergyTotals(BaseModel):
+    kWh: float
+    kWhWhileOff: float = Field(..., description="Energy drawn while light_history says the light was off")
+    hoursLit: float
+    readings: int
+
+
+class RestaurantEnergy(EnergyTotals):
+    restaurantId: int
+    deviceId: str
+
+
+class EnergyReportResponse(BaseModel):
+    from_: datetime = Field(..., alias="from")
+    to: datetime
+    restaurants: List[RestaurantEnergy]
+    fleet: EnergyTotals
+
+
+def telemetry_batch_schema() -> dict[str, Any]:
+    """OpenAPI body for POST /telemetry/batch: a list of readings, or {"readings": [...]}"""
+    reading = TelemetryReading.model_json_schema()
+    readings = {"type": "array", "items": reading, "maxItems": TELEMETRY_REQUEST_MAX_READINGS}
+    return {
+        "oneOf": [
+            readings,
+            {"type": "object", "properties": {"readings": readings}, "required": ["readings"]},
+        ]
+    }
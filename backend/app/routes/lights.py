@@ -1,43 +1,261 @@
+import asyncio
 import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 
+from app.metrics import METRICS_ENABLED, instrument_repository
 from app.models.light import (
+    BATCH_MAX_SIZE,
+    BatchLightsRequest,
+    BatchLightsResponse,
+    BatchSetLightsRequest,
+    CommandStatsResponse,
+    FanOutJobResponse,
+    FanOutRequest,
     LightHistoryItem,
     LightStatusResponse,
+    ScheduleEvaluationResponse,
     ScheduleLightRequest,
+    StatusCacheStatsResponse,
     ToggleLightRequest,
     FullScheduleRequest,
     FullScheduleResponse,
 )
-from app.services.light_service import LightService, MongoLightRepository, SQLiteLightRepository
+from app.routes.responses import FAST_RESPONSES, fast_response
+from app.services.archive import ColdArchive
+from app.services.async_repository import AsyncMongoLightRepository, ThreadedLightRepository
+from app.services.commands import COMMAND_MQTT_HOST, CommandDispatcher, MongoCommandStore, SQLiteCommandStore
+from app.services.device_cache import CACHED_DEVICE_FIELDS
+from app.services.events import DeviceChanged, EventBus, HistoryAppended, ScheduleChanged
+from app.services.fanout import FanOutService
+from app.services.history_writer import HISTORY_WRITER_MODE, MODE_OFF, MODE_SYNC, HistoryWriter
+from app.services.live import LiveConnection, LiveHub
+from app.services.schedule_compiler import ScheduleEvaluator
+from app.services.scheduler import LightScheduler
+from app.services.status_cache import STATUS_CACHE_ENABLED, StatusCache
+from app.services.light_service import (
+    HISTORY_PAGE_SIZE,
+    HISTORY_PAGE_SIZE_MAX,
+    LightService,
+    SQLiteLightRepository,
+)
 
 router = APIRouter(prefix="/lights", tags=["lights"])
 
-# Use MongoDB when MONGODB_URI is set; otherwise keep SQLite placeholder.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Conditional GETs: pollers revalidate every time and get a bodiless 304 when unchanged
+CONDITIONAL_CACHE_CONTROL = "no-cache"
+
+# Device fields that show up in a status response
+STATUS_DEVICE_FIELDS = ("lightState", "brightness", "lastUpdated")
+
+# Use MongoDB (native asyncio client) when MONGODB_URI is set; otherwise keep the
+# SQLite placeholder, run in worker threads so it never blocks the event loop.
 if os.getenv("MONGODB_URI"):
-    service = LightService(repository=MongoLightRepository())
+    service = LightService(repository=AsyncMongoLightRepository())
+    command_store = MongoCommandStore()
 else:
-    service = LightService(repository=SQLiteLightRepository())
+    service = LightService(repository=ThreadedLightRepository(SQLiteLightRepository()))
+    command_store = SQLiteCommandStore()
+if METRICS_ENABLED:
+    instrument_repository(service.repository)  # before anything binds its methods
+
+# History rows are group-committed in the background (HISTORY_WRITER_MODE=off writes inline)
+history_writer = HistoryWriter(service.repository.add_history_many, durable=HISTORY_WRITER_MODE == MODE_SYNC)
+if HISTORY_WRITER_MODE != MODE_OFF:
+    service.repository.history_writer = history_writer
+
+# History pages also read rows the archiver moved to cold storage
+service.archive = ColdArchive()
+
+fanout = FanOutService(service.repository, on_written=service.lights_written)
+schedule_evaluator = ScheduleEvaluator(service.repository)
+service.add_schedule_listener(schedule_evaluator.invalidate)
+scheduler = LightScheduler(service.repository, on_written=service.lights_written)
+service.add_schedule_listener(scheduler.reschedule)
+live_hub = LiveHub()
+service.add_status_listener(live_hub.publish_status)
+
+# Status reads are served from memory (and Redis when STATUS_CACHE_REDIS_URL is set)
+status_cache = StatusCache() if STATUS_CACHE_ENABLED else None
+if status_cache is not None:
+    service.status_cache = status_cache
+    service.add_status_listener(status_cache.put)
+
+# Every light write becomes an MQTT command when COMMAND_MQTT_HOST is set
+command_dispatcher = CommandDispatcher(command_store) if COMMAND_MQTT_HOST else None
+if command_dispatcher is not None:
+    service.add_status_listener(command_dispatcher.submit)
+
+# Changes made outside this process (other workers, Atlas console, devices)
+# arrive through the change feed started in the app lifespan.
+event_bus = EventBus()
+
+
+def _on_device_changed(event: DeviceChanged) -> None:
+    if event.touches(CACHED_DEVICE_FIELDS):
+        service.repository.invalidate_device(event.device_id, event.restaurant_id)
+    # Writes from other processes reach live clients here (the scheduler and
+    # fan-out jobs also notify directly; a repeat of a status already seen changes nothing)
+    if event.document is not None and event.restaurant_id is not None and event.touches(STATUS_DEVICE_FIELDS):
+        status = service.status_from_document(event.document, event.restaurant_id)
+        if status_cache is not None:
+            status_cache.put(status)
+        live_hub.publish_status(status)
+        if command_dispatcher is not None:
+            command_dispatcher.submit(status)
+
+
+def _on_schedule_changed(event: ScheduleChanged) -> None:
+    schedule_evaluator.invalidate()
+    if event.restaurant_id is not None:
+        scheduler.reschedule(event.restaurant_id)
+
+
+def _on_history_appended(event: HistoryAppended) -> None:
+    if event.restaurant_id is not None:
+        live_hub.publish_history(
+            {
+                "id": event.id,
+                "restaurantId": event.restaurant_id,
+                "action": event.action,
+                "timestamp": event.timestamp,
+            }
+        )
+
+
+event_bus.subscribe(DeviceChanged, _on_device_changed)
+event_bus.subscribe(ScheduleChanged, _on_schedule_changed)
+event_bus.subscribe(HistoryAppended, _on_history_appended)
+
+
+def _entity_tag(version: datetime) -> str:
+    return f'"{int(version.timestamp() * 1_000_000):x}"'
+
+
+def _not_modified(request: Request, etag: str, version: datetime) -> bool:
+    """If-None-Match wins over If-Modified-Since, as in RFC 9110."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return version.replace(microsecond=0) <= since  # HTTP dates have whole seconds
+
+
+def _conditional(request: Request, response: Response, version: datetime | None) -> Response | None:
+    """Return a bare 304 when the client's copy is current; otherwise add the validators to `response`."""
+    if version is None:
+        return None
+    etag = _entity_tag(version)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(version.astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": CONDITIONAL_CACHE_CONTROL,
+    }
+    if _not_modified(request, etag, version):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 
 @router.get("/status", response_model=LightStatusResponse)
-def get_light_status(restaurantId: int = Query(..., ge=1)) -> dict:
-    return service.get_status(restaurantId)
+async def get_light_status(
+    request: Request, response: Response, restaurantId: int = Query(..., ge=1)
+) -> dict | Response:
+    """Sends ETag/Last-Modified; If-None-Match or If-Modified-Since gets 304 when unchanged."""
+    # The version is read first, so a write racing the body can only make the ETag older (a refetch)
+    not_modified = _conditional(request, response, await service.get_status_version(restaurantId))
+    if not_modified is not None:
+        return not_modified
+    status = await service.get_status(restaurantId)
+    if FAST_RESPONSES:
+        return fast_response(status, response)
+    return status
 
 
 @router.post("/toggle", response_model=LightStatusResponse)
-def toggle_light(payload: ToggleLightRequest) -> dict:
+async def toggle_light(payload: ToggleLightRequest) -> dict | Response:
     if payload.action != "toggle":
         raise HTTPException(status_code=400, detail="action must be 'toggle'")
-    return service.toggle_light(payload.restaurantId)
+    status = await service.toggle_light(payload.restaurantId)
+    if FAST_RESPONSES:
+        return fast_response(status)
+    return status
+
+
+@router.post("/status/batch", response_model=BatchLightsResponse, response_model_exclude_none=True)
+async def get_light_status_batch(payload: BatchLightsRequest) -> dict:
+    """Status for many restaurants with one device lookup; unknown IDs get a per-item error"""
+    return {"results": await service.get_status_batch(payload.restaurantIds)}
+
+
+@router.post("/toggle/batch", response_model=BatchLightsResponse, response_model_exclude_none=True)
+async def toggle_light_batch(payload: BatchLightsRequest) -> dict:
+    """Toggle many restaurants with one bulk write and one history insert"""
+    return {"results": await service.toggle_lights(payload.restaurantIds)}
+
+
+@router.post("/set/batch", response_model=BatchLightsResponse, response_model_exclude_none=True)
+async def set_light_batch(payload: BatchSetLightsRequest) -> dict:
+    """Set state and/or brightness for many restaurants with one bulk write"""
+    return {"results": await service.set_lights([item.model_dump() for item in payload.items])}
+
+
+@router.post("/fanout", response_model=FanOutJobResponse, status_code=202)
+async def start_fanout(payload: FanOutRequest) -> dict:
+    """Apply one state to every device matching the selector; poll GET /lights/fanout/{jobId}"""
+    if not fanout.supported:
+        raise HTTPException(status_code=501, detail="fan-out selectors require the MongoDB backend")
+    try:
+        job = fanout.start(
+            payload.selector.model_dump(exclude_none=True), payload.state, payload.brightness
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return job.to_dict()
+
+
+@router.get("/fanout/{jobId}", response_model=FanOutJobResponse)
+async def get_fanout(jobId: str) -> dict:
+    job = fanout.get(jobId)
+    if job is None:
+        raise HTTPException(status_code=404, detail="fan-out job not found")
+    return job.to_dict()
+
+
+@router.get("/commands/stats", response_model=CommandStatsResponse)
+async def get_command_stats() -> dict:
+    """MQTT command publisher counters; 404 when COMMAND_MQTT_HOST is not set"""
+    if command_dispatcher is None:
+        raise HTTPException(status_code=404, detail="command publishing is not configured")
+    return command_dispatcher.stats()
+
+
+@router.get("/cache/stats", response_model=StatusCacheStatsResponse)
+async def get_status_cache_stats() -> dict:
+    """Status cache counters; 404 when STATUS_CACHE_ENABLED=0"""
+    if status_cache is None:
+        raise HTTPException(status_code=404, detail="status cache is disabled")
+    return status_cache.stats()
 
 
 @router.post("/schedule", response_model=LightStatusResponse)
-def schedule_light(payload: ScheduleLightRequest) -> dict:
+async def schedule_light(payload: ScheduleLightRequest) -> dict:
     """Legacy endpoint: sets a simple schedule (same time every day)"""
-    return service.schedule_light(
+    return await service.schedule_light(
         restaurant_id=payload.restaurantId,
         schedule_on=payload.scheduleOn,
         schedule_off=payload.scheduleOff,
@@ -45,20 +263,108 @@ def schedule_light(payload: ScheduleLightRequest) -> dict:
 
 
 @router.post("/schedule/full", response_model=FullScheduleResponse)
-def set_full_schedule(payload: FullScheduleRequest) -> dict:
+async def set_full_schedule(payload: FullScheduleRequest) -> dict:
     """Save day-specific schedule rules to Schedules collection"""
-    return service.set_full_schedule(
+    return await service.set_full_schedule(
         restaurant_id=payload.restaurantId,
         rules=[rule.dict() for rule in payload.rules]
     )
 
 
 @router.get("/schedule/full", response_model=FullScheduleResponse)
-def get_full_schedule(restaurantId: int = Query(..., ge=1)) -> dict:
-    """Get day-specific schedule rules from Schedules collection"""
-    return service.get_full_schedule(restaurantId)
+async def get_full_schedule(
+    request: Request, response: Response, restaurantId: int = Query(..., ge=1)
+) -> dict | Response:
+    """Get day-specific schedule rules from Schedules collection (conditional, like /status)"""
+    not_modified = _conditional(request, response, await service.get_schedule_version(restaurantId))
+    if not_modified is not None:
+        return not_modified
+    schedule = await service.get_full_schedule(restaurantId)
+    if FAST_RESPONSES:
+        return fast_response(schedule, response)
+    return schedule
+
+
+@router.get("/schedule/evaluate", response_model=ScheduleEvaluationResponse)
+async def evaluate_schedules(
+    at: datetime | None = Query(default=None, description="Instant to evaluate; defaults to now"),
+) -> dict:
+    """Which scheduled devices should be ON at `at`, from every device's compiled rules"""
+    return await schedule_evaluator.evaluate(at or datetime.now(timezone.utc))
 
 
 @router.get("/history", response_model=list[LightHistoryItem])
-def get_light_history(restaurantId: int | None = Query(default=None, ge=1)) -> list[dict]:
-    return service.get_history(restaurantId)
+async def get_light_history(
+    response: Response,
+    restaurantId: int | None = Query(default=None, ge=1),
+    cursor: str | None = Query(default=None, description="X-Next-Cursor from the previous page"),
+    from_: datetime | None = Query(default=None, alias="from", description="Inclusive lower bound"),
+    to: datetime | None = Query(default=None, description="Exclusive upper bound"),
+    action: str | None = Query(default=None, description="e.g. toggle_on"),
+    limit: int = Query(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_SIZE_MAX),
+) -> list[dict] | Response:
+    """Newest first. When more rows exist, the X-Next-Cursor header holds the next page's cursor."""
+    try:
+        items, next_cursor = await service.get_history(
+            restaurantId, cursor=cursor, start=from_, end=to, action=action, limit=limit
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if FAST_RESPONSES:
+        return fast_response(items, response)
+    return items
+
+
+@router.websocket("/stream")
+async def stream_lights(websocket: WebSocket, restaurantId: List[int] = Query(default=[])) -> None:
+    """
+    Live status and history for the subscribed restaurants. Connect with
+    ?restaurantId=1&restaurantId=2, then send {"subscribe": [ids]} or
+    {"unsubscribe": [ids]} to change the set. Messages out:
+    {"type": "status"|"history", "data": {...}} and {"type": "dropped", "history": n}
+    when a slow client lost history rows (refetch /lights/history).
+    """
+    await websocket.accept()
+    connection = LiveConnection()
+    sender = asyncio.create_task(_send_live_updates(websocket, connection))
+    try:
+        await _subscribe_live(connection, restaurantId)
+        while True:
+            message = await websocket.receive_json()
+            if not isinstance(message, dict):
+                continue
+            await _subscribe_live(connection, _restaurant_ids(message.get("subscribe")))
+            live_hub.unsubscribe(connection, _restaurant_ids(message.get("unsubscribe")))
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        live_hub.unsubscribe(connection)
+        sender.cancel()
+
+
+def _restaurant_ids(value: object) -> list[int]:
+    if not isinstance(value, list):
+        return []
+    return [rid for rid in value if isinstance(rid, int) and rid >= 1][:BATCH_MAX_SIZE]
+
+
+async def _subscribe_live(connection: LiveConnection, restaurant_ids: list[int]) -> None:
+    """Subscribe, then queue the current status of each restaurant as the first delta."""
+    new_ids = [rid for rid in dict.fromkeys(restaurant_ids) if rid not in connection.restaurant_ids]
+    if not new_ids:
+        return
+    live_hub.subscribe(connection, new_ids)
+    for result in await service.get_status_batch(new_ids):
+        if "status" in result:
+            connection.push_status(result["status"])
+
+
+async def _send_live_updates(websocket: WebSocket, connection: LiveConnection) -> None:
+    try:
+        while True:
+            for message in await connection.next_messages():
+                await websocket.send_json(message)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
@@ -0,0 +1,45 @@
+"""
+Opt-in fast JSON responses for the hot light endpoints (FAST_RESPONSES=1).
+
+The routes keep their response_model, so the OpenAPI schema is the same in both
+modes. In fast mode they return a FastJSONResponse themselves, which FastAPI
+sends as-is: the service's typed records (app.services.records) are not
+validated against the model and are not re-serialized, only written straight
+to bytes.
+
+Record timestamps are datetimes and are written with OPT_UTC_Z, so the body is
+byte-for-byte what Pydantic would have sent ("2026-01-01T12:00:00Z" for UTC,
+offsets and naive times kept).
+"""
+from __future__ import annotations
+
+import os
+from typing import Any
+
+from fastapi import Response
+
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "").lower() in ("1", "true", "yes")
+
+if FAST_RESPONSES:
+    import orjson  # only needed in fast mode
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def fast_response(content: Any, response: Response | None = None) -> FastJSONResponse:
+    """
+    Wrap records in a FastJSONResponse. Headers a route set on its injected
+    `response` (X-Next-Cursor, ETag) are only applied to model-serialized
+    results, so they are copied over here.
+    """
+    fast = FastJSONResponse(content)
+    if response is not None:
+        for name, value in response.headers.items():
+            if name != "content-length":
+                fast.headers[name] = value
+    return fast
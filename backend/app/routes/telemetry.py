@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+
+from app.models.telemetry import (
+    TELEMETRY_POINTS_DEFAULT,
+    TELEMETRY_POINTS_MAX,
+    TELEMETRY_REQUEST_MAX_READINGS,
+    EnergyReportResponse,
+    TelemetryIngestResponse,
+    TelemetrySeriesResponse,
+    TelemetryStatsResponse,
+    telemetry_batch_schema,
+)
+from app.services.analytics import EnergyAnalytics, MongoAnalyticsStore, SQLiteAnalyticsStore
+from app.services.archive import Archiver, ColdArchive, MongoArchiveSource, SQLiteArchiveSource
+from app.services.rollups import (
+    MongoRollupStore,
+    SQLiteRollupStore,
+    TelemetryRollupEngine,
+    query_telemetry,
+)
+from app.services.telemetry import (
+    TELEMETRY_MAX_REJECTIONS_REPORTED,
+    TELEMETRY_MQTT_HOST,
+    MongoTelemetryStore,
+    SQLiteTelemetryStore,
+    TelemetryIngestor,
+    TelemetryMqttSubscriber,
+    decode_readings,
+)
+
+router = APIRouter(prefix="/telemetry", tags=["telemetry"])
+
+# Window returned by GET /telemetry/{restaurantId} when from/to are omitted
+DEFAULT_SERIES_WINDOW = timedelta(hours=24)
+
+# Same backend switch as the lights routes
+if os.getenv("MONGODB_URI"):
+    ingestor = TelemetryIngestor(MongoTelemetryStore())
+    rollup_store = MongoRollupStore()
+    analytics = EnergyAnalytics(MongoAnalyticsStore(rollup_store))
+    archive_source = MongoArchiveSource()
+else:
+    ingestor = TelemetryIngestor(SQLiteTelemetryStore())
+    rollup_store = SQLiteRollupStore()
+    analytics = EnergyAnalytics(SQLiteAnalyticsStore(rollup_store))
+    archive_source = SQLiteArchiveSource()
+
+rollups = TelemetryRollupEngine(rollup_store)
+
+# Raw readings and reports merge rows the archiver moved to cold storage
+rollup_store.archive = ColdArchive()
+archiver = Archiver(rollup_store.archive, archive_source, rollup_store)
+
+# Devices publish straight to the broker when TELEMETRY_MQTT_HOST is set
+mqtt_subscriber = TelemetryMqttSubscriber(ingestor) if TELEMETRY_MQTT_HOST else None
+
+
+@router.post(
+    "/batch",
+    response_model=TelemetryIngestResponse,
+    status_code=202,
+    openapi_extra={
+        "requestBody": {"required": True, "content": {"application/json": {"schema": telemetry_batch_schema()}}}
+    },
+)
+async def ingest_telemetry(request: Request) -> dict:
+    """
+    Queue a batch of readings for Time_Data. Invalid readings are skipped and
+    reported; 503 with Retry-After when the ingest buffer stays full.
+    """
+    try:
+        payload = json.loads(await request.body())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="body must be JSON") from exc
+    if isinstance(payload, dict) and "readings" in payload:
+        payload = payload["readings"]
+    if isinstance(payload, list) and len(payload) > TELEMETRY_REQUEST_MAX_READINGS:
+        raise HTTPException(
+            status_code=413, detail=f"at most {TELEMETRY_REQUEST_MAX_READINGS} readings per request"
+        )
+    readings, rejected = decode_readings(payload)
+    ingestor.rejected += len(rejected)
+    try:
+        await ingestor.submit(readings)
+    except asyncio.TimeoutError as exc:
+        raise HTTPException(
+            status_code=503, detail="telemetry buffer is full", headers={"Retry-After": "1"}
+        ) from exc
+    return {
+        "accepted": len(readings),
+        "rejected": len(rejected),
+        "errors": rejected[:TELEMETRY_MAX_REJECTIONS_REPORTED],
+    }
+
+
+@router.get("/stats", response_model=TelemetryStatsResponse)
+async def get_telemetry_stats() -> dict:
+    """Ingest counters since startup"""
+    return ingestor.stats()
+
+
+@router.get("/reports/energy", response_model=EnergyReportResponse)
+async def get_energy_report(
+    from_: datetime | None = Query(default=None, alias="from", description="Inclusive; defaults to to - 24h"),
+    to: datetime | None = Query(default=None, description="Exclusive; defaults to now"),
+    restaurantId: List[int] = Query(default=[], description="Repeat to limit the report; default is every device"),
+) -> dict:
+    """
+    kWh, kWh drawn while the light was recorded off, and hours lit per
+    restaurant, from raw readings and light_history. Large reports run in a
+    worker process.
+    """
+    end = _utc(to) if to is not None else datetime.now(timezone.utc)
+    start = _utc(from_) if from_ is not None else end - DEFAULT_SERIES_WINDOW
+    try:
+        return await analytics.report(start, end, restaurantId or None)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/{restaurantId}", response_model=TelemetrySeriesResponse)
+async def get_telemetry(
+    restaurantId: int = Path(..., ge=1),
+    from_: datetime | None = Query(default=None, alias="from", description="Inclusive; defaults to to - 24h"),
+    to: datetime | None = Query(default=None, description="Exclusive; defaults to now"),
+    points: int = Query(default=TELEMETRY_POINTS_DEFAULT, ge=1, le=TELEMETRY_POINTS_MAX),
+) -> dict:
+    """
+    V/I/P series at the coarsest resolution (1d, 1h, 1m, raw) that gives at
+    least `points` points. Rollups trail live data by the rollup interval.
+    """
+    end = _utc(to) if to is not None else datetime.now(timezone.utc)
+    start = _utc(from_) if from_ is not None else end - DEFAULT_SERIES_WINDOW
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    series = await query_telemetry(rollup_store, restaurantId, start, end, points, TELEMETRY_POINTS_MAX)
+    if series is None:
+        raise HTTPException(status_code=404, detail="device not found")
+    return series
+
+
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
@@ -0,0 +1,339 @@
+"""
+Energy and on-time reports over Time_Data and light_history.
+
+For every restaurant in [start, end):
+  kWh          - power integrated over time (trapezoids between consecutive
+                 readings; gaps over TELEMETRY_ROLLUP_MAX_GAP_SECONDS add nothing)
+  kWhWhileOff  - the part of kWh drawn while light_history says the light was
+                 off; anything well above zero points at a wiring fault
+  hoursLit     - time spent on, from the on/off intervals rebuilt from the
+                 toggle_*/set_* history rows and the state before start
+
+Readings and history rows are loaded as NumPy columns through batched
+cursors, then one vectorized pass (compute_energy_report) produces the
+whole fleet. Reports with more than ANALYTICS_INLINE_MAX_READINGS readings
+are computed in a ProcessPoolExecutor so they never hold the API's GIL.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+
+from app.database.db import get_connection
+from app.database.mongo import get_async_mongo_db
+from app.models.collections import CollectionNames
+from app.services.archive import HISTORY, ColdArchive, iso_micros
+from app.services.light_service import to_utc_iso
+from app.services.rollups import TELEMETRY_ROLLUP_MAX_GAP_SECONDS, RollupStore
+
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", "2"))
+ANALYTICS_INLINE_MAX_READINGS = int(os.getenv("ANALYTICS_INLINE_MAX_READINGS", "200000"))
+ANALYTICS_MAX_SPAN = timedelta(days=int(os.getenv("ANALYTICS_MAX_SPAN_DAYS", "31")))
+ANALYTICS_CURSOR_BATCH = 10000
+
+# History actions that set the light state (schedule_* rows do not)
+LIGHT_ON_ACTIONS = ("toggle_on", "set_on")
+LIGHT_OFF_ACTIONS = ("toggle_off", "set_off")
+STATE_ACTIONS = LIGHT_ON_ACTIONS + LIGHT_OFF_ACTIONS
+
+SECONDS_PER_HOUR = 3600.0
+WH_PER_KWH = 1000.0
+
+
+@dataclass
+class StateEvents:
+    """On/off changes as columns, plus the state each restaurant had at start."""
+    restaurant_ids: np.ndarray  # int64
+    timestamps: np.ndarray  # epoch seconds
+    on: np.ndarray  # bool
+    initial_on: dict[int, bool]
+
+
+def _trapezoid_wh(codes: np.ndarray, times: np.ndarray, power: np.ndarray, max_gap: float) -> np.ndarray:
+    """Energy per reading since the previous reading of the same code (arrays sorted by code, time)."""
+    energy = np.zeros(len(times))
+    if len(times) < 2:
+        return energy
+    gap = np.diff(times)
+    usable = (codes[1:] == codes[:-1]) & (gap > 0) & (gap <= max_gap)
+    energy[1:] = np.where(usable, (power[1:] + power[:-1]) / 2 * gap / SECONDS_PER_HOUR, 0.0)
+    return energy
+
+
+def compute_energy_report(
+    reading_codes: np.ndarray,
+    reading_times: np.ndarray,
+    power: np.ndarray,
+    event_codes: np.ndarray,
+    event_times: np.ndarray,
+    event_on: np.ndarray,
+    initial_on: np.ndarray,
+    start: float,
+    end: float,
+    max_gap: float,
+) -> dict[str, np.ndarray]:
+    """
+    Vectorized per-restaurant report. Codes index restaurants 0..n-1 (n =
+    len(initial_on)); readings and events must be sorted by (code, time).
+    Top-level and array-only so it can run in a worker process.
+    """
+    count = len(initial_on)
+    energy = _trapezoid_wh(reading_codes, reading_times, power, max_gap)
+
+    # State at each reading: the newest event at or before it for the same
+    # restaurant, else the state at start. One searchsorted over (code, time) keys.
+    span_ms = int((end - start) * 1000) + 1
+    event_keys = event_codes * span_ms + ((event_times - start) * 1000).astype(np.int64)
+    reading_keys = reading_codes * span_ms + ((reading_times - start) * 1000).astype(np.int64)
+    index = np.searchsorted(event_keys, reading_keys, side="right") - 1
+    has_event = index >= 0
+    has_event[has_event] = event_codes[index[has_event]] == reading_codes[has_event]
+    reading_on = initial_on[reading_codes].copy()
+    reading_on[has_event] = event_on[index[has_event]]
+
+    # On-time: segments from start (initial state) and from every event to the
+    # next event of the same restaurant, or to end.
+    segment_codes = np.concatenate([np.arange(count), event_codes])
+    segment_times = np.concatenate([np.full(count, start), event_times])
+    segment_on = np.concatenate([initial_on, event_on])
+    order = np.lexsort((segment_times, segment_codes))
+    segment_codes, segment_times, segment_on = segment_codes[order], segment_times[order], segment_on[order]
+    segment_ends = np.full(len(segment_times), end)
+    same = segment_codes[1:] == segment_codes[:-1]
+    segment_ends[:-1][same] = segment_times[1:][same]
+    lit_seconds = np.bincount(
+        segment_codes, weights=np.where(segment_on, segment_ends - segment_times, 0.0), minlength=count
+    )
+
+    return {
+        "kwh": np.bincount(reading_codes, weights=energy, minlength=count) / WH_PER_KWH,
+        "kwh_while_off": np.bincount(
+            reading_codes, weights=np.where(reading_on, 0.0, energy), minlength=count
+        ) / WH_PER_KWH,
+        "hours_lit": lit_seconds / SECONDS_PER_HOUR,
+        "readings": np.bincount(reading_codes, minlength=count),
+    }
+
+
+def _with_archived_history(
+    archive: ColdArchive, events: StateEvents, restaurant_ids: list[int], start: datetime, end: datetime
+) -> StateEvents:
+    """Add archived state changes; the state at start comes from the archive only when no live row has it."""
+    ids, micros, actions = archive.history_events(restaurant_ids, start, end, STATE_ACTIONS)
+    missing = [rid for rid in restaurant_ids if rid not in events.initial_on]
+    archived_initial = archive.last_history_actions(missing, start, STATE_ACTIONS)
+    return StateEvents(
+        np.concatenate([ids, events.restaurant_ids]),
+        np.concatenate([micros / 1e6, events.timestamps]),
+        np.concatenate([np.isin(actions, LIGHT_ON_ACTIONS), events.on]),
+        {
+            **{rid: action in LIGHT_ON_ACTIONS for rid, action in archived_initial.items()},
+            **events.initial_on,
+        },
+    )
+
+
+class AnalyticsStore(ABC):
+    def __init__(self, rollup_store: RollupStore) -> None:
+        self.rollup_store = rollup_store  # reads Time_Data columns
+
+    @abstractmethod
+    async def devices(self, restaurant_ids: list[int] | None) -> dict[int, str]:
+        """restaurant_id -> Time_Data deviceId"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def state_events(self, restaurant_ids: list[int], start: datetime, end: datetime) -> StateEvents:
+        raise NotImplementedError
+
+
+class MongoAnalyticsStore(AnalyticsStore):
+    DEVICES = CollectionNames.DEVICES
+    LIGHT_HISTORY = CollectionNames.LIGHT_HISTORY
+
+    def __init__(self, rollup_store: RollupStore) -> None:
+        super().__init__(rollup_store)
+        self._db = get_async_mongo_db()
+
+    async def devices(self, restaurant_ids: list[int] | None) -> dict[int, str]:
+        device_filter: dict[str, Any] = {"legacyId": {"$ne": None}}
+        if restaurant_ids is not None:
+            device_filter = {"legacyId": {"$in": restaurant_ids}}
+        cursor = self._db[self.DEVICES].find(device_filter, {"_id": 1, "legacyId": 1})
+        return {device["legacyId"]: device["_id"] async for device in cursor}
+
+    async def state_events(self, restaurant_ids: list[int], start: datetime, end: datetime) -> StateEvents:
+        history = self._db[self.LIGHT_HISTORY]
+        # State at start: newest state-changing row before start, per restaurant
+        initial = await history.aggregate(
+            [
+                {
+                    "$match": {
+                        "legacyId": {"$in": restaurant_ids},
+                        "action": {"$in": list(STATE_ACTIONS)},
+                        "timestamp": {"$lt": to_utc_iso(start)},
+                    }
+                },
+                {"$sort": {"legacyId": 1, "timestamp": 1}},
+                {"$group": {"_id": "$legacyId", "action": {"$last": "$action"}}},
+            ]
+        )
+        initial_on = {row["_id"]: row["action"] in LIGHT_ON_ACTIONS async for row in initial}
+        ids: list[int] = []
+        stamps: list[Any] = []
+        on: list[bool] = []
+        cursor = history.find(
+            {
+                "legacyId": {"$in": restaurant_ids},
+                "action": {"$in": list(STATE_ACTIONS)},
+                "timestamp": {"$gte": to_utc_iso(start), "$lt": to_utc_iso(end)},
+            },
+            {"_id": 0, "legacyId": 1, "action": 1, "timestamp": 1},
+        ).batch_size(ANALYTICS_CURSOR_BATCH)
+        async for row in cursor:
+            ids.append(row["legacyId"])
+            stamps.append(row["timestamp"])
+            on.append(row["action"] in LIGHT_ON_ACTIONS)
+        return StateEvents(np.array(ids, dtype=np.int64), iso_micros(stamps) / 1e6, np.array(on, dtype=bool), initial_on)
+
+
+class SQLiteAnalyticsStore(AnalyticsStore):
+    async def devices(self, restaurant_ids: list[int] | None) -> dict[int, str]:
+        return await asyncio.to_thread(self._devices, restaurant_ids)
+
+    @staticmethod
+    def _devices(restaurant_ids: list[int] | None) -> dict[int, str]:
+        with get_connection() as conn:
+            rows = conn.execute("SELECT restaurant_id FROM restaurant_lights").fetchall()
+        known = {row["restaurant_id"] for row in rows}
+        if restaurant_ids is not None:
+            known &= set(restaurant_ids)
+        return {rid: str(rid) for rid in sorted(known)}
+
+    async def state_events(self, restaurant_ids: list[int], start: datetime, end: datetime) -> StateEvents:
+        return await asyncio.to_thread(self._state_events, restaurant_ids, start, end)
+
+    @staticmethod
+    def _state_events(restaurant_ids: list[int], start: datetime, end: datetime) -> StateEvents:
+        ids = ", ".join("?" * len(restaurant_ids))
+        actions = ", ".join("?" * len(STATE_ACTIONS))
+        with get_connection() as conn:
+            # SQLite returns the action of the row holding max(timestamp)
+            initial = conn.execute(
+                f"""
+                SELECT restaurant_id, action, max(timestamp) FROM light_history
+                WHERE restaurant_id IN ({ids}) AND action IN ({actions}) AND timestamp < ?
+                GROUP BY restaurant_id
+                """,
+                (*restaurant_ids, *STATE_ACTIONS, to_utc_iso(start)),
+            ).fetchall()
+            rows = conn.execute(
+                f"""
+                SELECT restaurant_id, action, timestamp FROM light_history
+                WHERE restaurant_id IN ({ids}) AND action IN ({actions})
+                  AND timestamp >= ? AND timestamp < ?
+                """,
+                (*restaurant_ids, *STATE_ACTIONS, to_utc_iso(start), to_utc_iso(end)),
+            ).fetchall()
+        return StateEvents(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            iso_micros([row[2] for row in rows]) / 1e6,
+            np.array([row[1] in LIGHT_ON_ACTIONS for row in rows], dtype=bool),
+            {row[0]: row[1] in LIGHT_ON_ACTIONS for row in initial},
+        )
+
+
+class EnergyAnalytics:
+    def __init__(
+        self,
+        store: AnalyticsStore,
+        workers: int = ANALYTICS_WORKERS,
+        inline_max_readings: int = ANALYTICS_INLINE_MAX_READINGS,
+        max_gap_seconds: float = TELEMETRY_ROLLUP_MAX_GAP_SECONDS,
+    ) -> None:
+        self.store = store
+        self.workers = workers
+        self.inline_max_readings = inline_max_readings
+        self.max_gap_seconds = max_gap_seconds
+        self._pool: ProcessPoolExecutor | None = None
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def report(
+        self, start: datetime, end: datetime, restaurant_ids: list[int] | None = None
+    ) -> dict[str, Any]:
+        """Per-restaurant and fleet totals; raises ValueError for an empty or too long range."""
+        if start >= end:
+            raise ValueError("from must be before to")
+        if end - start > ANALYTICS_MAX_SPAN:
+            raise ValueError(f"reports cover at most {ANALYTICS_MAX_SPAN.days} days")
+        devices = await self.store.devices(restaurant_ids)
+        rids = sorted(devices)
+        columns, events = await asyncio.gather(
+            self.store.rollup_store.read_readings(start, end, [devices[rid] for rid in rids]),
+            self.store.state_events(rids, start, end),
+        )
+        archive = self.store.rollup_store.archive
+        if archive is not None and archive.covers(HISTORY, None):
+            events = await asyncio.to_thread(_with_archived_history, archive, events, rids, start, end)
+
+        # Restaurant codes 0..n-1; readings arrive sorted by (device, time)
+        code_by_device = {devices[rid]: code for code, rid in enumerate(rids)}
+        code_by_rid = {rid: code for code, rid in enumerate(rids)}
+        reading_codes = np.array([code_by_device[device] for device in columns.device_ids], dtype=np.int64)
+        order = np.lexsort((columns.timestamps, reading_codes))
+        event_codes = np.array([code_by_rid[rid] for rid in events.restaurant_ids.tolist()], dtype=np.int64)
+        event_order = np.lexsort((events.timestamps, event_codes))
+        arguments = (
+            reading_codes[order],
+            columns.timestamps[order],
+            columns.values["P"][order],
+            event_codes[event_order],
+            events.timestamps[event_order],
+            events.on[event_order],
+            np.array([events.initial_on.get(rid, False) for rid in rids], dtype=bool),
+            start.timestamp(),
+            end.timestamp(),
+            self.max_gap_seconds,
+        )
+        if len(columns) > self.inline_max_readings:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._pool, compute_energy_report, *arguments
+            )
+        else:
+            result = await asyncio.to_thread(compute_energy_report, *arguments)
+
+        restaurants = [
+            {
+                "restaurantId": rid,
+                "deviceId": devices[rid],
+                "kWh": float(result["kwh"][code]),
+                "kWhWhileOff": float(result["kwh_while_off"][code]),
+                "hoursLit": float(result["hours_lit"][code]),
+                "readings": int(result["readings"][code]),
+            }
+            for code, rid in enumerate(rids)
+        ]
+        return {
+            "from": start,
+            "to": end,
+            "restaurants": restaurants,
+            "fleet": {
+                "kWh": float(result["kwh"].sum()),
+                "kWhWhileOff": float(result["kwh_while_off"].sum()),
+                "hoursLit": float(result["hours_lit"].sum()),
+                "readings": int(result["readings"].sum()),
+            },
+        }
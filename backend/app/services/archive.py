@@ -0,0 +1,585 @@
+"""
+Cold storage for light_history and Time_Data.
+
+Rows older than ARCHIVE_AFTER_DAYS move out of MongoDB/SQLite into
+memory-mapped NumPy segments, one directory per (device, month):
+
+  ARCHIVE_DIR/index.json                            segments and archived_before per kind
+  ARCHIVE_DIR/telemetry/<deviceId>/<YYYY-MM>.<v>/   timestamp V I P uptime (.npy)
+  ARCHIVE_DIR/history/<restaurantId>/<YYYY-MM>.<v>/ timestamp id action (.npy)
+
+Timestamps are int64 epoch microseconds and every segment is sorted by them,
+so a range scan is two searchsorted calls on a memory-mapped column and the
+slice is a view into the page cache, not a copy. Segments are never edited in
+place: merging rows into a month writes a new version and swaps index.json.
+
+The Archiver moves one day per step and writes segments before deleting the
+live rows, so a crash at worst leaves rows in both places; merges drop the
+duplicates. Telemetry the rollup engine has not reached is never archived,
+and rollup buckets stay in the database. History pages, raw telemetry and
+energy reports merge archived rows with live ones.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterator
+from urllib.parse import quote
+
+import numpy as np
+
+from app.database.db import get_connection
+from app.database.mongo import get_async_mongo_db
+from app.models.collections import CollectionNames
+from app.services.light_service import UNKNOWN_LEGACY_ID, HistoryQuery, to_utc_iso
+from app.services.rollups import (
+    MEASUREMENTS,
+    RawReading,
+    ReadingColumns,
+    RollupStore,
+    _iso,
+    _sorted_columns,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "").lower() in ("1", "true", "yes")
+DEFAULT_ARCHIVE_DIR = Path(__file__).resolve().parent.parent / "database" / "archive"
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", str(DEFAULT_ARCHIVE_DIR)))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_STEP = timedelta(days=1)  # live rows read, archived and deleted per step
+ARCHIVE_OPEN_COLUMNS = 512  # memory-mapped .npy files kept open
+ARCHIVE_CURSOR_BATCH = 10000
+
+TELEMETRY = "telemetry"
+HISTORY = "history"
+# First column is the sort key of every segment
+SEGMENT_COLUMNS = {
+    TELEMETRY: ("timestamp", *MEASUREMENTS, "uptime"),
+    HISTORY: ("timestamp", "id", "action"),
+}
+INDEX_FILE = "index.json"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# (segment keys, columns) read from the live database for one step
+LiveRows = tuple[np.ndarray, dict[str, np.ndarray]]
+
+
+def _micros(moment: datetime) -> int:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - EPOCH) // MICROSECOND
+
+
+def _from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(micros))
+
+
+def iso_micros(values: list[Any]) -> np.ndarray:
+    """Epoch microseconds for stored history timestamps (UTC ISO text, or datetimes from older rows)."""
+    text = [
+        (value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value).isoformat()
+        if isinstance(value, datetime)
+        else value
+        for value in values
+    ]
+    # numpy parses naive ISO only; every stored timestamp is UTC
+    naive = [stamp[:-6] if stamp.endswith("+00:00") else stamp.rstrip("Z") for stamp in text]
+    return np.array(naive, dtype="datetime64[us]").astype(np.int64)
+
+
+def _day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _directory_name(key: str) -> str:
+    """Filesystem-safe segment directory for a device or restaurant id."""
+    return quote(key, safe="").replace(".", "%2E")
+
+
+@lru_cache(maxsize=ARCHIVE_OPEN_COLUMNS)
+def _open_column(path: str) -> np.ndarray:
+    # Segment directories are immutable, so a mapping never goes stale
+    return np.load(path, mmap_mode="r")
+
+
+def _write_column(path: Path, values: np.ndarray) -> None:
+    with open(path, "wb") as handle:
+        np.save(handle, values)
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+def _dedupe(columns: dict[str, np.ndarray], names: tuple[str, ...]) -> dict[str, np.ndarray]:
+    """Sort by names (first is primary) and drop rows equal to their predecessor in every column."""
+    order = np.lexsort(tuple(columns[name] for name in reversed(names)))
+    ordered = {name: columns[name][order] for name in names}
+    keep = np.ones(len(order), dtype=bool)
+    if len(order) > 1:
+        keep[1:] = np.logical_or.reduce([ordered[name][1:] != ordered[name][:-1] for name in names])
+    return {name: values[keep] for name, values in ordered.items()}
+
+
+class ColdArchive:
+    """Segment files plus index.json; reads reload the index when another process rewrote it."""
+
+    def __init__(self, root: Path = ARCHIVE_DIR) -> None:
+        self.root = root
+        self._index: dict[str, Any] = self._empty_index()
+        self._index_version: tuple[int, int] | None = None  # (inode, mtime) of the loaded index.json
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def _empty_index() -> dict[str, Any]:
+        return {"segments": {TELEMETRY: {}, HISTORY: {}}, "archived_before": {}}
+
+    def _current(self) -> dict[str, Any]:
+        path = self.root / INDEX_FILE
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return self._index
+        # index.json is only ever replaced, so a new inode means a new index
+        if (stat.st_ino, stat.st_mtime_ns) != self._index_version:
+            with open(path, encoding="utf-8") as handle:
+                self._index = json.load(handle)
+            self._index_version = (stat.st_ino, stat.st_mtime_ns)
+        return self._index
+
+    def _save(self, index: dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / INDEX_FILE
+        temporary = path.with_suffix(f".tmp-{os.getpid()}")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(index, handle, separators=(",", ":"))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, path)
+        stat = path.stat()
+        self._index = index
+        self._index_version = (stat.st_ino, stat.st_mtime_ns)
+
+    def archived_before(self, kind: str) -> datetime | None:
+        micros = self._current()["archived_before"].get(kind)
+        return None if micros is None else _from_micros(micros)
+
+    def covers(self, kind: str, start: datetime | None) -> bool:
+        """Whether the archive can hold rows at or after start (None: any rows at all)."""
+        micros = self._current()["archived_before"].get(kind)
+        return micros is not None and (start is None or _micros(start) < micros)
+
+    def _segments(
+        self, kind: str, keys: list[str] | None, lo: int, hi: int
+    ) -> Iterator[tuple[str, str, dict[str, Any]]]:
+        """(key, month, entry) for segments overlapping [lo, hi) microseconds."""
+        segments = self._current()["segments"][kind]
+        for key in sorted(segments) if keys is None else keys:
+            for month, entry in sorted(segments.get(key, {}).items()):
+                if entry["first"] < hi and entry["last"] >= lo:
+                    yield key, month, entry
+
+    def _columns(self, kind: str, entry: dict[str, Any]) -> dict[str, np.ndarray]:
+        directory = self.root / entry["path"]
+        return {name: _open_column(str(directory / f"{name}.npy")) for name in SEGMENT_COLUMNS[kind]}
+
+    def _scan(self, kind: str, entry: dict[str, Any], lo: int, hi: int) -> dict[str, np.ndarray]:
+        """Rows with lo <= timestamp < hi as views into the mapped segment."""
+        columns = self._columns(kind, entry)
+        first, last = np.searchsorted(columns["timestamp"], (lo, hi))
+        return {name: values[first:last] for name, values in columns.items()}
+
+    # -- writes (Archiver only) -------------------------------------------------
+
+    def write(self, kind: str, keys: np.ndarray, columns: dict[str, np.ndarray]) -> int:
+        """Merge rows into their (key, month) segments; returns the rows written."""
+        names = SEGMENT_COLUMNS[kind]
+        months = columns["timestamp"].astype("datetime64[us]").astype("datetime64[M]").astype(str)
+        keys = keys.astype(str)
+        order = np.lexsort((months, keys))
+        keys, months = keys[order], months[order]
+        columns = {name: columns[name][order] for name in names}
+        boundary = np.ones(len(order), dtype=bool)
+        boundary[1:] = (keys[1:] != keys[:-1]) | (months[1:] != months[:-1])
+        starts = np.flatnonzero(boundary)
+        ends = np.append(starts[1:], len(order))
+
+        with self._write_lock:
+            index = json.loads(json.dumps(self._current()))
+            replaced: list[Path] = []
+            for first, last in zip(starts.tolist(), ends.tolist()):
+                key, month = str(keys[first]), str(months[first])
+                rows = {name: columns[name][first:last] for name in names}
+                existing = index["segments"][kind].setdefault(key, {}).get(month)
+                if existing is not None:
+                    stored = self._columns(kind, existing)
+                    rows = {name: np.concatenate([stored[name], rows[name]]) for name in names}
+                    replaced.append(self.root / existing["path"])
+                rows = _dedupe(rows, names)
+                relative = f"{kind}/{_directory_name(key)}/{month}.{time.time_ns()}"
+                directory = self.root / relative
+                directory.mkdir(parents=True)
+                for name in names:
+                    _write_column(directory / f"{name}.npy", rows[name])
+                index["segments"][kind][key][month] = {
+                    "path": relative,
+                    "rows": len(rows["timestamp"]),
+                    "first": int(rows["timestamp"][0]),
+                    "last": int(rows["timestamp"][-1]),
+                }
+            self._save(index)
+            _open_column.cache_clear()
+            for directory in replaced:
+                shutil.rmtree(directory, ignore_errors=True)
+        return len(order)
+
+    def mark_archived(self, kind: str, before: datetime) -> None:
+        with self._write_lock:
+            index = json.loads(json.dumps(self._current()))
+            index["archived_before"][kind] = max(index["archived_before"].get(kind, 0), _micros(before))
+            self._save(index)
+
+    # -- telemetry reads --------------------------------------------------------
+
+    def telemetry_columns(
+        self, start: datetime, end: datetime, device_ids: list[str] | None = None
+    ) -> ReadingColumns:
+        lo, hi = _micros(start), _micros(end)
+        devices: list[np.ndarray] = []
+        stamps: list[np.ndarray] = []
+        values: dict[str, list[np.ndarray]] = {name: [] for name in MEASUREMENTS}
+        for key, _month, entry in self._segments(TELEMETRY, device_ids, lo, hi):
+            rows = self._scan(TELEMETRY, entry, lo, hi)
+            devices.append(np.full(len(rows["timestamp"]), key, dtype=object))
+            stamps.append(rows["timestamp"] / 1e6)
+            for name in MEASUREMENTS:
+                values[name].append(rows[name])
+        if not stamps:
+            return _sorted_columns([], [], {name: [] for name in MEASUREMENTS})
+        return _sorted_columns(
+            np.concatenate(devices),
+            np.concatenate(stamps),
+            {name: np.concatenate(parts) for name, parts in values.items()},
+        )
+
+    def telemetry_raw(self, device_id: str, start: datetime, end: datetime, limit: int) -> list[RawReading]:
+        lo, hi = _micros(start), _micros(end)
+        readings: list[RawReading] = []
+        for _key, _month, entry in self._segments(TELEMETRY, [device_id], lo, hi):
+            rows = self._scan(TELEMETRY, entry, lo, hi)
+            count = min(len(rows["timestamp"]), limit - len(readings))
+            measurements = {name: rows[name][:count].tolist() for name in MEASUREMENTS}
+            readings.extend(
+                (_from_micros(micros), {name: measurements[name][i] for name in MEASUREMENTS})
+                for i, micros in enumerate(rows["timestamp"][:count].tolist())
+            )
+            if len(readings) >= limit:
+                break
+        return readings
+
+    # -- history reads ----------------------------------------------------------
+
+    def history_page(self, restaurant_id: int | None, query: HistoryQuery) -> list[dict[str, Any]]:
+        """Archived rows for one page, newest first, in the repository row shape."""
+        lo = _micros(datetime.fromisoformat(query.start)) if query.start else np.iinfo(np.int64).min
+        hi = _micros(datetime.fromisoformat(query.end)) if query.end else np.iinfo(np.int64).max
+        before_micros = before_id = None
+        if query.before is not None:
+            before_micros = _micros(datetime.fromisoformat(query.before[0]))
+            before_id = query.before[1]
+            hi = min(hi, before_micros + 1)
+        keys = None if restaurant_id is None else [str(restaurant_id)]
+        by_month: dict[str, list[tuple[str, dict[str, Any]]]] = {}
+        for key, month, entry in self._segments(HISTORY, keys, lo, hi):
+            by_month.setdefault(month, []).append((key, entry))
+
+        found: list[tuple[int, Any, str, str]] = []  # (timestamp, id, action, key)
+        # Months never overlap: once a month fills the page, older ones cannot rank higher
+        for month in sorted(by_month, reverse=True):
+            for key, entry in by_month[month]:
+                rows = self._scan(HISTORY, entry, lo, hi)
+                match = np.ones(len(rows["timestamp"]), dtype=bool)
+                if query.action is not None:
+                    match &= rows["action"] == query.action
+                if before_micros is not None:
+                    match &= (rows["timestamp"] < before_micros) | (
+                        (rows["timestamp"] == before_micros) & (rows["id"] < before_id)
+                    )
+                for i in np.flatnonzero(match)[-query.limit:].tolist():
+                    found.append((int(rows["timestamp"][i]), rows["id"][i].item(), str(rows["action"][i]), key))
+            if len(found) >= query.limit:
+                break
+        found.sort(key=lambda row: (row[0], row[1]), reverse=True)
+        return [
+            {
+                "id": row_id,
+                "restaurant_id": int(key),
+                "action": action,
+                "timestamp": _from_micros(micros).isoformat(),
+            }
+            for micros, row_id, action, key in found[: query.limit]
+        ]
+
+    def history_events(
+        self, restaurant_ids: list[int], start: datetime, end: datetime, actions: tuple[str, ...]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(restaurant ids, epoch microseconds, actions) of archived rows in [start, end) with one of actions."""
+        lo, hi = _micros(start), _micros(end)
+        ids: list[np.ndarray] = []
+        stamps: list[np.ndarray] = []
+        names: list[np.ndarray] = []
+        for key, _month, entry in self._segments(HISTORY, [str(rid) for rid in restaurant_ids], lo, hi):
+            rows = self._scan(HISTORY, entry, lo, hi)
+            match = np.isin(rows["action"], actions)
+            ids.append(np.full(int(match.sum()), int(key), dtype=np.int64))
+            stamps.append(rows["timestamp"][match])
+            names.append(rows["action"][match].astype(str))
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=str)
+        return np.concatenate(ids), np.concatenate(stamps), np.concatenate(names)
+
+    def last_history_actions(
+        self, restaurant_ids: list[int], before: datetime, actions: tuple[str, ...]
+    ) -> dict[int, str]:
+        """Newest archived action (one of actions) before `before`, per restaurant."""
+        hi = _micros(before)
+        latest: dict[int, str] = {}
+        for rid in restaurant_ids:
+            segments = list(self._segments(HISTORY, [str(rid)], np.iinfo(np.int64).min, hi))
+            for _key, _month, entry in reversed(segments):
+                rows = self._scan(HISTORY, entry, np.iinfo(np.int64).min, hi)
+                match = np.flatnonzero(np.isin(rows["action"], actions))
+                if len(match):
+                    latest[rid] = str(rows["action"][match[-1]])
+                    break
+        return latest
+
+
+class ArchiveSource(ABC):
+    """Live rows the Archiver moves, per backend."""
+
+    @abstractmethod
+    async def earliest(self, kind: str) -> datetime | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def read(self, kind: str, start: datetime, end: datetime) -> LiveRows:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, kind: str, start: datetime, end: datetime) -> int:
+        raise NotImplementedError
+
+
+class MongoArchiveSource(ArchiveSource):
+    TIME_DATA = CollectionNames.TIME_DATA
+    LIGHT_HISTORY = CollectionNames.LIGHT_HISTORY
+
+    def __init__(self) -> None:
+        self._db = get_async_mongo_db()
+
+    @staticmethod
+    def _history_filter(start: datetime, end: datetime) -> dict[str, Any]:
+        # ISO strings, plus BSON dates written by older versions
+        return {
+            "$or": [
+                {"timestamp": {"$gte": to_utc_iso(start), "$lt": to_utc_iso(end)}},
+                {"timestamp": {"$gte": start, "$lt": end}},
+            ]
+        }
+
+    async def earliest(self, kind: str) -> datetime | None:
+        if kind == TELEMETRY:
+            document = await self._db[self.TIME_DATA].find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+            return None if document is None else document["timestamp"].replace(tzinfo=timezone.utc)
+        document = await self._db[self.LIGHT_HISTORY].find_one(
+            {"timestamp": {"$type": "string"}}, {"timestamp": 1}, sort=[("timestamp", 1)]
+        )
+        return None if document is None else datetime.fromisoformat(document["timestamp"])
+
+    async def read(self, kind: str, start: datetime, end: datetime) -> LiveRows:
+        if kind == TELEMETRY:
+            cursor = self._db[self.TIME_DATA].find(
+                {"timestamp": {"$gte": start, "$lt": end}},
+                {"_id": 0, "timestamp": 1, "metadata.deviceId": 1, "measurements": 1},
+            ).batch_size(ARCHIVE_CURSOR_BATCH)
+            documents = [document async for document in cursor]
+            return np.array([document["metadata"]["deviceId"] for document in documents], dtype=object), {
+                "timestamp": np.array(
+                    [document["timestamp"] for document in documents], dtype="datetime64[us]"
+                ).astype(np.int64),
+                **{
+                    name: np.array([document["measurements"][name] for document in documents], dtype=np.float64)
+                    for name in MEASUREMENTS
+                },
+                "uptime": np.array(
+                    [document["measurements"].get("uptime", 0) for document in documents], dtype=np.int64
+                ),
+            }
+        cursor = self._db[self.LIGHT_HISTORY].find(
+            self._history_filter(start, end), {"legacyId": 1, "action": 1, "timestamp": 1}
+        ).batch_size(ARCHIVE_CURSOR_BATCH)
+        documents = [document async for document in cursor]
+        keys = [document.get("legacyId") or UNKNOWN_LEGACY_ID for document in documents]
+        return np.array(keys, dtype=object), {
+            "timestamp": iso_micros([document["timestamp"] for document in documents]),
+            "id": np.array([str(document["_id"]) for document in documents], dtype=str),
+            "action": np.array([document["action"] for document in documents], dtype=str),
+        }
+
+    async def delete(self, kind: str, start: datetime, end: datetime) -> int:
+        if kind == TELEMETRY:
+            result = await self._db[self.TIME_DATA].delete_many({"timestamp": {"$gte": start, "$lt": end}})
+        else:
+            result = await self._db[self.LIGHT_HISTORY].delete_many(self._history_filter(start, end))
+        return result.deleted_count
+
+
+class SQLiteArchiveSource(ArchiveSource):
+    async def earliest(self, kind: str) -> datetime | None:
+        return await asyncio.to_thread(self._earliest, kind)
+
+    @staticmethod
+    def _earliest(kind: str) -> datetime | None:
+        table = "telemetry" if kind == TELEMETRY else "light_history"
+        with get_connection() as conn:
+            row = conn.execute(f"SELECT min(timestamp) AS earliest FROM {table}").fetchone()
+        return None if row["earliest"] is None else datetime.fromisoformat(row["earliest"])
+
+    @staticmethod
+    def _bounds(kind: str, start: datetime, end: datetime) -> tuple[str, str]:
+        # Each table's own timestamp format, so text comparison matches time order
+        if kind == TELEMETRY:
+            return _iso(start), _iso(end)
+        return to_utc_iso(start), to_utc_iso(end)
+
+    async def read(self, kind: str, start: datetime, end: datetime) -> LiveRows:
+        return await asyncio.to_thread(self._read, kind, start, end)
+
+    def _read(self, kind: str, start: datetime, end: datetime) -> LiveRows:
+        bounds = self._bounds(kind, start, end)
+        with get_connection() as conn:
+            if kind == TELEMETRY:
+                rows = conn.execute(
+                    """
+                    SELECT restaurant_id, timestamp, voltage, current, power, uptime FROM telemetry
+                    WHERE timestamp >= ? AND timestamp < ?
+                    """,
+                    bounds,
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    """
+                    SELECT restaurant_id, timestamp, id, action FROM light_history
+                    WHERE timestamp >= ? AND timestamp < ?
+                    """,
+                    bounds,
+                ).fetchall()
+        keys = np.array([str(row[0]) for row in rows], dtype=object)
+        if kind == TELEMETRY:
+            return keys, {
+                "timestamp": np.array([row[1][:26] for row in rows], dtype="datetime64[us]").astype(np.int64),
+                "V": np.array([row[2] for row in rows], dtype=np.float64),
+                "I": np.array([row[3] for row in rows], dtype=np.float64),
+                "P": np.array([row[4] for row in rows], dtype=np.float64),
+                "uptime": np.array([row[5] for row in rows], dtype=np.int64),
+            }
+        return keys, {
+            "timestamp": iso_micros([row[1] for row in rows]),
+            "id": np.array([row[2] for row in rows], dtype=np.int64),
+            "action": np.array([row[3] for row in rows], dtype=str),
+        }
+
+    async def delete(self, kind: str, start: datetime, end: datetime) -> int:
+        return await asyncio.to_thread(self._delete, kind, start, end)
+
+    def _delete(self, kind: str, start: datetime, end: datetime) -> int:
+        table = "telemetry" if kind == TELEMETRY else "light_history"
+        with get_connection() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM {table} WHERE timestamp >= ? AND timestamp < ?", self._bounds(kind, start, end)
+            )
+            return cursor.rowcount
+
+
+class Archiver:
+    """Moves whole days older than ARCHIVE_AFTER_DAYS from the live database into the archive."""
+
+    def __init__(
+        self,
+        archive: ColdArchive,
+        source: ArchiveSource,
+        rollup_store: RollupStore,
+        after_days: int = ARCHIVE_AFTER_DAYS,
+        interval_seconds: float = ARCHIVE_INTERVAL_SECONDS,
+    ) -> None:
+        self.archive = archive
+        self.source = source
+        self.rollup_store = rollup_store
+        self.after = timedelta(days=after_days)
+        self.interval_seconds = interval_seconds
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.archive_once()
+            except Exception:
+                logger.exception("archive pass failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def archive_once(self, now: datetime | None = None) -> dict[str, int]:
+        """Archive everything before the cutoff; returns rows moved per kind."""
+        moved: dict[str, int] = {}
+        async with self._lock:
+            cutoff = _day((now or datetime.now(timezone.utc)) - self.after)
+            for kind in (HISTORY, TELEMETRY):
+                kind_cutoff = cutoff
+                if kind == TELEMETRY:
+                    # Buckets are built from live rows, so stay behind the rollup mark
+                    state = await self.rollup_store.load_state()
+                    if state.mark is not None:
+                        kind_cutoff = min(kind_cutoff, _day(state.mark))
+                moved[kind] = await self._archive_kind(kind, kind_cutoff)
+        return moved
+
+    async def _archive_kind(self, kind: str, cutoff: datetime) -> int:
+        earliest = await self.source.earliest(kind)
+        if earliest is None:
+            return 0
+        if earliest.tzinfo is None:
+            earliest = earliest.replace(tzinfo=timezone.utc)
+        moved = 0
+        step_start = _day(earliest)
+        while step_start < cutoff:
+            step_end = min(step_start + ARCHIVE_STEP, cutoff)
+            keys, columns = await self.source.read(kind, step_start, step_end)
+            if len(keys):
+                moved += await asyncio.to_thread(self.archive.write, kind, keys, columns)
+                await self.source.delete(kind, step_start, step_end)
+            step_start = step_end
+        if moved or self.archive.archived_before(kind) is not None:
+            await asyncio.to_thread(self.archive.mark_archived, kind, cutoff)
+        return moved
@@ -0,0 +1,527 @@
+"""
+Async variants of the LightRepository interface used by the request path.
+
+AsyncMongoLightRepository talks to MongoDB with pymongo's native asyncio client
+(there is no sync Mongo repository; scripts drive this one with asyncio.run).
+ThreadedLightRepository runs any sync LightRepository (SQLite) in worker threads
+so a blocking query never stalls the event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from app.database.mongo import get_async_mongo_db
+from app.models.collections import CollectionNames
+from app.services.device_cache import DEVICE_REF_PROJECTION, MISS, DeviceResolutionCache
+from app.services.history_writer import HistoryWriter
+from app.services.light_service import (
+    DEVICE_BATCH_PROJECTION,
+    DEVICE_SCHEDULE_PROJECTION,
+    DEVICE_WRITE_PROJECTION,
+    HISTORY_SORT,
+    MONGO_SORT_ASCENDING,
+    SCHEDULE_RULES_PROJECTION,
+    UNKNOWN_LEGACY_ID,
+    VERSION_PROJECTION,
+    BatchResult,
+    HistoryQuery,
+    LightCommand,
+    LightRepository,
+    _apply_light_command,
+    _batch_rows,
+    _default_status_row,
+    _full_schedule_response,
+    document_version,
+    _history_entry,
+    _history_filter,
+    _history_row,
+    _light_update,
+    _needs_schedule_doc,
+    _next_toggle_state,
+    _schedule_action,
+    _schedule_document,
+    _schedule_devices_filter,
+    _schedule_filter,
+    _schedule_rules_by_legacy_id,
+    _schedules_filter,
+    _schedule_update,
+    _set_light_operations,
+    _set_light_pipeline,
+    _status_row,
+    _toggle_action,
+    _toggle_pipeline,
+    _utc_now_iso,
+)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class AsyncLightRepository(ABC):
+    """Same contract as LightRepository, with every method awaitable."""
+
+    # Fan-out selectors match Devices fields (address, owner, firmware) that
+    # only the MongoDB schema has.
+    SUPPORTS_DEVICE_SELECTORS = False
+
+    # When set, history entries are handed to the background group-commit
+    # writer instead of being inserted inside the request.
+    history_writer: HistoryWriter | None = None
+
+    @abstractmethod
+    async def get_or_create_light(self, restaurant_id: int) -> dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_light(
+        self,
+        restaurant_id: int,
+        state: str,
+        brightness: int,
+        schedule_on: str | None = None,
+        schedule_off: str | None = None,
+    ) -> dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_history(self, restaurant_id: int, action: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_history_many(self, entries: list[Any]) -> None:
+        """Insert history entries already in the backend's row format (HistoryWriter sink)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_history(
+        self, restaurant_id: int | None = None, query: HistoryQuery = HistoryQuery()
+    ) -> list[dict[str, Any]]:
+        raise NotImplementedError
+
+    async def toggle_light(self, restaurant_id: int) -> dict[str, Any]:
+        current = await self.get_or_create_light(restaurant_id)
+        next_state, next_brightness, action = _next_toggle_state(current)
+        updated = await self.update_light(
+            restaurant_id=restaurant_id,
+            state=next_state,
+            brightness=next_brightness,
+        )
+        await self.add_history(restaurant_id, action)
+        return updated
+
+    async def set_schedule(self, restaurant_id: int, schedule_on: str, schedule_off: str) -> dict[str, Any]:
+        current = await self.get_or_create_light(restaurant_id)
+        updated = await self.update_light(
+            restaurant_id=restaurant_id,
+            state=current["state"],
+            brightness=current["brightness"],
+            schedule_on=schedule_on,
+            schedule_off=schedule_off,
+        )
+        await self.add_history(restaurant_id, _schedule_action(schedule_on, schedule_off))
+        return updated
+
+    async def get_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        rows = await asyncio.gather(*(self.get_or_create_light(rid) for rid in restaurant_ids))
+        return dict(zip(restaurant_ids, rows)), {}
+
+    async def toggle_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        rows = await asyncio.gather(*(self.toggle_light(rid) for rid in restaurant_ids))
+        return dict(zip(restaurant_ids, rows)), {}
+
+    async def set_lights(self, commands: dict[int, LightCommand]) -> BatchResult:
+        rows: dict[int, dict[str, Any]] = {}
+        for rid, (state, brightness) in commands.items():
+            current = await self.get_or_create_light(rid)
+            next_state, next_brightness, action = _apply_light_command(current, state, brightness)
+            rows[rid] = await self.update_light(rid, next_state, next_brightness)
+            await self.add_history(rid, action)
+        return rows, {}
+
+    # Only called when SUPPORTS_DEVICE_SELECTORS is set; callers check the flag first.
+    def iter_selected_devices(
+        self, device_filter: dict[str, Any], batch_size: int
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Device refs matching a Devices query, in lists of at most batch_size."""
+        raise RuntimeError(f"{type(self).__name__} does not support device selectors")
+
+    async def set_devices(
+        self, devices: list[dict[str, Any]], state: str, brightness: int | None, action: str
+    ) -> tuple[int, int]:
+        """Apply one command to the given device refs; returns (modified, history rows written)."""
+        raise RuntimeError(f"{type(self).__name__} does not support device selectors")
+
+    def invalidate_device(self, device_id: Any, restaurant_id: int | None = None) -> None:
+        """Drop cached resolution for a device changed elsewhere; no-op without a cache."""
+
+    @abstractmethod
+    async def get_schedule_rules(
+        self, restaurant_ids: list[int] | None = None
+    ) -> dict[int, list[dict[str, Any]]]:
+        raise NotImplementedError
+
+    async def get_light_version(self, restaurant_id: int) -> datetime | None:
+        """See LightRepository.get_light_version."""
+        return None
+
+    async def get_schedule_version(self, restaurant_id: int) -> datetime | None:
+        return None
+
+    @abstractmethod
+    async def save_full_schedule(self, restaurant_id: int, rules: list[dict[str, Any]]) -> dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_full_schedule(self, restaurant_id: int) -> dict[str, Any]:
+        raise NotImplementedError
+
+
+class ThreadedLightRepository(AsyncLightRepository):
+    """Runs a sync repository off the event loop (used for SQLite)."""
+
+    def __init__(self, repository: LightRepository) -> None:
+        self.repository = repository
+
+    async def get_or_create_light(self, restaurant_id: int) -> dict[str, Any]:
+        return await asyncio.to_thread(self.repository.get_or_create_light, restaurant_id)
+
+    async def update_light(
+        self,
+        restaurant_id: int,
+        state: str,
+        brightness: int,
+        schedule_on: str | None = None,
+        schedule_off: str | None = None,
+    ) -> dict[str, Any]:
+        return await asyncio.to_thread(
+            self.repository.update_light, restaurant_id, state, brightness, schedule_on, schedule_off
+        )
+
+    async def add_history(self, restaurant_id: int, action: str) -> None:
+        if self.history_writer is None:
+            await asyncio.to_thread(self.repository.add_history, restaurant_id, action)
+        else:
+            await self.history_writer.submit([(restaurant_id, action, _utc_now_iso())])
+
+    async def add_history_many(self, entries: list[tuple[int, str, str]]) -> None:
+        await asyncio.to_thread(self.repository.add_history_many, entries)
+
+    async def get_history(
+        self, restaurant_id: int | None = None, query: HistoryQuery = HistoryQuery()
+    ) -> list[dict[str, Any]]:
+        return await asyncio.to_thread(self.repository.get_history, restaurant_id, query)
+
+    async def toggle_light(self, restaurant_id: int) -> dict[str, Any]:
+        return await asyncio.to_thread(self.repository.toggle_light, restaurant_id)
+
+    async def set_schedule(self, restaurant_id: int, schedule_on: str, schedule_off: str) -> dict[str, Any]:
+        return await asyncio.to_thread(
+            self.repository.set_schedule, restaurant_id, schedule_on, schedule_off
+        )
+
+    async def get_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        return await asyncio.to_thread(self.repository.get_lights, restaurant_ids)
+
+    async def toggle_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        return await asyncio.to_thread(self.repository.toggle_lights, restaurant_ids)
+
+    async def set_lights(self, commands: dict[int, LightCommand]) -> BatchResult:
+        return await asyncio.to_thread(self.repository.set_lights, commands)
+
+    async def get_schedule_rules(
+        self, restaurant_ids: list[int] | None = None
+    ) -> dict[int, list[dict[str, Any]]]:
+        return await asyncio.to_thread(self.repository.get_schedule_rules, restaurant_ids)
+
+    async def save_full_schedule(self, restaurant_id: int, rules: list[dict[str, Any]]) -> dict[str, Any]:
+        return await asyncio.to_thread(self.repository.save_full_schedule, restaurant_id, rules)
+
+    async def get_full_schedule(self, restaurant_id: int) -> dict[str, Any]:
+        return await asyncio.to_thread(self.repository.get_full_schedule, restaurant_id)
+
+    async def get_light_version(self, restaurant_id: int) -> datetime | None:
+        return await asyncio.to_thread(self.repository.get_light_version, restaurant_id)
+
+    async def get_schedule_version(self, restaurant_id: int) -> datetime | None:
+        return await asyncio.to_thread(self.repository.get_schedule_version, restaurant_id)
+
+
+class AsyncMongoLightRepository(AsyncLightRepository):
+    """
+    SD_IoT MongoDB (Devices, light_history, Schedules) over pymongo's asyncio
+    client; the only Mongo implementation of the repository contract.
+    Documents are built with the helpers in app.services.light_service.
+    """
+    DEVICES = CollectionNames.DEVICES
+    SCHEDULES = CollectionNames.SCHEDULES
+    LIGHT_HISTORY = CollectionNames.LIGHT_HISTORY
+    SUPPORTS_DEVICE_SELECTORS = True
+
+    def __init__(self, device_cache: DeviceResolutionCache | None = None) -> None:
+        self._db = get_async_mongo_db()
+        self.device_cache = device_cache or DeviceResolutionCache()
+
+    async def _device_for_restaurant_id(self, restaurant_id: int) -> dict[str, Any] | None:
+        cached = self.device_cache.get(restaurant_id)
+        if cached is not MISS:
+            return cached
+        devices = self._db[self.DEVICES]
+        device_doc = await devices.find_one({"legacyId": restaurant_id}, DEVICE_REF_PROJECTION)
+        if device_doc is None:
+            cursor = (
+                devices.find({}, DEVICE_REF_PROJECTION)
+                .sort("_id", MONGO_SORT_ASCENDING)
+                .skip(restaurant_id - 1)
+                .limit(1)
+            )
+            device_doc = next(iter(await cursor.to_list(length=1)), None)
+        return self.device_cache.put(restaurant_id, device_doc)
+
+    def invalidate_device(self, device_id: Any, restaurant_id: int | None = None) -> None:
+        """Call when a Devices document changes outside this repository."""
+        self.device_cache.invalidate_device(device_id)
+        if restaurant_id is not None:
+            # Also drops a negative entry, so a newly provisioned legacyId resolves at once
+            self.device_cache.invalidate(restaurant_id)
+
+    async def _schedule_for_device(self, device: dict[str, Any]) -> dict[str, Any] | None:
+        schedule_filter = _schedule_filter(device)
+        if schedule_filter is None:
+            return None
+        return await self._db[self.SCHEDULES].find_one(schedule_filter)
+
+    async def get_or_create_light(self, restaurant_id: int) -> dict[str, Any]:
+        for _attempt in range(2):
+            device_ref = await self._device_for_restaurant_id(restaurant_id)
+            if device_ref is None:
+                return _default_status_row(restaurant_id)
+            device = await self._db[self.DEVICES].find_one({"_id": device_ref["_id"]})
+            if device is not None:
+                # Schedules is only read when the device has no scheduleOn/Off of its own
+                schedule_doc = await self._schedule_for_device(device) if _needs_schedule_doc(device) else None
+                return _status_row(device, restaurant_id, schedule_doc)
+            # Cached device was deleted; resolve again from the database.
+            self.device_cache.invalidate(restaurant_id)
+        return _default_status_row(restaurant_id)
+
+    async def _find_and_update_device(
+        self, restaurant_id: int, update: dict[str, Any] | list[dict[str, Any]]
+    ) -> dict[str, Any] | None:
+        devices = self._db[self.DEVICES]
+        for _attempt in range(2):
+            device_ref = await self._device_for_restaurant_id(restaurant_id)
+            if device_ref is None:
+                return None
+            device = await devices.find_one_and_update(
+                {"_id": device_ref["_id"]},
+                update,
+                projection=DEVICE_WRITE_PROJECTION,
+                return_document=ReturnDocument.AFTER,
+            )
+            if device is not None:
+                return device
+            self.device_cache.invalidate(restaurant_id)
+        return None
+
+    async def update_light(
+        self,
+        restaurant_id: int,
+        state: str,
+        brightness: int,
+        schedule_on: str | None = None,
+        schedule_off: str | None = None,
+    ) -> dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        device = await self._find_and_update_device(
+            restaurant_id, _light_update(state, brightness, schedule_on, schedule_off, now)
+        )
+        if device is None:
+            return await self.get_or_create_light(restaurant_id)
+        return _status_row(device, restaurant_id)
+
+    async def _insert_history(
+        self,
+        device: dict[str, Any] | None,
+        restaurant_id: int,
+        action: str,
+        now: datetime,
+    ) -> None:
+        await self._write_history([_history_entry(device, restaurant_id, action, now)])
+
+    async def _write_history(self, entries: list[dict[str, Any]]) -> None:
+        """Queue for the group-commit writer, or insert now when there is none."""
+        if self.history_writer is not None:
+            await self.history_writer.submit(entries)
+        elif len(entries) == 1:
+            await self._db[self.LIGHT_HISTORY].insert_one(entries[0])
+        else:
+            await self.add_history_many(entries)
+
+    async def add_history(self, restaurant_id: int, action: str) -> None:
+        device = await self._device_for_restaurant_id(restaurant_id)
+        await self._insert_history(device, restaurant_id, action, datetime.now(timezone.utc))
+
+    async def add_history_many(self, entries: list[dict[str, Any]]) -> None:
+        if not entries:
+            return
+        try:
+            await self._db[self.LIGHT_HISTORY].insert_many(entries, ordered=False)
+        except BulkWriteError as exc:
+            # A retried batch keeps its _ids, so rows that made it the first time are duplicates
+            errors = exc.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+
+    async def toggle_light(self, restaurant_id: int) -> dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        device = await self._find_and_update_device(restaurant_id, _toggle_pipeline(now))
+        if device is None:
+            return await super().toggle_light(restaurant_id)
+        await self._insert_history(device, restaurant_id, _toggle_action(device), now)
+        return _status_row(device, restaurant_id)
+
+    async def set_schedule(self, restaurant_id: int, schedule_on: str, schedule_off: str) -> dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        device = await self._find_and_update_device(
+            restaurant_id, _schedule_update(schedule_on, schedule_off, now)
+        )
+        if device is None:
+            return await super().set_schedule(restaurant_id, schedule_on, schedule_off)
+        await self._insert_history(device, restaurant_id, _schedule_action(schedule_on, schedule_off), now)
+        return _status_row(device, restaurant_id)
+
+    async def _devices_by_legacy_id(self, restaurant_ids: list[int]) -> dict[int, dict[str, Any]]:
+        """One $in query; also warms the resolution cache. No positional fallback."""
+        devices = {}
+        cursor = self._db[self.DEVICES].find({"legacyId": {"$in": restaurant_ids}}, DEVICE_BATCH_PROJECTION)
+        async for device in cursor:
+            self.device_cache.put(device["legacyId"], device)
+            devices[device["legacyId"]] = device
+        return devices
+
+    async def get_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        devices = await self._devices_by_legacy_id(restaurant_ids)
+        return _batch_rows(restaurant_ids, devices)
+
+    async def toggle_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        """Three round trips for any batch size: update_many, $in read-back, insert_many."""
+        now = datetime.now(timezone.utc)
+        await self._db[self.DEVICES].update_many(
+            {"legacyId": {"$in": restaurant_ids}}, _toggle_pipeline(now)
+        )
+        devices = await self._devices_by_legacy_id(restaurant_ids)
+        await self._insert_history_many(
+            devices, {rid: _toggle_action(device) for rid, device in devices.items()}, now
+        )
+        return _batch_rows(restaurant_ids, devices)
+
+    async def set_lights(self, commands: dict[int, LightCommand]) -> BatchResult:
+        """Three round trips for any batch size: bulk_write, $in read-back, insert_many."""
+        now = datetime.now(timezone.utc)
+        await self._db[self.DEVICES].bulk_write(_set_light_operations(commands, now), ordered=False)
+        devices = await self._devices_by_legacy_id(list(commands))
+        await self._insert_history_many(
+            devices,
+            {rid: f"set_{_status_row(device, rid)['state']}" for rid, device in devices.items()},
+            now,
+        )
+        return _batch_rows(list(commands), devices)
+
+    async def _insert_history_many(
+        self, devices: dict[int, dict[str, Any]], actions: dict[int, str], now: datetime
+    ) -> None:
+        entries = [_history_entry(devices[rid], rid, action, now) for rid, action in actions.items()]
+        await self._write_history(entries)
+
+    async def iter_selected_devices(
+        self, device_filter: dict[str, Any], batch_size: int
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """One cursor (getMore per batch_size docs); also warms the resolution cache."""
+        cursor = self._db[self.DEVICES].find(device_filter, DEVICE_REF_PROJECTION).batch_size(batch_size)
+        batch: list[dict[str, Any]] = []
+        async for device in cursor:
+            if device.get("legacyId") is not None:
+                self.device_cache.put(device["legacyId"], device)
+            batch.append(device)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def set_devices(
+        self, devices: list[dict[str, Any]], state: str, brightness: int | None, action: str
+    ) -> tuple[int, int]:
+        """Two round trips per batch (one with the history writer): update_many by _id, insert_many."""
+        if not devices:
+            return 0, 0
+        now = datetime.now(timezone.utc)
+        result = await self._db[self.DEVICES].update_many(
+            {"_id": {"$in": [device["_id"] for device in devices]}},
+            _set_light_pipeline(state, brightness, now),
+        )
+        entries = [
+            _history_entry(device, device.get("legacyId", UNKNOWN_LEGACY_ID), action, now)
+            for device in devices
+        ]
+        await self._write_history(entries)
+        return result.modified_count, len(entries)
+
+    async def get_history(
+        self, restaurant_id: int | None = None, query: HistoryQuery = HistoryQuery()
+    ) -> list[dict[str, Any]]:
+        cursor = self._db[self.LIGHT_HISTORY].find(_history_filter(restaurant_id, query)).sort(
+            HISTORY_SORT
+        ).limit(query.limit)
+        return [_history_row(history_doc, restaurant_id) async for history_doc in cursor]
+
+    async def get_schedule_rules(
+        self, restaurant_ids: list[int] | None = None
+    ) -> dict[int, list[dict[str, Any]]]:
+        """Two round trips for any number of devices: Devices, then their Schedules."""
+        devices = await self._db[self.DEVICES].find(
+            _schedule_devices_filter(restaurant_ids), DEVICE_SCHEDULE_PROJECTION
+        ).to_list()
+        schedules = await self._db[self.SCHEDULES].find(
+            _schedules_filter(devices), SCHEDULE_RULES_PROJECTION
+        ).to_list()
+        return _schedule_rules_by_legacy_id(devices, schedules)
+
+    async def save_full_schedule(self, restaurant_id: int, rules: list[dict[str, Any]]) -> dict[str, Any]:
+        device = await self._device_for_restaurant_id(restaurant_id)
+        if not device:
+            raise ValueError(f"Device with legacyId {restaurant_id} not found")
+        now = datetime.now(timezone.utc)
+        schedule_data = _schedule_document(device, rules, now)
+        # Upsert keyed on deviceId; createdAt is only written on insert.
+        await self._db[self.SCHEDULES].update_one(
+            {"deviceId": device["_id"]},
+            {"$set": schedule_data, "$setOnInsert": {"createdAt": now}},
+            upsert=True,
+        )
+        await self._insert_history(device, restaurant_id, "schedule_updated", now)
+        return await self.get_full_schedule(restaurant_id)
+
+    async def get_full_schedule(self, restaurant_id: int) -> dict[str, Any]:
+        device = await self._device_for_restaurant_id(restaurant_id)
+        if not device:
+            return {"deviceId": None, "rules": []}
+        schedule = await self._db[self.SCHEDULES].find_one({"deviceId": device["_id"]})
+        return _full_schedule_response(device, schedule)
+
+    async def get_light_version(self, restaurant_id: int) -> datetime | None:
+        document = await self._db[self.DEVICES].find_one({"legacyId": restaurant_id}, VERSION_PROJECTION)
+        return document_version(document)
+
+    async def get_schedule_version(self, restaurant_id: int) -> datetime | None:
+        device = await self._device_for_restaurant_id(restaurant_id)
+        if not device:
+            return None
+        return document_version(
+            await self._db[self.SCHEDULES].find_one({"deviceId": device["_id"]}, VERSION_PROJECTION)
+        )
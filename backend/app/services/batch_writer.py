@@ -0,0 +1,168 @@
+"""
+Background group-commit writer.
+
+Producers hand entries to submit() and return; a single task drains the
+buffer into one sink call (insert_many / executemany) whenever batch_size
+entries are waiting or flush_interval_seconds has passed, whichever comes
+first. A failed batch is retried BATCH_WRITE_ATTEMPTS times, then dropped.
+
+With durable=True, submit() waits until the batch holding its last entry is
+committed; concurrent callers still share one commit.
+
+The buffer holds at most max_pending entries; when it is full, submit()
+waits for the next flush (backpressure) instead of growing, and offer() drops
+the overflow.
+
+Each consumer builds its own writer from its own settings: light history
+(app.services.history_writer), telemetry readings and command acks.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+BATCH_WRITE_ATTEMPTS = 3
+BATCH_RETRY_SECONDS = 0.5
+
+BatchSink = Callable[[list[Any]], Awaitable[None]]
+
+
+class BatchWriter:
+    def __init__(
+        self,
+        sink: BatchSink,
+        batch_size: int,
+        flush_interval_seconds: float,
+        max_pending: int,
+        durable: bool = False,
+        name: str = "batch",
+        retry_seconds: float = BATCH_RETRY_SECONDS,
+    ) -> None:
+        self.sink = sink
+        self.name = name
+        self.durable = durable
+        self.retry_seconds = retry_seconds
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max(max_pending, batch_size)
+        # (entry, future resolved when it is committed; set on the last entry of a sync submit)
+        self._pending: deque[tuple[Any, asyncio.Future[None] | None]] = deque()
+        self._space = asyncio.Condition()
+        self._flush_now = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._closing = False
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Flush everything still buffered, then stop (FastAPI lifespan shutdown)."""
+        if self._task is not None:
+            # Not cancelled: a flush in progress finishes and resolves its futures
+            self._closing = True
+            self._flush_now.set()
+            await self._task
+            self._task = None
+            self._closing = False
+        while self._pending:
+            await self._flush()
+
+    async def submit(self, entries: list[Any]) -> None:
+        if not entries:
+            return
+        future = asyncio.get_running_loop().create_future() if self.durable else None
+        start = 0
+        while start < len(entries):
+            # Admit what fits, so a submit larger than the buffer never overfills it
+            async with self._space:
+                await self._space.wait_for(lambda: len(self._pending) < self.max_pending)
+                end = min(len(entries), start + self.max_pending - len(self._pending))
+                self._pending.extend((entry, None) for entry in entries[start:end - 1])
+                self._pending.append((entries[end - 1], future if end == len(entries) else None))
+                start = end
+            if self._task is None:
+                while self._pending:  # not started (scripts, tests): write through
+                    await self._flush()
+            elif len(self._pending) >= self.batch_size:
+                self._flush_now.set()
+        if future is not None:
+            await future
+
+    async def wait_for_space(self, count: int) -> None:
+        """Wait until count more entries (at most a full buffer) can be buffered at once."""
+        needed = min(count, self.max_pending)
+        async with self._space:
+            await self._space.wait_for(lambda: len(self._pending) + needed <= self.max_pending)
+
+    def offer(self, entries: list[Any]) -> int:
+        """Buffer what fits without waiting and return how many were taken; the rest count as dropped."""
+        taken = entries[: max(self.max_pending - len(self._pending), 0)]
+        self._pending.extend((entry, None) for entry in taken)
+        self.dropped += len(entries) - len(taken)
+        if len(self._pending) >= self.batch_size:
+            self._flush_now.set()
+        return len(taken)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            while self._pending:
+                await self._flush()
+            if self._closing:
+                return
+
+    async def _flush(self) -> None:
+        count = min(len(self._pending), self.batch_size)
+        batch = [self._pending.popleft() for _ in range(count)]
+        error: Exception | None = None
+        for attempt in range(BATCH_WRITE_ATTEMPTS):
+            try:
+                await self.sink([entry for entry, _future in batch])
+                error = None
+                break
+            except Exception as exc:
+                error = exc
+                logger.warning(
+                    "%s: batch of %d entries failed (attempt %d): %s", self.name, count, attempt + 1, exc
+                )
+                if attempt + 1 < BATCH_WRITE_ATTEMPTS:
+                    await asyncio.sleep(self.retry_seconds)
+        if error is None:
+            self.written += count
+            self.batches += 1
+        else:
+            self.dropped += count
+            logger.error("%s: dropped a batch of %d entries", self.name, count)
+        for _entry, future in batch:
+            if future is not None and not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+        async with self._space:
+            self._space.notify_all()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "durable": self.durable,
+        }
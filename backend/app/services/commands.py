@@ -0,0 +1,387 @@
+"""
+Light commands to the ESP32s over MQTT (AWS IoT Core, or any MQTT 3.1.1 broker
+such as a local Mosquitto).
+
+Every light write (service calls, scheduler, fan-out, other processes through
+the change feed) hands the new status to CommandDispatcher.submit(). Commands
+are coalesced per restaurant: a newer state replaces one still queued, and a
+state equal to the last one published is not sent again. One task drains the
+queue in batches of COMMAND_BATCH_SIZE over a persistent paho connection:
+
+  publish   COMMAND_MQTT_TOPIC, e.g. devices/ESP32_1/commands, QoS 1
+            {"commandId": "...", "state": "on", "brightness": 85, "issuedAt": "..."}
+  ack       COMMAND_ACK_TOPIC, e.g. devices/ESP32_1/commands/ack
+            {"commandId": "...", "ok": true, "error": null}
+
+QoS 1 publishes are pipelined: up to COMMAND_MAX_INFLIGHT wait for PUBACK at
+once, and paho queues them across reconnects (persistent session). The sent
+command and the device's ack are recorded in Devices.status.lastCommand,
+batched by a BatchWriter sized by the COMMAND_STATUS_* settings.
+Setting COMMAND_MQTT_CA_FILE/CERT_FILE/KEY_FILE enables the mutual TLS AWS IoT
+Core requires (port 8883); without them it connects in plain TCP, which is
+what a local test broker expects.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from pymongo import UpdateOne
+
+from app.database.mongo import get_async_mongo_db
+from app.models.collections import CollectionNames
+from app.services.batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+COMMAND_MQTT_HOST = os.getenv("COMMAND_MQTT_HOST", "")
+COMMAND_MQTT_PORT = int(os.getenv("COMMAND_MQTT_PORT", "1883"))
+COMMAND_MQTT_CLIENT_ID = os.getenv("COMMAND_MQTT_CLIENT_ID", "lighting-commands")
+COMMAND_MQTT_TOPIC = os.getenv("COMMAND_MQTT_TOPIC", "devices/{deviceId}/commands")
+COMMAND_ACK_TOPIC = os.getenv("COMMAND_ACK_TOPIC", "devices/+/commands/ack")
+COMMAND_MQTT_QOS = 1
+COMMAND_MQTT_KEEPALIVE_SECONDS = 60
+COMMAND_MQTT_CA_FILE = os.getenv("COMMAND_MQTT_CA_FILE", "")
+COMMAND_MQTT_CERT_FILE = os.getenv("COMMAND_MQTT_CERT_FILE", "")
+COMMAND_MQTT_KEY_FILE = os.getenv("COMMAND_MQTT_KEY_FILE", "")
+COMMAND_MAX_INFLIGHT = int(os.getenv("COMMAND_MAX_INFLIGHT", "1000"))
+COMMAND_BATCH_SIZE = int(os.getenv("COMMAND_BATCH_SIZE", "500"))
+# Devices.status.lastCommand writes for sent commands and acks
+COMMAND_STATUS_BATCH_SIZE = int(os.getenv("COMMAND_STATUS_BATCH_SIZE", "500"))
+COMMAND_STATUS_FLUSH_SECONDS = float(os.getenv("COMMAND_STATUS_FLUSH_SECONDS", "0.25"))
+COMMAND_STATUS_QUEUE_SIZE = int(os.getenv("COMMAND_STATUS_QUEUE_SIZE", "10000"))
+
+
+@dataclass
+class Command:
+    restaurant_id: int
+    state: str
+    brightness: int
+    command_id: str = ""
+    device_id: str | None = None
+    issued_at: datetime | None = None
+
+    def payload(self) -> bytes:
+        return json.dumps(
+            {
+                "commandId": self.command_id,
+                "state": self.state,
+                "brightness": self.brightness,
+                "issuedAt": self.issued_at.isoformat() if self.issued_at else None,
+            },
+            separators=(",", ":"),
+        ).encode()
+
+
+@dataclass
+class CommandAck:
+    device_id: str
+    command_id: str
+    ok: bool
+    error: str | None
+    received_at: datetime
+
+
+def decode_ack(device_id: str | None, payload: bytes) -> CommandAck | None:
+    """Parse an ack message; None for anything malformed."""
+    try:
+        body = json.loads(payload)
+    except ValueError:
+        return None
+    if device_id is None or not isinstance(body, dict) or not isinstance(body.get("commandId"), str):
+        return None
+    error = body.get("error")
+    return CommandAck(
+        device_id=device_id,
+        command_id=body["commandId"],
+        ok=body.get("ok", True) is True,
+        error=error if isinstance(error, str) else None,
+        received_at=datetime.now(timezone.utc),
+    )
+
+
+class CommandStore(ABC):
+    @abstractmethod
+    async def device_ids(self, restaurant_ids: list[int]) -> dict[int, str]:
+        """restaurant_id -> device id used in the command topic"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def record(self, updates: list[Command | CommandAck]) -> None:
+        """Write sent commands and device acks to the device status."""
+        raise NotImplementedError
+
+
+class MongoCommandStore(CommandStore):
+    DEVICES = CollectionNames.DEVICES
+
+    def __init__(self) -> None:
+        self._db = get_async_mongo_db()
+        # legacyId -> Devices._id; a restaurant keeps its device
+        self._device_ids: dict[int, str] = {}
+
+    async def device_ids(self, restaurant_ids: list[int]) -> dict[int, str]:
+        missing = [rid for rid in restaurant_ids if rid not in self._device_ids]
+        if missing:
+            cursor = self._db[self.DEVICES].find({"legacyId": {"$in": missing}}, {"_id": 1, "legacyId": 1})
+            async for device in cursor:
+                self._device_ids[device["legacyId"]] = device["_id"]
+        return {rid: self._device_ids[rid] for rid in restaurant_ids if rid in self._device_ids}
+
+    async def record(self, updates: list[Command | CommandAck]) -> None:
+        operations = []
+        for update in updates:
+            if isinstance(update, Command):
+                operations.append(
+                    UpdateOne(
+                        {"_id": update.device_id},
+                        {
+                            "$set": {
+                                "status.lastCommand": {
+                                    "id": update.command_id,
+                                    "state": update.state,
+                                    "brightness": update.brightness,
+                                    "sentAt": update.issued_at,
+                                    "ackedAt": None,
+                                    "ok": None,
+                                    "error": None,
+                                }
+                            }
+                        },
+                    )
+                )
+            else:
+                # An ack for a superseded command must not overwrite the newer one
+                operations.append(
+                    UpdateOne(
+                        {"_id": update.device_id, "status.lastCommand.id": update.command_id},
+                        {
+                            "$set": {
+                                "status.lastCommand.ackedAt": update.received_at,
+                                "status.lastCommand.ok": update.ok,
+                                "status.lastCommand.error": update.error,
+                                "status.lastSeen": update.received_at,
+                                "status.isOnline": True,
+                            }
+                        },
+                    )
+                )
+        if operations:
+            await self._db[self.DEVICES].bulk_write(operations, ordered=True)
+
+
+class SQLiteCommandStore(CommandStore):
+    async def device_ids(self, restaurant_ids: list[int]) -> dict[int, str]:
+        return {rid: str(rid) for rid in restaurant_ids}
+
+    async def record(self, updates: list[Command | CommandAck]) -> None:
+        """restaurant_lights has no device status columns; the counters in stats() are the record."""
+
+
+class CommandDispatcher:
+    """Coalescing command queue in front of one persistent paho-mqtt client."""
+
+    def __init__(
+        self,
+        store: CommandStore,
+        host: str = COMMAND_MQTT_HOST,
+        port: int = COMMAND_MQTT_PORT,
+        topic: str = COMMAND_MQTT_TOPIC,
+        ack_topic: str = COMMAND_ACK_TOPIC,
+        client_id: str = COMMAND_MQTT_CLIENT_ID,
+        batch_size: int = COMMAND_BATCH_SIZE,
+        max_inflight: int = COMMAND_MAX_INFLIGHT,
+    ) -> None:
+        self.store = store
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.ack_topic = ack_topic
+        self.client_id = client_id
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight
+        levels = ack_topic.split("/")
+        self._device_level = levels.index("+") if "+" in levels else None
+        # restaurant_id -> newest unsent command; re-queuing moves it to the back
+        self._queued: OrderedDict[int, Command] = OrderedDict()
+        # restaurant_id -> (state, brightness) last published
+        self._published: dict[int, tuple[str, int]] = {}
+        self._inflight: dict[int, Command] = {}  # paho mid -> command awaiting PUBACK
+        self._wake = asyncio.Event()
+        self._status_writer = BatchWriter(
+            store.record,
+            batch_size=COMMAND_STATUS_BATCH_SIZE,
+            flush_interval_seconds=COMMAND_STATUS_FLUSH_SECONDS,
+            max_pending=COMMAND_STATUS_QUEUE_SIZE,
+            name="command status",
+        )
+        self._client: Any = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task[None] | None = None
+        self.connected = False
+        self.published = 0
+        self.delivered = 0
+        self.acked = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.unchanged = 0
+        self.unknown_devices = 0
+
+    def submit(self, status: dict[str, Any]) -> None:
+        """Queue the state of a status response; safe to call from any listener on the event loop."""
+        restaurant_id = status["restaurantId"]
+        command = Command(restaurant_id, status["state"], status["brightness"])
+        if restaurant_id in self._queued:
+            self.coalesced += 1
+            del self._queued[restaurant_id]
+        if self._published.get(restaurant_id) == (command.state, command.brightness):
+            self.unchanged += 1  # a newer write restored what the device already has
+            return
+        self._queued[restaurant_id] = command
+        self._wake.set()
+
+    def _create_client(self) -> Any:
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError as exc:
+            raise RuntimeError("COMMAND_MQTT_HOST is set but paho-mqtt is not installed") from exc
+        # Persistent session: the broker keeps the ack subscription and queued QoS 1 acks
+        if hasattr(mqtt, "CallbackAPIVersion"):  # paho-mqtt 2.x
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id, clean_session=False)
+        else:
+            client = mqtt.Client(client_id=self.client_id, clean_session=False)
+        if COMMAND_MQTT_CERT_FILE:
+            client.tls_set(
+                ca_certs=COMMAND_MQTT_CA_FILE or None,
+                certfile=COMMAND_MQTT_CERT_FILE,
+                keyfile=COMMAND_MQTT_KEY_FILE or None,
+            )
+        return client
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        client = self._create_client()
+        client.max_inflight_messages_set(self.max_inflight)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+        client.on_message = self._on_message
+        client.connect_async(self.host, self.port, keepalive=COMMAND_MQTT_KEEPALIVE_SECONDS)
+        client.loop_start()
+        self._client = client
+        await self._status_writer.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Hand queued commands to paho, then disconnect (FastAPI lifespan shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._queued and self._client is not None:
+            await self._publish_batch()
+        if self._client is not None:
+            self._client.disconnect()
+            self._client.loop_stop()
+            self._client = None
+        await self._status_writer.close()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._queued:
+                try:
+                    await self._publish_batch()
+                except Exception:
+                    logger.exception("command batch failed")
+                await asyncio.sleep(0)  # let writes and acks in between batches
+
+    async def _publish_batch(self) -> None:
+        batch = [self._queued.popitem(last=False)[1] for _ in range(min(self.batch_size, len(self._queued)))]
+        device_ids = await self.store.device_ids([command.restaurant_id for command in batch])
+        sent: list[Command] = []
+        issued_at = datetime.now(timezone.utc)
+        for command in batch:
+            if command.restaurant_id in self._queued:
+                continue  # superseded while the device ids were loading
+            command.device_id = device_ids.get(command.restaurant_id)
+            if command.device_id is None:
+                self.unknown_devices += 1
+                continue
+            command.command_id = uuid.uuid4().hex
+            command.issued_at = issued_at
+            # Pipelined: paho queues the PUBLISH and resends it after a reconnect
+            info = self._client.publish(
+                self.topic.format(deviceId=command.device_id), command.payload(), qos=COMMAND_MQTT_QOS
+            )
+            self._inflight[info.mid] = command
+            self._published[command.restaurant_id] = (command.state, command.brightness)
+            sent.append(command)
+        self.published += len(sent)
+        self._status_writer.offer(sent)
+
+    # paho network thread -> event loop
+
+    def _on_connect(self, client: Any, userdata: Any, flags: Any, reason_code: Any, properties: Any = None) -> None:
+        client.subscribe(self.ack_topic, qos=COMMAND_MQTT_QOS)
+        self._call(self._set_connected, True)
+
+    def _on_disconnect(self, client: Any, userdata: Any, *args: Any) -> None:
+        self._call(self._set_connected, False)
+
+    def _on_publish(self, client: Any, userdata: Any, mid: int, *args: Any) -> None:
+        self._call(self._delivered, mid)
+
+    def _on_message(self, client: Any, userdata: Any, message: Any) -> None:
+        device_id = None
+        if self._device_level is not None:
+            levels = message.topic.split("/")
+            if len(levels) > self._device_level:
+                device_id = levels[self._device_level]
+        ack = decode_ack(device_id, message.payload)
+        if ack is not None:
+            self._call(self._acknowledged, ack)
+
+    def _call(self, callback: Any, *args: Any) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _set_connected(self, connected: bool) -> None:
+        self.connected = connected
+
+    def _delivered(self, mid: int) -> None:
+        # mids are recorded on the loop right after publish(), before this callback can run
+        if self._inflight.pop(mid, None) is not None:
+            self.delivered += 1
+
+    def _acknowledged(self, ack: CommandAck) -> None:
+        if ack.ok:
+            self.acked += 1
+        else:
+            self.failed += 1
+            logger.warning("device %s rejected command %s: %s", ack.device_id, ack.command_id, ack.error)
+        self._status_writer.offer([ack])
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "queued": len(self._queued),
+            "inflight": len(self._inflight),
+            "published": self.published,
+            "delivered": self.delivered,
+            "acked": self.acked,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "unchanged": self.unchanged,
+            "unknownDevices": self.unknown_devices,
+        }
@@ -0,0 +1,120 @@
+"""
+In-process legacyId -> device resolution cache for AsyncMongoLightRepository.
+
+Only fields that never change after provisioning are cached (_id, restaurantId,
+restaurant, scheduleId, legacyId). Light state is always read from MongoDB.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+DEVICE_CACHE_MAX_ENTRIES = int(os.getenv("DEVICE_CACHE_MAX_ENTRIES", "10000"))
+DEVICE_CACHE_TTL_SECONDS = float(os.getenv("DEVICE_CACHE_TTL_SECONDS", "300"))
+# Unknown IDs are cached for less time so a newly provisioned device shows up quickly
+DEVICE_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("DEVICE_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+
+# Device fields that are safe to cache (immutable after provisioning)
+CACHED_DEVICE_FIELDS = ("_id", "restaurantId", "restaurant", "scheduleId", "legacyId")
+DEVICE_REF_PROJECTION = {field: 1 for field in CACHED_DEVICE_FIELDS}
+
+# Returned by get() when the key is not cached (None means "cached as unknown")
+MISS = object()
+
+
+class DeviceResolutionCache:
+    """Thread-safe LRU with per-entry TTL and negative caching."""
+
+    def __init__(
+        self,
+        max_entries: int = DEVICE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = DEVICE_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: float = DEVICE_CACHE_NEGATIVE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # legacyId -> (expires_at, device ref or None)
+        self._entries: OrderedDict[int, tuple[float, dict[str, Any] | None]] = OrderedDict()
+        # device _id -> legacyId, for invalidation by device
+        self._by_device_id: dict[Any, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, legacy_id: int) -> dict[str, Any] | None | object:
+        """Return the cached device ref, None for a cached unknown ID, or MISS."""
+        with self._lock:
+            entry = self._entries.get(legacy_id)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            expires_at, device = entry
+            if expires_at <= self._clock():
+                self._drop(legacy_id)
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(legacy_id)
+            self.hits += 1
+            return device
+
+    def put(self, legacy_id: int, device: dict[str, Any] | None) -> dict[str, Any] | None:
+        """Cache the immutable fields of device (or None for an unknown ID) and return them."""
+        ref = None if device is None else {
+            field: device[field] for field in CACHED_DEVICE_FIELDS if field in device
+        }
+        ttl = self.negative_ttl_seconds if ref is None else self.ttl_seconds
+        with self._lock:
+            self._drop(legacy_id)
+            self._entries[legacy_id] = (self._clock() + ttl, ref)
+            if ref is not None:
+                self._by_device_id[ref["_id"]] = legacy_id
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return ref
+
+    def invalidate(self, legacy_id: int) -> None:
+        with self._lock:
+            if legacy_id in self._entries:
+                self._drop(legacy_id)
+                self.invalidations += 1
+
+    def invalidate_device(self, device_id: Any) -> None:
+        """Drop the entry for a device whose document changed or was deleted."""
+        with self._lock:
+            legacy_id = self._by_device_id.get(device_id)
+            if legacy_id is not None:
+                self._drop(legacy_id)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_device_id.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hitRatio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _drop(self, legacy_id: int) -> None:
+        # Caller holds the lock.
+        entry = self._entries.pop(legacy_id, None)
+        if entry is not None and entry[1] is not None:
+            self._by_device_id.pop(entry[1]["_id"], None)
@@ -0,0 +1,458 @@
+"""
+In-process change feed. One source watches the database and publishes typed
+events to every subscriber, so consumers react to changes instead of each
+polling on their own.
+
+Sources (EVENT_BUS_MODE):
+  auto         - MongoDB change streams when MONGODB_URI is set (replica set /
+                 Atlas), falling back to polling on a standalone server; SQLite
+                 polling otherwise (default)
+  changestream - MongoDB change streams only
+  poll         - high-water-mark polling (updatedAt / last_updated; history by
+                 (timestamp, _id) on MongoDB, by id on SQLite)
+  off          - no source; nothing is published
+
+A single-node replica set is enough for change streams locally:
+  mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval "rs.initiate()"
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Iterable, TypeVar, Union
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.database.db import get_connection
+from app.database.mongo import get_async_mongo_db
+from app.models.collections import CollectionNames
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUS_MODE = os.getenv("EVENT_BUS_MODE", "auto")
+EVENT_POLL_INTERVAL_SECONDS = float(os.getenv("EVENT_POLL_INTERVAL_SECONDS", "1.0"))
+# MongoDB history polls re-read this far behind the newest timestamp seen: rows
+# are committed after their timestamp is taken (group commit, retries, other
+# processes), so a row can land behind the mark
+EVENT_POLL_LOOKBACK_SECONDS = float(os.getenv("EVENT_POLL_LOOKBACK_SECONDS", "2.0"))
+EVENT_RETRY_SECONDS = 5.0
+
+MODE_AUTO = "auto"
+MODE_CHANGE_STREAM = "changestream"
+MODE_POLL = "poll"
+MODE_OFF = "off"
+
+# Server error codes meaning "change streams are not available here"
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573}  # standalone server, not a replica set
+CHANGE_STREAM_HISTORY_LOST_CODES = {136, 286}  # resume token fell off the oplog
+
+OPERATION_INSERT = "insert"
+OPERATION_UPDATE = "update"
+OPERATION_REPLACE = "replace"
+OPERATION_DELETE = "delete"
+WATCHED_OPERATIONS = [OPERATION_INSERT, OPERATION_UPDATE, OPERATION_REPLACE, OPERATION_DELETE]
+
+
+# ---------------------------------------------------------------------------
+# Events
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class DeviceChanged:
+    """A Devices document (SQLite: restaurant_lights row) was written."""
+    device_id: Any
+    restaurant_id: int | None
+    operation: str
+    document: dict[str, Any] | None = None
+    # Fields named by the change stream's updateDescription; None when unknown
+    updated_fields: frozenset[str] | None = None
+
+    def touches(self, fields: Iterable[str]) -> bool:
+        """Could this change affect any of `fields`? True when the source can't tell."""
+        if self.operation != OPERATION_UPDATE or self.updated_fields is None:
+            return True
+        return any(
+            updated == field or updated.startswith(f"{field}.")
+            for updated in self.updated_fields
+            for field in fields
+        )
+
+
+@dataclass(frozen=True)
+class ScheduleChanged:
+    """A device's schedule changed (Schedules document, or SQLite schedule_on/off)."""
+    schedule_id: Any
+    device_id: Any
+    restaurant_id: int | None
+    operation: str
+    document: dict[str, Any] | None = None
+
+
+@dataclass(frozen=True)
+class HistoryAppended:
+    id: Any
+    restaurant_id: int | None
+    action: str
+    timestamp: str
+    document: dict[str, Any] | None = None
+
+
+Event = Union[DeviceChanged, ScheduleChanged, HistoryAppended]
+EventT = TypeVar("EventT", DeviceChanged, ScheduleChanged, HistoryAppended)
+Handler = Callable[[Any], Union[None, Awaitable[None]]]
+Publish = Callable[[Event], Awaitable[None]]
+
+
+# ---------------------------------------------------------------------------
+# Bus
+# ---------------------------------------------------------------------------
+
+class EventBus:
+    def __init__(self) -> None:
+        self._handlers: dict[type, list[Handler]] = {}
+        self._task: asyncio.Task[None] | None = None
+        self.published = 0
+
+    def subscribe(self, event_type: type[EventT], handler: Callable[[EventT], Any]) -> Callable[[], None]:
+        """handler may be sync or async; returns a function that unsubscribes it."""
+        self._handlers.setdefault(event_type, []).append(handler)
+        return lambda: self._handlers[event_type].remove(handler)
+
+    async def publish(self, event: Event) -> None:
+        self.published += 1
+        for handler in list(self._handlers.get(type(event), ())):
+            try:
+                result = handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("event handler failed for %s", type(event).__name__)
+
+    async def start(self, source: ChangeSource | None) -> None:
+        if source is not None and self._task is None:
+            self._task = asyncio.create_task(source.run(self.publish))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class ChangeSource(ABC):
+    @abstractmethod
+    async def run(self, publish: Publish) -> None:
+        """Publish events until cancelled."""
+        raise NotImplementedError
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _bson_utc(value: datetime) -> datetime:
+    """BSON dates are millisecond precision and come back naive (UTC) by default."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def _legacy_id(document: dict[str, Any] | None) -> int | None:
+    return document.get("legacyId") if document else None
+
+
+# ---------------------------------------------------------------------------
+# MongoDB change streams
+# ---------------------------------------------------------------------------
+
+class MongoChangeStreamSource(ChangeSource):
+    """One database-level change stream covering Devices, Schedules and light_history."""
+    COLLECTIONS = [CollectionNames.DEVICES, CollectionNames.SCHEDULES, CollectionNames.LIGHT_HISTORY]
+
+    def __init__(self, db: Any = None, fallback: ChangeSource | None = None) -> None:
+        self._db = db
+        self.fallback = fallback
+        self._resume_token: dict[str, Any] | None = None
+
+    @property
+    def db(self) -> Any:
+        if self._db is None:
+            self._db = get_async_mongo_db()
+        return self._db
+
+    def _pipeline(self) -> list[dict[str, Any]]:
+        return [
+            {"$match": {"ns.coll": {"$in": self.COLLECTIONS}, "operationType": {"$in": WATCHED_OPERATIONS}}}
+        ]
+
+    async def run(self, publish: Publish) -> None:
+        while True:
+            try:
+                async with await self.db.watch(
+                    self._pipeline(), full_document="updateLookup", resume_after=self._resume_token
+                ) as stream:
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        event = await self._to_event(change)
+                        if event is not None:
+                            await publish(event)
+            except OperationFailure as exc:
+                if exc.code in CHANGE_STREAM_UNSUPPORTED_CODES and self.fallback is not None:
+                    logger.info("change streams unavailable (%s); polling instead", exc)
+                    await self.fallback.run(publish)
+                    return
+                if exc.code in CHANGE_STREAM_HISTORY_LOST_CODES:
+                    self._resume_token = None
+                logger.warning("change stream failed: %s; retrying", exc)
+            except PyMongoError as exc:
+                logger.warning("change stream interrupted: %s; resuming", exc)
+            await asyncio.sleep(EVENT_RETRY_SECONDS)
+
+    async def _to_event(self, change: dict[str, Any]) -> Event | None:
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        key = change["documentKey"]["_id"]
+        document = change.get("fullDocument")
+        if collection == CollectionNames.DEVICES:
+            description = change.get("updateDescription")
+            updated_fields = None
+            if description is not None:
+                updated_fields = frozenset(description.get("updatedFields", {})) | frozenset(
+                    description.get("removedFields", [])
+                )
+            return DeviceChanged(key, _legacy_id(document), operation, document, updated_fields)
+        if collection == CollectionNames.SCHEDULES:
+            device_id = document.get("deviceId") if document else None
+            return ScheduleChanged(key, device_id, await self._device_legacy_id(device_id), operation, document)
+        if collection == CollectionNames.LIGHT_HISTORY and operation == OPERATION_INSERT and document:
+            return _history_event(document)
+        return None
+
+    async def _device_legacy_id(self, device_id: Any) -> int | None:
+        if device_id is None:
+            return None
+        device = await self.db[CollectionNames.DEVICES].find_one({"_id": device_id}, {"legacyId": 1})
+        return _legacy_id(device)
+
+
+def _history_event(document: dict[str, Any]) -> HistoryAppended:
+    return HistoryAppended(
+        id=str(document["_id"]),
+        restaurant_id=document.get("legacyId"),
+        action=document.get("action", ""),
+        timestamp=str(document.get("timestamp", "")),
+        document=document,
+    )
+
+
+# ---------------------------------------------------------------------------
+# High-water-mark polling (standalone MongoDB, SQLite)
+# ---------------------------------------------------------------------------
+
+class _HighWaterMark:
+    """
+    Tracks the newest value seen. Reads use >= `since` (the mark, minus the
+    lookback) so rows written in the same instant as the mark, or committed
+    late behind it, are not skipped; keys already published with the same
+    value are filtered out instead. Values older than the starting mark are
+    never new.
+    """
+
+    def __init__(self, value: Any, lookback: timedelta = timedelta(0)) -> None:
+        self.value = value
+        self.lookback = lookback
+        self._floor = value
+        self._seen: dict[Any, Any] = {}  # key -> value it was published with
+
+    @property
+    def since(self) -> Any:
+        if not self.lookback:
+            return self.value
+        if isinstance(self.value, str):  # ISO timestamp
+            return (datetime.fromisoformat(self.value) - self.lookback).isoformat()
+        return self.value - self.lookback
+
+    def is_new(self, value: Any, key: Any) -> bool:
+        return value >= self._floor and self._seen.get(key) != value
+
+    def advance(self, value: Any, key: Any) -> None:
+        self._seen[key] = value
+        if value > self.value:
+            self.value = value
+
+    def prune(self) -> None:
+        """Forget keys the next read cannot return; call once per poll."""
+        since = self.since
+        self._seen = {key: value for key, value in self._seen.items() if value >= since}
+
+
+class PollingSource(ChangeSource):
+    def __init__(self, interval_seconds: float = EVENT_POLL_INTERVAL_SECONDS) -> None:
+        self.interval_seconds = interval_seconds
+
+    async def run(self, publish: Publish) -> None:
+        await self.prime()
+        while True:
+            try:
+                for event in await self.poll():
+                    await publish(event)
+            except Exception:
+                logger.exception("change poll failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def prime(self) -> None:
+        """Set the marks to 'now' so only changes made after start are published."""
+
+    @abstractmethod
+    async def poll(self) -> list[Event]:
+        raise NotImplementedError
+
+
+class MongoPollingSource(PollingSource):
+    """
+    updatedAt marks for Devices and Schedules, (timestamp, _id) for
+    light_history. ObjectIds are not ordered across writer processes, so
+    history is read by timestamp with EVENT_POLL_LOOKBACK_SECONDS of overlap.
+    Each read is a range scan: see updatedAt_1 and timestamp_-1__id_-1 in
+    app.database.indexes.
+    """
+
+    def __init__(
+        self,
+        db: Any = None,
+        interval_seconds: float = EVENT_POLL_INTERVAL_SECONDS,
+        lookback_seconds: float = EVENT_POLL_LOOKBACK_SECONDS,
+    ) -> None:
+        super().__init__(interval_seconds)
+        self._db = db
+        self._devices = _HighWaterMark(_bson_utc(_utc_now()))
+        self._schedules = _HighWaterMark(_bson_utc(_utc_now()))
+        self._history = _HighWaterMark(_utc_now().isoformat(), timedelta(seconds=lookback_seconds))
+
+    @property
+    def db(self) -> Any:
+        if self._db is None:
+            self._db = get_async_mongo_db()
+        return self._db
+
+    async def _changed_since(self, collection: str, mark: _HighWaterMark) -> list[dict[str, Any]]:
+        cursor = self.db[collection].find({"updatedAt": {"$gte": mark.since}}).sort("updatedAt", 1)
+        documents = []
+        async for document in cursor:
+            updated_at = _bson_utc(document["updatedAt"])
+            if mark.is_new(updated_at, document["_id"]):
+                mark.advance(updated_at, document["_id"])
+                documents.append(document)
+        mark.prune()
+        return documents
+
+    async def _history_since(self) -> list[dict[str, Any]]:
+        mark = self._history
+        cursor = self.db[CollectionNames.LIGHT_HISTORY].find({"timestamp": {"$gte": mark.since}}).sort(
+            [("timestamp", 1), ("_id", 1)]
+        )
+        documents = []
+        async for document in cursor:
+            timestamp = str(document["timestamp"])
+            if mark.is_new(timestamp, document["_id"]):
+                mark.advance(timestamp, document["_id"])
+                documents.append(document)
+        mark.prune()
+        return documents
+
+    async def poll(self) -> list[Event]:
+        events: list[Event] = []
+        for device in await self._changed_since(CollectionNames.DEVICES, self._devices):
+            events.append(DeviceChanged(device["_id"], _legacy_id(device), OPERATION_UPDATE, device))
+        schedules = await self._changed_since(CollectionNames.SCHEDULES, self._schedules)
+        if schedules:
+            device_ids = [schedule.get("deviceId") for schedule in schedules]
+            legacy_ids = {
+                device["_id"]: _legacy_id(device)
+                async for device in self.db[CollectionNames.DEVICES].find(
+                    {"_id": {"$in": device_ids}}, {"legacyId": 1}
+                )
+            }
+            for schedule in schedules:
+                device_id = schedule.get("deviceId")
+                events.append(
+                    ScheduleChanged(
+                        schedule["_id"], device_id, legacy_ids.get(device_id), OPERATION_UPDATE, schedule
+                    )
+                )
+        events.extend(_history_event(document) for document in await self._history_since())
+        return events
+
+
+class SQLitePollingSource(PollingSource):
+    """
+    last_updated mark for restaurant_lights (idx_restaurant_lights_last_updated)
+    and id mark for light_history; SQLite hands out ids in commit order.
+    SQLite keeps the simple schedule on the light row, so a ScheduleChanged is
+    published when a row's schedule_on/schedule_off differ from the last poll.
+    """
+
+    def __init__(self, interval_seconds: float = EVENT_POLL_INTERVAL_SECONDS) -> None:
+        super().__init__(interval_seconds)
+        self._lights = _HighWaterMark(_utc_now().isoformat())
+        self._history_id = 0
+        self._schedules: dict[int, tuple[str | None, str | None]] = {}
+
+    async def prime(self) -> None:
+        await asyncio.to_thread(self._prime)
+
+    def _prime(self) -> None:
+        with get_connection() as conn:
+            self._history_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM light_history").fetchone()[0]
+            for row in conn.execute("SELECT restaurant_id, schedule_on, schedule_off FROM restaurant_lights"):
+                self._schedules[row["restaurant_id"]] = (row["schedule_on"], row["schedule_off"])
+
+    async def poll(self) -> list[Event]:
+        return await asyncio.to_thread(self._poll)
+
+    def _poll(self) -> list[Event]:
+        events: list[Event] = []
+        with get_connection() as conn:
+            lights = conn.execute(
+                "SELECT * FROM restaurant_lights WHERE last_updated >= ? ORDER BY last_updated",
+                (self._lights.since,),
+            ).fetchall()
+            history = conn.execute(
+                "SELECT * FROM light_history WHERE id > ? ORDER BY id", (self._history_id,)
+            ).fetchall()
+        for row in lights:
+            rid = row["restaurant_id"]
+            if not self._lights.is_new(row["last_updated"], rid):
+                continue
+            self._lights.advance(row["last_updated"], rid)
+            document = dict(row)
+            events.append(DeviceChanged(rid, rid, OPERATION_UPDATE, document))
+            schedule = (row["schedule_on"], row["schedule_off"])
+            if self._schedules.get(rid, (None, None)) != schedule:
+                self._schedules[rid] = schedule
+                events.append(ScheduleChanged(rid, rid, rid, OPERATION_UPDATE, document))
+        for row in history:
+            self._history_id = row["id"]
+            events.append(
+                HistoryAppended(row["id"], row["restaurant_id"], row["action"], row["timestamp"], dict(row))
+            )
+        return events
+
+
+def default_source(mode: str = EVENT_BUS_MODE) -> ChangeSource | None:
+    if mode == MODE_OFF:
+        return None
+    if mode not in (MODE_AUTO, MODE_CHANGE_STREAM, MODE_POLL):
+        raise ValueError(f"EVENT_BUS_MODE must be auto, changestream, poll or off (got {mode!r})")
+    if not os.getenv("MONGODB_URI"):
+        if mode == MODE_CHANGE_STREAM:
+            raise ValueError("EVENT_BUS_MODE=changestream needs MONGODB_URI")
+        return SQLitePollingSource()
+    if mode == MODE_POLL:
+        return MongoPollingSource()
+    return MongoChangeStreamSource(fallback=MongoPollingSource() if mode == MODE_AUTO else None)
@@ -0,0 +1,151 @@
+"""
+Fleet-wide command fan-out: apply one light state to every device matching a
+selector over Devices fields, in chunked bulk writes, tracked as a job.
+
+Jobs live in this process only; a restart forgets finished jobs and cancels
+running ones (devices already written keep their new state and history).
+
+With on_written (LightService.lights_written), each chunk's devices are read
+back after the write and handed over, so status listeners see the new state.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from app.services.async_repository import AsyncLightRepository
+
+FANOUT_CHUNK_SIZE = int(os.getenv("FANOUT_CHUNK_SIZE", "1000"))
+FANOUT_MAX_JOBS = 100  # finished jobs kept for polling before the oldest is dropped
+
+# Selector key (API) -> Devices field path
+SELECTOR_FIELDS = {
+    "state": "address.state",
+    "city": "address.city",
+    "ownerEmail": "ownerEmail",
+    "firmware": "device.firmware",
+}
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+def selector_filter(selector: dict[str, str]) -> dict[str, Any]:
+    """Translate an API selector into a Devices query; empty selectors are rejected."""
+    device_filter = {SELECTOR_FIELDS[key]: value for key, value in selector.items() if value is not None}
+    if not device_filter:
+        raise ValueError("selector must set at least one of: " + ", ".join(SELECTOR_FIELDS))
+    return device_filter
+
+
+@dataclass
+class FanOutJob:
+    selector: dict[str, str]
+    state: str
+    brightness: int | None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = JOB_PENDING
+    matched: int = 0
+    modified: int = 0
+    history_written: int = 0
+    error: str | None = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: datetime | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "selector": self.selector,
+            "state": self.state,
+            "brightness": self.brightness,
+            "matched": self.matched,
+            "modified": self.modified,
+            "historyWritten": self.history_written,
+            "error": self.error,
+            "createdAt": self.created_at.isoformat(),
+            "finishedAt": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class FanOutService:
+    def __init__(
+        self,
+        repository: AsyncLightRepository,
+        chunk_size: int = FANOUT_CHUNK_SIZE,
+        on_written: Callable[[dict[int, dict[str, Any]]], None] | None = None,
+    ) -> None:
+        self.repository = repository
+        self.chunk_size = chunk_size
+        self.on_written = on_written
+        self._jobs: OrderedDict[str, FanOutJob] = OrderedDict()
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+
+    @property
+    def supported(self) -> bool:
+        """Selectors match Devices fields, so fan-out needs a repository with device selectors."""
+        return self.repository.SUPPORTS_DEVICE_SELECTORS
+
+    def start(self, selector: dict[str, str], state: str, brightness: int | None = None) -> FanOutJob:
+        """Validate the selector and start the job in the background; check `supported` first."""
+        if not self.supported:
+            raise RuntimeError("fan-out selectors require the MongoDB backend")
+        device_filter = selector_filter(selector)
+        selector = {key: value for key, value in selector.items() if value is not None}
+        job = FanOutJob(selector=selector, state=state, brightness=brightness)
+        self._jobs[job.id] = job
+        while len(self._jobs) > FANOUT_MAX_JOBS:
+            oldest_id = next(iter(self._jobs))
+            if oldest_id in self._tasks:
+                break  # never drop a job that is still running
+            self._jobs.pop(oldest_id)
+        task = asyncio.create_task(self._run(job, device_filter))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _task: self._tasks.pop(job.id, None))
+        return job
+
+    def get(self, job_id: str) -> FanOutJob | None:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: FanOutJob, device_filter: dict[str, Any]) -> None:
+        job.status = JOB_RUNNING
+        action = f"set_{job.state}"
+        try:
+            async for devices in self.repository.iter_selected_devices(device_filter, self.chunk_size):
+                job.matched += len(devices)
+                modified, history_written = await self.repository.set_devices(
+                    devices, job.state, job.brightness, action
+                )
+                job.modified += modified
+                job.history_written += history_written
+                if self.on_written is not None:
+                    # update_many returns no documents: one read-back per chunk
+                    rows, _errors = await self.repository.get_lights(
+                        [device["legacyId"] for device in devices if device.get("legacyId") is not None]
+                    )
+                    self.on_written(rows)
+            job.status = JOB_COMPLETED
+        except asyncio.CancelledError:
+            job.status = JOB_CANCELLED
+            raise
+        except Exception as exc:
+            job.status = JOB_FAILED
+            job.error = str(exc)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+
+    async def shutdown(self) -> None:
+        """Cancel running jobs (FastAPI lifespan shutdown)."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,44 @@
+"""
+Group commit for light history: write paths hand their history entries to a
+BatchWriter, which drains them into one add_history_many call (insert_many /
+executemany) whenever HISTORY_BATCH_SIZE entries are waiting or
+HISTORY_FLUSH_INTERVAL_SECONDS has passed, whichever comes first.
+
+HISTORY_WRITER_MODE:
+  async - submit() returns once the entry is buffered (default). A crash can
+          lose up to one flush interval of history.
+  sync  - submit() waits until the batch holding the entry is committed.
+          Concurrent callers still share one commit.
+  off   - no writer; repositories insert history inline as before
+
+The buffer holds at most HISTORY_QUEUE_SIZE entries; when it is full,
+submit() waits for the next flush (backpressure) instead of growing.
+"""
+from __future__ import annotations
+
+import os
+
+from app.services.batch_writer import BatchSink, BatchWriter
+
+HISTORY_WRITER_MODE = os.getenv("HISTORY_WRITER_MODE", "async")
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("HISTORY_FLUSH_INTERVAL_SECONDS", "0.05"))
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+
+MODE_ASYNC = "async"
+MODE_SYNC = "sync"
+MODE_OFF = "off"
+
+
+class HistoryWriter(BatchWriter):
+    """BatchWriter for light history rows, configured by the HISTORY_* settings."""
+
+    def __init__(
+        self,
+        sink: BatchSink,
+        durable: bool = False,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval_seconds: float = HISTORY_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = HISTORY_QUEUE_SIZE,
+    ) -> None:
+        super().__init__(sink, batch_size, flush_interval_seconds, max_pending, durable=durable, name="history")
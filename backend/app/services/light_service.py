@@ -1,12 +1,34 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import json
+import os
+import sqlite3
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
 
 from app.database.db import get_connection
-from app.database.mongo import get_mongo_db
-from app.models.collections import CollectionNames
+from app.services.device_cache import DEVICE_REF_PROJECTION
+from app.services.records import (
+    FullScheduleRecord,
+    LightHistoryRecord,
+    LightStatusRecord,
+    history_records,
+    schedule_record,
+    status_record,
+)
+from app.services.schedule_compiler import effective_rules
+
+if TYPE_CHECKING:
+    from app.services.archive import ColdArchive
+    from app.services.async_repository import AsyncLightRepository
+    from app.services.status_cache import StatusCache
 
 # Light state and brightness
 DEFAULT_LIGHT_STATE_OFF = "off"
@@ -17,12 +39,42 @@ BRIGHTNESS_MAX = 100
 
 # History and pagination
 HISTORY_PAGE_SIZE = 100
+HISTORY_PAGE_SIZE_MAX = 1000
 UNKNOWN_LEGACY_ID = 0  # fallback when a history document has no legacyId
 
+# Batch operations
+DEVICE_NOT_FOUND_ERROR = "device not found"
+
+# Toggles for one restaurant within this window merge into one net change (0 disables)
+LIGHT_COALESCE_WINDOW_MS = int(os.getenv("LIGHT_COALESCE_WINDOW_MS", "0"))
+
 # MongoDB sort order
 MONGO_SORT_ASCENDING = 1
 MONGO_SORT_DESCENDING = -1
 
+# Device fields needed to build a status row and a history entry after a write
+DEVICE_WRITE_PROJECTION = {
+    "restaurantId": 1,
+    "lightState": 1,
+    "brightness": 1,
+    "scheduleOn": 1,
+    "scheduleOff": 1,
+    "lastUpdated": 1,
+    "updatedAt": 1,
+}
+
+# Batch reads also warm the resolution cache, so they carry every cached ref
+# field; a partial ref would lose restaurant / scheduleId for later writes.
+DEVICE_BATCH_PROJECTION = {**DEVICE_WRITE_PROJECTION, **DEVICE_REF_PROJECTION}
+
+# Version checks for conditional GETs; only indexed fields, so the query is
+# covered by legacyId_1_updatedAt_1 (Devices) / deviceId_1_updatedAt_1 (Schedules)
+VERSION_PROJECTION = {"_id": 0, "updatedAt": 1}
+
+# Fields the schedule compiler needs from Devices and Schedules
+DEVICE_SCHEDULE_PROJECTION = {"legacyId": 1, "scheduleId": 1, "scheduleOn": 1, "scheduleOff": 1}
+SCHEDULE_RULES_PROJECTION = {"deviceId": 1, "rules": 1}
+
 # Schedule rules: use first rule when deriving schedule_on/schedule_off from Schedules collection
 FIRST_SCHEDULE_RULE_INDEX = 0
 DEFAULT_HOUR = 0
@@ -32,6 +84,147 @@ def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+# Batch results: (status rows by restaurant_id, error message by restaurant_id)
+BatchResult = tuple[dict[int, dict[str, Any]], dict[int, str]]
+# (state, brightness) for a set command; None keeps the current value
+LightCommand = tuple[Optional[str], Optional[int]]
+
+
+@dataclass(frozen=True)
+class HistoryQuery:
+    """Filters and keyset position for one history page (newest first)."""
+    before: tuple[str, Any] | None = None  # (timestamp, id) of the previous page's last row
+    start: str | None = None  # inclusive ISO timestamp
+    end: str | None = None  # exclusive ISO timestamp
+    action: str | None = None
+    limit: int = HISTORY_PAGE_SIZE
+
+
+def encode_history_cursor(row: dict[str, Any]) -> str:
+    payload = json.dumps([row["timestamp"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple[str, Any]:
+    """Inverse of encode_history_cursor; raises ValueError for anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("invalid history cursor") from exc
+    if not isinstance(timestamp, str) or not isinstance(row_id, (int, str)):
+        raise ValueError("invalid history cursor")
+    return timestamp, row_id
+
+
+@dataclass
+class ToggleBurst:
+    """Toggles for one restaurant waiting out the coalescing window."""
+    taps: int
+    result: asyncio.Task[dict[str, Any]] | None = None
+
+
+def _history_order(row: dict[str, Any]) -> tuple[datetime, Any]:
+    """Sort key matching the repositories' ORDER BY timestamp, id."""
+    if not row["timestamp"]:
+        return datetime.min.replace(tzinfo=timezone.utc), row["id"]
+    moment = datetime.fromisoformat(row["timestamp"])
+    return (moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment), row["id"]
+
+
+def merge_history_rows(
+    live: list[dict[str, Any]], archived: list[dict[str, Any]], limit: int
+) -> list[dict[str, Any]]:
+    """One newest-first page from live and archived rows; a row in both places counts once."""
+    rows = {row["id"]: row for row in archived}
+    rows.update((row["id"], row) for row in live)
+    return sorted(rows.values(), key=_history_order, reverse=True)[:limit]
+
+
+def to_utc_iso(value: datetime) -> str:
+    """Normalize a filter bound to the stored timestamp format (naive means UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def _next_toggle_state(current: dict[str, Any]) -> tuple[str, int, str]:
+    """Return (state, brightness, history action) for toggling the given status row."""
+    if current["state"] == DEFAULT_LIGHT_STATE_OFF:
+        next_brightness = (
+            current["brightness"]
+            if current["brightness"] > BRIGHTNESS_MIN
+            else DEFAULT_BRIGHTNESS_ON_PERCENT
+        )
+        return "on", next_brightness, "toggle_on"
+    return DEFAULT_LIGHT_STATE_OFF, DEFAULT_BRIGHTNESS_OFF, "toggle_off"
+
+
+def _apply_light_command(
+    current: dict[str, Any], state: str | None, brightness: int | None
+) -> tuple[str, int, str]:
+    """
+    Return (state, brightness, history action) for an explicit set command.
+    Omitted fields keep their current value; an "off" light always has brightness 0
+    and an "on" light with no brightness gets the default.
+    """
+    next_state = state or current["state"]
+    next_brightness = current["brightness"] if brightness is None else brightness
+    if next_state == DEFAULT_LIGHT_STATE_OFF:
+        next_brightness = DEFAULT_BRIGHTNESS_OFF
+    elif next_brightness <= BRIGHTNESS_MIN:
+        next_brightness = DEFAULT_BRIGHTNESS_ON_PERCENT
+    return next_state, next_brightness, f"set_{next_state}"
+
+
+def _schedule_action(schedule_on: str, schedule_off: str) -> str:
+    return f"schedule_set_{schedule_on}_{schedule_off}"
+
+
+def _toggle_pipeline(now: datetime) -> list[dict[str, Any]]:
+    """Aggregation-pipeline update with the same flip rules as _next_toggle_state."""
+    is_on = {"$eq": ["$lightState", "on"]}
+    has_brightness = {"$gt": [{"$ifNull": ["$brightness", BRIGHTNESS_MIN]}, BRIGHTNESS_MIN]}
+    return [
+        {
+            "$set": {
+                "lightState": {"$cond": [is_on, DEFAULT_LIGHT_STATE_OFF, "on"]},
+                "brightness": {
+                    "$cond": [
+                        is_on,
+                        DEFAULT_BRIGHTNESS_OFF,
+                        {"$cond": [has_brightness, "$brightness", DEFAULT_BRIGHTNESS_ON_PERCENT]},
+                    ]
+                },
+                "lastUpdated": now.isoformat(),
+                "updatedAt": now,
+            }
+        }
+    ]
+
+
+def _set_light_pipeline(state: str | None, brightness: int | None, now: datetime) -> list[dict[str, Any]]:
+    """Aggregation-pipeline update with the same rules as _apply_light_command."""
+    next_state: Any = state if state is not None else {"$ifNull": ["$lightState", DEFAULT_LIGHT_STATE_OFF]}
+    candidate: Any = brightness if brightness is not None else {"$ifNull": ["$brightness", BRIGHTNESS_MIN]}
+    return [
+        {
+            "$set": {
+                "lightState": next_state,
+                "brightness": {
+                    "$cond": [
+                        {"$eq": [next_state, DEFAULT_LIGHT_STATE_OFF]},
+                        DEFAULT_BRIGHTNESS_OFF,
+                        {"$cond": [{"$gt": [candidate, BRIGHTNESS_MIN]}, candidate, DEFAULT_BRIGHTNESS_ON_PERCENT]},
+                    ]
+                },
+                "lastUpdated": now.isoformat(),
+                "updatedAt": now,
+            }
+        }
+    ]
+
+
 def _datetime_to_iso(value: Any) -> str:
     """Turn MongoDB date or ISO string into ISO string."""
     if value is None:
@@ -41,6 +234,266 @@ def _datetime_to_iso(value: Any) -> str:
     return str(value)
 
 
+# ---------------------------------------------------------------------------
+# MongoDB document helpers for AsyncMongoLightRepository (app.services.async_repository)
+# ---------------------------------------------------------------------------
+
+def document_version(document: dict[str, Any] | None) -> datetime | None:
+    """updatedAt of a VERSION_PROJECTION result as an aware datetime; None when absent."""
+    value = (document or {}).get("updatedAt")
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+HISTORY_SORT = [("timestamp", MONGO_SORT_DESCENDING), ("_id", MONGO_SORT_DESCENDING)]
+
+
+def _default_status_row(restaurant_id: int) -> dict[str, Any]:
+    return {
+        "restaurant_id": restaurant_id,
+        "state": DEFAULT_LIGHT_STATE_OFF,
+        "brightness": DEFAULT_BRIGHTNESS_OFF,
+        "schedule_on": None,
+        "schedule_off": None,
+        "last_updated": _utc_now_iso(),
+    }
+
+
+def _needs_schedule_doc(device: dict[str, Any]) -> bool:
+    return device.get("scheduleOn") is None or device.get("scheduleOff") is None
+
+
+def _schedule_filter(device: dict[str, Any]) -> dict[str, Any] | None:
+    schedule_id = device.get("scheduleId")
+    if schedule_id is not None:
+        return {"_id": schedule_id}
+    device_id = device.get("_id")
+    if device_id is not None:
+        return {"deviceId": device_id}
+    return None
+
+
+def _status_row(
+    device: dict[str, Any], restaurant_id: int, schedule_doc: dict[str, Any] | None = None
+) -> dict[str, Any]:
+    # Devices collection: lightState, brightness, scheduleOn, scheduleOff, lastUpdated
+    state = device.get("lightState", DEFAULT_LIGHT_STATE_OFF)
+    brightness = int(device.get("brightness", DEFAULT_BRIGHTNESS_OFF))
+    schedule_on = device.get("scheduleOn")
+    schedule_off = device.get("scheduleOff")
+    if schedule_doc and schedule_doc.get("rules"):
+        first_rule = schedule_doc["rules"][FIRST_SCHEDULE_RULE_INDEX]
+        schedule_on = schedule_on or f"{first_rule.get('startHour', DEFAULT_HOUR):02d}:00"
+        schedule_off = schedule_off or f"{first_rule.get('endHour', DEFAULT_HOUR):02d}:00"
+    last_updated_raw = (
+        device.get("lastUpdated")
+        or device.get("updatedAt")
+        or (device.get("status") or {}).get("lastSeen")
+    )
+    last_updated = _datetime_to_iso(last_updated_raw)
+    return {
+        "restaurant_id": restaurant_id,
+        "state": state if state in ("on", "off") else DEFAULT_LIGHT_STATE_OFF,
+        "brightness": max(BRIGHTNESS_MIN, min(BRIGHTNESS_MAX, brightness)),
+        "schedule_on": schedule_on,
+        "schedule_off": schedule_off,
+        "last_updated": last_updated,
+    }
+
+
+def _light_update(
+    state: str,
+    brightness: int,
+    schedule_on: str | None,
+    schedule_off: str | None,
+    now: datetime,
+) -> dict[str, Any]:
+    update: dict[str, Any] = {
+        "lightState": state,
+        "brightness": brightness,
+        "lastUpdated": now.isoformat(),
+        "updatedAt": now,
+    }
+    if schedule_on is not None:
+        update["scheduleOn"] = schedule_on
+    if schedule_off is not None:
+        update["scheduleOff"] = schedule_off
+    return {"$set": update}
+
+
+def _schedule_update(schedule_on: str, schedule_off: str, now: datetime) -> dict[str, Any]:
+    return {
+        "$set": {
+            "scheduleOn": schedule_on,
+            "scheduleOff": schedule_off,
+            "lastUpdated": now.isoformat(),
+            "updatedAt": now,
+        }
+    }
+
+
+def _history_entry(
+    device: dict[str, Any] | None, restaurant_id: int, action: str, now: datetime
+) -> dict[str, Any]:
+    # light_history collection: restaurantId, deviceId, action, timestamp, legacyId
+    history_entry: dict[str, Any] = {
+        "restaurantId": device["restaurantId"] if device else str(restaurant_id),
+        "action": action,
+        "timestamp": now.isoformat(),
+        "legacyId": restaurant_id,
+    }
+    if device:
+        history_entry["deviceId"] = device["_id"]
+    return history_entry
+
+
+def _history_filter(restaurant_id: int | None, query: HistoryQuery) -> dict[str, Any]:
+    history_filter: dict[str, Any] = {}
+    if restaurant_id is not None:
+        history_filter["legacyId"] = restaurant_id
+    time_range: dict[str, Any] = {}
+    if query.start is not None:
+        time_range["$gte"] = query.start
+    if query.end is not None:
+        time_range["$lt"] = query.end
+    if time_range:
+        history_filter["timestamp"] = time_range
+    if query.action is not None:
+        history_filter["action"] = query.action
+    if query.before is not None:
+        before_timestamp, before_id = query.before
+        if not isinstance(before_id, str) or not ObjectId.is_valid(before_id):
+            raise ValueError("invalid history cursor")
+        history_filter["$or"] = [
+            {"timestamp": {"$lt": before_timestamp}},
+            {"timestamp": before_timestamp, "_id": {"$lt": ObjectId(before_id)}},
+        ]
+    return history_filter
+
+
+def _history_row(history_doc: dict[str, Any], restaurant_id: int | None) -> dict[str, Any]:
+    event_timestamp = history_doc.get("timestamp")
+    response_restaurant_id = history_doc.get("legacyId")
+    if response_restaurant_id is None and restaurant_id is not None:
+        response_restaurant_id = restaurant_id
+    elif response_restaurant_id is None:
+        response_restaurant_id = UNKNOWN_LEGACY_ID
+    return {
+        "id": str(history_doc["_id"]),
+        "restaurant_id": response_restaurant_id,
+        "action": history_doc["action"],
+        "timestamp": _datetime_to_iso(event_timestamp) if event_timestamp else "",
+    }
+
+
+def _schedule_document(
+    device: dict[str, Any], rules: list[dict[str, Any]], now: datetime
+) -> dict[str, Any]:
+    # Format each rule individually - one per day
+    formatted_rules = []
+    for rule in rules:
+        # Each rule should have exactly one day (from your frontend)
+        formatted_rule = {
+            "days": rule.get("days", []),  # Should be a single-day array like ["MON"]
+            "startHour": int(rule.get("startTime", "00:00").split(":")[0]),
+            "endHour": int(rule.get("endTime", "00:00").split(":")[0]),
+            "startMinute": int(rule.get("startTime", "00:00").split(":")[1]),
+            "endMinute": int(rule.get("endTime", "00:00").split(":")[1]),
+            "action": "ON",
+            "enabled": rule.get("enabled", True)
+        }
+        formatted_rules.append(formatted_rule)
+    return {
+        "deviceId": device["_id"],
+        "restaurantId": device.get("restaurantId"),
+        "restaurant": device.get("restaurant"),
+        "rules": formatted_rules,
+        "updatedAt": now
+    }
+
+
+def _toggle_action(device: dict[str, Any]) -> str:
+    """History action for a device document read back after the toggle pipeline."""
+    return "toggle_on" if device.get("lightState") == "on" else "toggle_off"
+
+
+def _set_light_operations(commands: dict[int, LightCommand], now: datetime) -> list[UpdateOne]:
+    return [
+        UpdateOne({"legacyId": rid}, _set_light_pipeline(state, brightness, now))
+        for rid, (state, brightness) in commands.items()
+    ]
+
+
+def _batch_rows(restaurant_ids: list[int], devices: dict[int, dict[str, Any]]) -> BatchResult:
+    rows = {rid: _status_row(device, rid) for rid, device in devices.items()}
+    errors = {rid: DEVICE_NOT_FOUND_ERROR for rid in restaurant_ids if rid not in devices}
+    return rows, errors
+
+
+def _full_schedule_response(
+    device: dict[str, Any], schedule: dict[str, Any] | None
+) -> dict[str, Any]:
+    if not schedule:
+        return {
+            "deviceId": device["_id"],
+            "restaurantId": device.get("restaurantId"),
+            "rules": []
+        }
+
+    # Convert from storage format to response format - keep individual days
+    rules_response = []
+    for rule in schedule.get("rules", []):
+        start_time = f"{rule.get('startHour', 0):02d}:{rule.get('startMinute', 0):02d}"
+        end_time = f"{rule.get('endHour', 0):02d}:{rule.get('endMinute', 0):02d}"
+        rules_response.append({
+            "days": rule.get("days", []),  # Keep the days array
+            "startTime": start_time,
+            "endTime": end_time,
+            "enabled": rule.get("enabled", True)
+        })
+
+    return {
+        "deviceId": schedule["deviceId"],
+        "restaurantId": schedule.get("restaurantId"),
+        "rules": rules_response,
+        "createdAt": _datetime_to_iso(schedule.get("createdAt")),
+        "updatedAt": _datetime_to_iso(schedule.get("updatedAt"))
+    }
+
+
+def _schedule_devices_filter(restaurant_ids: list[int] | None) -> dict[str, Any]:
+    if restaurant_ids is None:
+        return {"legacyId": {"$exists": True}}
+    return {"legacyId": {"$in": restaurant_ids}}
+
+
+def _schedules_filter(devices: list[dict[str, Any]]) -> dict[str, Any]:
+    """Schedules referenced by the given devices, by scheduleId or deviceId."""
+    schedule_ids = [device["scheduleId"] for device in devices if device.get("scheduleId") is not None]
+    device_ids = [device["_id"] for device in devices]
+    return {"$or": [{"_id": {"$in": schedule_ids}}, {"deviceId": {"$in": device_ids}}]}
+
+
+def _schedule_rules_by_legacy_id(
+    devices: list[dict[str, Any]], schedules: list[dict[str, Any]]
+) -> dict[int, list[dict[str, Any]]]:
+    """Join Devices to Schedules in memory (scheduleId first, then deviceId, like _schedule_filter)."""
+    by_id = {schedule["_id"]: schedule for schedule in schedules}
+    by_device = {schedule["deviceId"]: schedule for schedule in schedules if "deviceId" in schedule}
+    rules_by_legacy_id = {}
+    for device in devices:
+        schedule = by_id.get(device.get("scheduleId")) or by_device.get(device["_id"])
+        rules_by_legacy_id[device["legacyId"]] = effective_rules(
+            schedule.get("rules") if schedule else None,
+            device.get("scheduleOn"),
+            device.get("scheduleOff"),
+        )
+    return rules_by_legacy_id
+
+
 class LightRepository(ABC):
     """
     Repository abstraction to allow a future SQLite -> MongoDB swap
@@ -67,9 +520,70 @@ class LightRepository(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def get_history(self, restaurant_id: int | None = None) -> list[dict[str, Any]]:
+    def get_history(
+        self, restaurant_id: int | None = None, query: HistoryQuery = HistoryQuery()
+    ) -> list[dict[str, Any]]:
+        """Newest-first page ordered by (timestamp, id), starting after query.before."""
         raise NotImplementedError
 
+    # Combined read-modify-write operations. The defaults compose the primitives
+    # above; backends override them to do the whole thing in one transaction.
+    def toggle_light(self, restaurant_id: int) -> dict[str, Any]:
+        """Flip state/brightness, append the history row and return the updated row."""
+        current = self.get_or_create_light(restaurant_id)
+        next_state, next_brightness, action = _next_toggle_state(current)
+        updated = self.update_light(
+            restaurant_id=restaurant_id,
+            state=next_state,
+            brightness=next_brightness,
+        )
+        self.add_history(restaurant_id, action)
+        return updated
+
+    def set_schedule(self, restaurant_id: int, schedule_on: str, schedule_off: str) -> dict[str, Any]:
+        """Store the simple daily schedule, append the history row and return the updated row."""
+        current = self.get_or_create_light(restaurant_id)
+        updated = self.update_light(
+            restaurant_id=restaurant_id,
+            state=current["state"],
+            brightness=current["brightness"],
+            schedule_on=schedule_on,
+            schedule_off=schedule_off,
+        )
+        self.add_history(restaurant_id, _schedule_action(schedule_on, schedule_off))
+        return updated
+
+    # Batch operations: (rows by restaurant_id, error message by restaurant_id).
+    # The defaults loop over the single-item methods; backends override them
+    # with one IN/$in read and one bulk write.
+    def get_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        return {rid: self.get_or_create_light(rid) for rid in restaurant_ids}, {}
+
+    def toggle_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        return {rid: self.toggle_light(rid) for rid in restaurant_ids}, {}
+
+    def set_lights(self, commands: dict[int, LightCommand]) -> BatchResult:
+        rows: dict[int, dict[str, Any]] = {}
+        for rid, (state, brightness) in commands.items():
+            current = self.get_or_create_light(rid)
+            next_state, next_brightness, action = _apply_light_command(current, state, brightness)
+            rows[rid] = self.update_light(rid, next_state, next_brightness)
+            self.add_history(rid, action)
+        return rows, {}
+
+    @abstractmethod
+    def get_schedule_rules(self, restaurant_ids: list[int] | None = None) -> dict[int, list[dict[str, Any]]]:
+        """Stored-format schedule rules keyed by restaurant_id, for every device or just the given ones."""
+        raise NotImplementedError
+
+    # Versions for conditional GETs: when the status / full schedule last
+    # changed, read without building the response. None disables 304s.
+    def get_light_version(self, restaurant_id: int) -> datetime | None:
+        return None
+
+    def get_schedule_version(self, restaurant_id: int) -> datetime | None:
+        return None
+
     # New abstract methods for full schedule management
     @abstractmethod
     def save_full_schedule(self, restaurant_id: int, rules: list[dict[str, Any]]) -> dict[str, Any]:
@@ -159,334 +673,434 @@ class SQLiteLightRepository(LightRepository):
                 (restaurant_id, action, _utc_now_iso()),
             )
 
-    def get_history(self, restaurant_id: int | None = None) -> list[dict[str, Any]]:
+    def add_history_many(self, entries: list[tuple[int, str, str]]) -> None:
+        """(restaurant_id, action, timestamp) rows in one executemany and one commit."""
+        with get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO light_history (restaurant_id, action, timestamp) VALUES (?, ?, ?)",
+                entries,
+            )
+
+    def get_history(
+        self, restaurant_id: int | None = None, query: HistoryQuery = HistoryQuery()
+    ) -> list[dict[str, Any]]:
+        # Keyset pagination: idx_light_history_(restaurant_)timestamp ends with the
+        # rowid, so every page is an index range scan regardless of depth.
+        conditions: list[str] = []
+        params: list[Any] = []
+        if restaurant_id is not None:
+            conditions.append("restaurant_id = ?")
+            params.append(restaurant_id)
+        if query.start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(query.start)
+        if query.end is not None:
+            conditions.append("timestamp < ?")
+            params.append(query.end)
+        if query.action is not None:
+            conditions.append("action = ?")
+            params.append(query.action)
+        if query.before is not None:
+            before_timestamp, before_id = query.before
+            if not isinstance(before_id, int):
+                raise ValueError("invalid history cursor")
+            conditions.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend((before_timestamp, before_timestamp, before_id))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         with get_connection() as conn:
             cursor = conn.cursor()
-            if restaurant_id is None:
-                cursor.execute(
-                    "SELECT * FROM light_history ORDER BY timestamp DESC LIMIT ?",
-                    (HISTORY_PAGE_SIZE,),
-                )
-            else:
-                cursor.execute(
-                    """
-                    SELECT * FROM light_history
-                    WHERE restaurant_id = ?
-                    ORDER BY timestamp DESC
-                    LIMIT ?
-                    """,
-                    (restaurant_id, HISTORY_PAGE_SIZE),
-                )
+            cursor.execute(
+                f"""
+                SELECT * FROM light_history
+                {where}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+                """,
+                (*params, query.limit),
+            )
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
-              
-    def save_full_schedule(self, restaurant_id: int, rules: list[dict[str, Any]]) -> dict[str, Any]:
-        """SQLite version - not implemented, return simple format"""
-        return {"restaurant_id": restaurant_id, "rules": rules, "note": "SQLite does not support day-specific schedules"}
 
-    def get_full_schedule(self, restaurant_id: int) -> dict[str, Any]:
-        """SQLite version - return empty rules"""
-        return {"restaurant_id": restaurant_id, "rules": []}
+    @staticmethod
+    def _ensure_light_row(cursor: sqlite3.Cursor, restaurant_id: int, now: str) -> None:
+        cursor.execute(
+            """
+            INSERT OR IGNORE INTO restaurant_lights (
+                restaurant_id, state, brightness, schedule_on, schedule_off, last_updated
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (restaurant_id, DEFAULT_LIGHT_STATE_OFF, DEFAULT_BRIGHTNESS_OFF, None, None, now),
+        )
 
+    def toggle_light(self, restaurant_id: int) -> dict[str, Any]:
+        """One transaction (one commit): create-if-missing, flip with RETURNING, append history."""
+        now = _utc_now_iso()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            self._ensure_light_row(cursor, restaurant_id, now)
+            cursor.execute(
+                """
+                UPDATE restaurant_lights
+                SET state = CASE WHEN state = ? THEN 'on' ELSE ? END,
+                    brightness = CASE
+                        WHEN state != ? THEN ?
+                        WHEN brightness > ? THEN brightness
+                        ELSE ?
+                    END,
+                    last_updated = ?
+                WHERE restaurant_id = ?
+                RETURNING *
+                """,
+                (
+                    DEFAULT_LIGHT_STATE_OFF,
+                    DEFAULT_LIGHT_STATE_OFF,
+                    DEFAULT_LIGHT_STATE_OFF,
+                    DEFAULT_BRIGHTNESS_OFF,
+                    BRIGHTNESS_MIN,
+                    DEFAULT_BRIGHTNESS_ON_PERCENT,
+                    now,
+                    restaurant_id,
+                ),
+            )
+            updated = dict(cursor.fetchone())
+            action = "toggle_off" if updated["state"] == DEFAULT_LIGHT_STATE_OFF else "toggle_on"
+            cursor.execute(
+                "INSERT INTO light_history (restaurant_id, action, timestamp) VALUES (?, ?, ?)",
+                (restaurant_id, action, now),
+            )
+            return updated
 
+    def set_schedule(self, restaurant_id: int, schedule_on: str, schedule_off: str) -> dict[str, Any]:
+        """One transaction (one commit): create-if-missing, update with RETURNING, append history."""
+        now = _utc_now_iso()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            self._ensure_light_row(cursor, restaurant_id, now)
+            cursor.execute(
+                """
+                UPDATE restaurant_lights
+                SET schedule_on = ?, schedule_off = ?, last_updated = ?
+                WHERE restaurant_id = ?
+                RETURNING *
+                """,
+                (schedule_on, schedule_off, now, restaurant_id),
+            )
+            updated = dict(cursor.fetchone())
+            cursor.execute(
+                "INSERT INTO light_history (restaurant_id, action, timestamp) VALUES (?, ?, ?)",
+                (restaurant_id, _schedule_action(schedule_on, schedule_off), now),
+            )
+            return updated
 
-class MongoLightRepository(LightRepository):
-    """
-    SD_IoT MongoDB: Devices, light_history, Schedules, Time_Data, users.
-    Field names match app.models.collections (DeviceDocument, LightHistoryDocument, etc.).
-    """
-    DEVICES = CollectionNames.DEVICES
-    SCHEDULES = CollectionNames.SCHEDULES
-    LIGHT_HISTORY = CollectionNames.LIGHT_HISTORY
-
-    def __init__(self) -> None:
-        self._db = get_mongo_db()
-
-    def _device_for_restaurant_id(self, restaurant_id: int) -> dict[str, Any] | None:
-        devices = self._db[self.DEVICES]
-        device_doc = devices.find_one({"legacyId": restaurant_id})
-        if device_doc is not None:
-            return device_doc
-        cursor = devices.find().sort("_id", MONGO_SORT_ASCENDING).skip(restaurant_id - 1).limit(1)
-        return next(cursor, None)
-
-    def _status_row_from_device(self, device: dict[str, Any], restaurant_id: int) -> dict[str, Any]:
-        # Devices collection: lightState, brightness, scheduleOn, scheduleOff, lastUpdated
-        state = device.get("lightState", DEFAULT_LIGHT_STATE_OFF)
-        brightness = int(device.get("brightness", DEFAULT_BRIGHTNESS_OFF))
-        schedule_on = device.get("scheduleOn")
-        schedule_off = device.get("scheduleOff")
-        if schedule_on is None or schedule_off is None:
-            schedule_doc = self._schedule_for_device(device)
-            if schedule_doc and schedule_doc.get("rules"):
-                first_rule = schedule_doc["rules"][FIRST_SCHEDULE_RULE_INDEX]
-                schedule_on = schedule_on or f"{first_rule.get('startHour', DEFAULT_HOUR):02d}:00"
-                schedule_off = schedule_off or f"{first_rule.get('endHour', DEFAULT_HOUR):02d}:00"
-        last_updated_raw = (
-            device.get("lastUpdated")
-            or device.get("updatedAt")
-            or (device.get("status") or {}).get("lastSeen")
+    @staticmethod
+    def _placeholders(values: list[Any]) -> str:
+        return ", ".join("?" for _ in values)
+
+    def _lock_light_rows(
+        self, cursor: sqlite3.Cursor, restaurant_ids: list[int], now: str
+    ) -> dict[int, dict[str, Any]]:
+        """
+        Create missing rows, then read them all with one IN query. The inserts
+        take the write lock first, so nothing can change the rows until commit.
+        """
+        cursor.executemany(
+            """
+            INSERT OR IGNORE INTO restaurant_lights (
+                restaurant_id, state, brightness, schedule_on, schedule_off, last_updated
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [(rid, DEFAULT_LIGHT_STATE_OFF, DEFAULT_BRIGHTNESS_OFF, None, None, now) for rid in restaurant_ids],
         )
-        last_updated = _datetime_to_iso(last_updated_raw)
-        return {
-            "restaurant_id": restaurant_id,
-            "state": state if state in ("on", "off") else DEFAULT_LIGHT_STATE_OFF,
-            "brightness": max(BRIGHTNESS_MIN, min(BRIGHTNESS_MAX, brightness)),
-            "schedule_on": schedule_on,
-            "schedule_off": schedule_off,
-            "last_updated": last_updated,
-        }
+        cursor.execute(
+            f"SELECT * FROM restaurant_lights WHERE restaurant_id IN ({self._placeholders(restaurant_ids)})",
+            restaurant_ids,
+        )
+        return {row["restaurant_id"]: dict(row) for row in cursor.fetchall()}
 
-    def _schedule_for_device(self, device: dict[str, Any]) -> dict[str, Any] | None:
-        schedules = self._db[self.SCHEDULES]
-        schedule_id = device.get("scheduleId")
-        if schedule_id is not None:
-            return schedules.find_one({"_id": schedule_id})
-        device_id = device.get("_id")
-        if device_id is not None:
-            return schedules.find_one({"deviceId": device_id})
-        return None
+    def _write_light_changes(
+        self, cursor: sqlite3.Cursor, changes: dict[int, tuple[str, int, str]], now: str
+    ) -> None:
+        cursor.executemany(
+            "UPDATE restaurant_lights SET state = ?, brightness = ?, last_updated = ? WHERE restaurant_id = ?",
+            [(state, brightness, now, rid) for rid, (state, brightness, _action) in changes.items()],
+        )
+        cursor.executemany(
+            "INSERT INTO light_history (restaurant_id, action, timestamp) VALUES (?, ?, ?)",
+            [(rid, action, now) for rid, (_state, _brightness, action) in changes.items()],
+        )
 
-    def get_or_create_light(self, restaurant_id: int) -> dict[str, Any]:
-        device = self._device_for_restaurant_id(restaurant_id)
-        if device is None:
-            return {
-                "restaurant_id": restaurant_id,
-                "state": DEFAULT_LIGHT_STATE_OFF,
-                "brightness": DEFAULT_BRIGHTNESS_OFF,
-                "schedule_on": None,
-                "schedule_off": None,
-                "last_updated": _utc_now_iso(),
+    def get_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        now = _utc_now_iso()
+        with get_connection() as conn:
+            return self._lock_light_rows(conn.cursor(), restaurant_ids, now), {}
+
+    def toggle_lights(self, restaurant_ids: list[int]) -> BatchResult:
+        """One transaction: IN read, executemany UPDATE, executemany history."""
+        now = _utc_now_iso()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            current = self._lock_light_rows(cursor, restaurant_ids, now)
+            changes = {rid: _next_toggle_state(row) for rid, row in current.items()}
+            self._write_light_changes(cursor, changes, now)
+        return self._changed_rows(current, changes, now), {}
+
+    def set_lights(self, commands: dict[int, LightCommand]) -> BatchResult:
+        now = _utc_now_iso()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            current = self._lock_light_rows(cursor, list(commands), now)
+            changes = {
+                rid: _apply_light_command(current[rid], state, brightness)
+                for rid, (state, brightness) in commands.items()
             }
-        return self._status_row_from_device(device, restaurant_id)
+            self._write_light_changes(cursor, changes, now)
+        return self._changed_rows(current, changes, now), {}
 
-    def update_light(
-        self,
-        restaurant_id: int,
-        state: str,
-        brightness: int,
-        schedule_on: str | None = None,
-        schedule_off: str | None = None,
-    ) -> dict[str, Any]:
-        device = self._device_for_restaurant_id(restaurant_id)
-        if device is None:
-            return self.get_or_create_light(restaurant_id)
-        devices = self._db[self.DEVICES]
-        now = datetime.now(timezone.utc)
-        update: dict[str, Any] = {
-            "lightState": state,
-            "brightness": brightness,
-            "lastUpdated": now.isoformat(),
-            "updatedAt": now,
-        }
-        if schedule_on is not None:
-            update["scheduleOn"] = schedule_on
-        if schedule_off is not None:
-            update["scheduleOff"] = schedule_off
-        devices.update_one({"_id": device["_id"]}, {"$set": update})
+    @staticmethod
+    def _changed_rows(
+        current: dict[int, dict[str, Any]], changes: dict[int, tuple[str, int, str]], now: str
+    ) -> dict[int, dict[str, Any]]:
         return {
-            "restaurant_id": restaurant_id,
-            "state": state,
-            "brightness": brightness,
-            "schedule_on": schedule_on or device.get("scheduleOn"),
-            "schedule_off": schedule_off or device.get("scheduleOff"),
-            "last_updated": now.isoformat(),
+            rid: {**current[rid], "state": state, "brightness": brightness, "last_updated": now}
+            for rid, (state, brightness, _action) in changes.items()
         }
 
-    def add_history(self, restaurant_id: int, action: str) -> None:
-        # light_history collection: restaurantId, deviceId, action, timestamp, legacyId
-        device = self._device_for_restaurant_id(restaurant_id)
-        now = datetime.now(timezone.utc)
-        history_entry: dict[str, Any] = {
-            "restaurantId": device["restaurantId"] if device else str(restaurant_id),
-            "action": action,
-            "timestamp": now.isoformat(),
-            "legacyId": restaurant_id,
+    def get_schedule_rules(self, restaurant_ids: list[int] | None = None) -> dict[int, list[dict[str, Any]]]:
+        """SQLite only has the simple daily schedule."""
+        where = "schedule_on IS NOT NULL AND schedule_off IS NOT NULL"
+        params: list[Any] = []
+        if restaurant_ids is not None:
+            where += f" AND restaurant_id IN ({self._placeholders(restaurant_ids)})"
+            params = list(restaurant_ids)
+        with get_connection() as conn:
+            rows = conn.execute(
+                f"SELECT restaurant_id, schedule_on, schedule_off FROM restaurant_lights WHERE {where}",
+                params,
+            ).fetchall()
+        return {
+            row["restaurant_id"]: effective_rules(None, row["schedule_on"], row["schedule_off"])
+            for row in rows
         }
-        if device:
-            history_entry["deviceId"] = device["_id"]
-        self._db[self.LIGHT_HISTORY].insert_one(history_entry)
-
-    def get_history(self, restaurant_id: int | None = None) -> list[dict[str, Any]]:
-        history_coll = self._db[self.LIGHT_HISTORY]
-        if restaurant_id is not None:
-            history_filter: dict[str, Any] = {"legacyId": restaurant_id}
-        else:
-            history_filter = {}
-        cursor = history_coll.find(history_filter).sort(
-            "timestamp", MONGO_SORT_DESCENDING
-        ).limit(HISTORY_PAGE_SIZE)
-        rows: list[dict[str, Any]] = []
-        for index, history_doc in enumerate(cursor):
-            event_timestamp = history_doc.get("timestamp")
-            response_restaurant_id = history_doc.get("legacyId")
-            if response_restaurant_id is None and restaurant_id is not None:
-                response_restaurant_id = restaurant_id
-            elif response_restaurant_id is None:
-                response_restaurant_id = UNKNOWN_LEGACY_ID
-            rows.append({
-                "id": index + 1,
-                "restaurant_id": response_restaurant_id,
-                "action": history_doc["action"],
-                "timestamp": _datetime_to_iso(event_timestamp) if event_timestamp else "",
-            })
-        return rows
 
     def save_full_schedule(self, restaurant_id: int, rules: list[dict[str, Any]]) -> dict[str, Any]:
-        """Save day-specific schedule rules to Schedules collection - one rule per day"""
-        # First get the device
-        device = self._device_for_restaurant_id(restaurant_id)
-        if not device:
-            raise ValueError(f"Device with legacyId {restaurant_id} not found")
-        
-        schedules = self._db[self.SCHEDULES]
-        now = datetime.now(timezone.utc)
-        
-        # Format each rule individually - one per day
-        formatted_rules = []
-        for rule in rules:
-            # Each rule should have exactly one day (from your frontend)
-            formatted_rule = {
-                "days": rule.get("days", []),  # Should be a single-day array like ["MON"]
-                "startHour": int(rule.get("startTime", "00:00").split(":")[0]),
-                "endHour": int(rule.get("endTime", "00:00").split(":")[0]),
-                "startMinute": int(rule.get("startTime", "00:00").split(":")[1]),
-                "endMinute": int(rule.get("endTime", "00:00").split(":")[1]),
-                "action": "ON",
-                "enabled": rule.get("enabled", True)
-            }
-            formatted_rules.append(formatted_rule)
-        
-        # Check if schedule already exists
-        existing = schedules.find_one({"deviceId": device["_id"]})
-        
-        schedule_data = {
-            "deviceId": device["_id"],
-            "restaurantId": device.get("restaurantId"),
-            "restaurant": device.get("restaurant"),
-            "rules": formatted_rules,
-            "updatedAt": now
-        }
-        
-        if existing:
-            schedules.update_one({"_id": existing["_id"]}, {"$set": schedule_data})
-            schedule_data["_id"] = str(existing["_id"])
-        else:
-            schedule_data["createdAt"] = now
-            result = schedules.insert_one(schedule_data)
-            schedule_data["_id"] = str(result.inserted_id)
-        
-        # Add to history
-        self.add_history(restaurant_id, "schedule_updated")
-        
-        # Convert back to response format
-        return self.get_full_schedule(restaurant_id)
+        """SQLite version - not implemented, return simple format"""
+        return {"restaurant_id": restaurant_id, "rules": rules, "note": "SQLite does not support day-specific schedules"}
 
     def get_full_schedule(self, restaurant_id: int) -> dict[str, Any]:
-        """Get day-specific schedule rules from Schedules collection"""
-        device = self._device_for_restaurant_id(restaurant_id)
-        if not device:
-            return {"deviceId": None, "rules": []}
-        
-        schedules = self._db[self.SCHEDULES]
-        schedule = schedules.find_one({"deviceId": device["_id"]})
-        
-        if not schedule:
-            return {
-                "deviceId": device["_id"],
-                "restaurantId": device.get("restaurantId"),
-                "rules": []
-            }
-        
-        # Convert from storage format to response format - keep individual days
-        rules_response = []
-        for rule in schedule.get("rules", []):
-            start_time = f"{rule.get('startHour', 0):02d}:{rule.get('startMinute', 0):02d}"
-            end_time = f"{rule.get('endHour', 0):02d}:{rule.get('endMinute', 0):02d}"
-            rules_response.append({
-                "days": rule.get("days", []),  # Keep the days array
-                "startTime": start_time,
-                "endTime": end_time,
-                "enabled": rule.get("enabled", True)
-            })
-        
-        return {
-            "deviceId": schedule["deviceId"],
-            "restaurantId": schedule.get("restaurantId"),
-            "rules": rules_response,
-            "createdAt": _datetime_to_iso(schedule.get("createdAt")),
-            "updatedAt": _datetime_to_iso(schedule.get("updatedAt"))
-        }
+        """SQLite version - return empty rules"""
+        return {"restaurant_id": restaurant_id, "rules": []}
+
+    def get_light_version(self, restaurant_id: int) -> datetime | None:
+        # Primary key lookup of one column; no row means get_status would create it
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT last_updated FROM restaurant_lights WHERE restaurant_id = ?", (restaurant_id,)
+            ).fetchone()
+        return None if row is None else datetime.fromisoformat(row["last_updated"])
+
 
 
 class LightService:
-    def __init__(self, repository: LightRepository) -> None:
+    """
+    Business logic for the routes; every repository call is awaited. The single
+    restaurant reads and writes return typed records (app.services.records), so
+    the routes only serialize them.
+    """
+
+    def __init__(
+        self, repository: AsyncLightRepository, coalesce_window_ms: int = LIGHT_COALESCE_WINDOW_MS
+    ) -> None:
         self.repository = repository
+        self.archive: ColdArchive | None = None  # history older than the live retention
+        self.status_cache: StatusCache | None = None  # kept current through a status listener
+        self.coalesce_window_seconds = coalesce_window_ms / 1000
+        self._toggle_bursts: dict[int, ToggleBurst] = {}
+        self.toggles_coalesced = 0
+        self._schedule_listeners: list[Callable[[int], None]] = []
+        self._status_listeners: list[Callable[[dict[str, Any]], None]] = []
+
+    def add_schedule_listener(self, listener: Callable[[int], None]) -> None:
+        """listener(restaurant_id) runs after every schedule write, e.g. to drop compiled schedules."""
+        self._schedule_listeners.append(listener)
+
+    def _schedule_changed(self, restaurant_id: int) -> None:
+        for listener in self._schedule_listeners:
+            listener(restaurant_id)
+
+    def add_status_listener(self, listener: Callable[[dict[str, Any]], None]) -> None:
+        """listener(status response) runs after every light write made through this service."""
+        self._status_listeners.append(listener)
+
+    def _status_changed(self, status: dict[str, Any]) -> dict[str, Any]:
+        for listener in self._status_listeners:
+            listener(status)
+        return status
+
+    def lights_written(self, rows: dict[int, dict[str, Any]]) -> None:
+        """
+        Run the status listeners for rows written around this service (the
+        scheduler, fan-out jobs), so the status cache, live clients and MQTT
+        commands do not wait for the event bus.
+        """
+        for row in rows.values():
+            self._status_changed(self._to_status_response(row))
+
+    async def get_status(self, restaurant_id: int) -> LightStatusRecord:
+        return status_record(await self._current_status(restaurant_id))
 
-    def get_status(self, restaurant_id: int) -> dict[str, Any]:
-        row = self.repository.get_or_create_light(restaurant_id)
+    async def _current_status(self, restaurant_id: int) -> dict[str, Any]:
+        if self.status_cache is not None:
+            return await self.status_cache.get(restaurant_id, lambda: self._load_status(restaurant_id))
+        return await self._load_status(restaurant_id)
+
+    async def _load_status(self, restaurant_id: int) -> dict[str, Any]:
+        row = await self.repository.get_or_create_light(restaurant_id)
         return self._to_status_response(row)
 
-    def toggle_light(self, restaurant_id: int) -> dict[str, Any]:
-        current = self.repository.get_or_create_light(restaurant_id)
-        if current["state"] == DEFAULT_LIGHT_STATE_OFF:
-            next_state = "on"
-            next_brightness = (
-                current["brightness"]
-                if current["brightness"] > BRIGHTNESS_MIN
-                else DEFAULT_BRIGHTNESS_ON_PERCENT
-            )
-            action = "toggle_on"
+    async def get_status_version(self, restaurant_id: int) -> datetime | None:
+        """When the status last changed, for ETag / Last-Modified; None if unknown."""
+        if self.status_cache is not None:
+            # The cached status's own timestamp, so a cache hit needs no query
+            status = await self._current_status(restaurant_id)
+            return document_version({"updatedAt": status["lastUpdated"]})
+        return await self.repository.get_light_version(restaurant_id)
+
+    async def get_schedule_version(self, restaurant_id: int) -> datetime | None:
+        return await self.repository.get_schedule_version(restaurant_id)
+
+    async def toggle_light(self, restaurant_id: int) -> LightStatusRecord:
+        """
+        With a coalescing window, taps on one restaurant within it share one
+        result: an odd count is one toggle (one write, one history row), an
+        even count changes nothing. Every tap gets the final status.
+        """
+        if self.coalesce_window_seconds <= 0:
+            return status_record(await self._toggle_now(restaurant_id))
+        burst = self._toggle_bursts.get(restaurant_id)
+        if burst is None:
+            burst = self._toggle_bursts[restaurant_id] = ToggleBurst(taps=1)
+            burst.result = asyncio.create_task(self._finish_toggle_burst(restaurant_id, burst))
         else:
-            next_state = DEFAULT_LIGHT_STATE_OFF
-            next_brightness = DEFAULT_BRIGHTNESS_OFF
-            action = "toggle_off"
+            burst.taps += 1
+            self.toggles_coalesced += 1
+        # Shielded: one cancelled request must not cancel the write the others wait for
+        return status_record(await asyncio.shield(burst.result))
 
-        updated = self.repository.update_light(
-            restaurant_id=restaurant_id,
-            state=next_state,
-            brightness=next_brightness,
-        )
-        self.repository.add_history(restaurant_id, action)
-        return self._to_status_response(updated)
+    async def _finish_toggle_burst(self, restaurant_id: int, burst: ToggleBurst) -> dict[str, Any]:
+        try:
+            await asyncio.sleep(self.coalesce_window_seconds)
+        finally:
+            del self._toggle_bursts[restaurant_id]  # later taps start a new burst
+        if burst.taps % 2:
+            return await self._toggle_now(restaurant_id)
+        return await self._current_status(restaurant_id)
+
+    async def _toggle_now(self, restaurant_id: int) -> dict[str, Any]:
+        updated = await self.repository.toggle_light(restaurant_id)
+        return self._status_changed(self._to_status_response(updated))
 
-    def schedule_light(
+    async def schedule_light(
         self, restaurant_id: int, schedule_on: str, schedule_off: str
-    ) -> dict[str, Any]:
-        current = self.repository.get_or_create_light(restaurant_id)
-        updated = self.repository.update_light(
-            restaurant_id=restaurant_id,
-            state=current["state"],
-            brightness=current["brightness"],
-            schedule_on=schedule_on,
-            schedule_off=schedule_off,
-        )
-        self.repository.add_history(
-            restaurant_id, f"schedule_set_{schedule_on}_{schedule_off}"
-        )
-        return self._to_status_response(updated)
+    ) -> LightStatusRecord:
+        updated = await self.repository.set_schedule(restaurant_id, schedule_on, schedule_off)
+        self._schedule_changed(restaurant_id)
+        return status_record(self._status_changed(self._to_status_response(updated)))
 
     # New methods for full schedule management
-    def set_full_schedule(self, restaurant_id: int, rules: list[dict[str, Any]]) -> dict[str, Any]:
+    async def set_full_schedule(self, restaurant_id: int, rules: list[dict[str, Any]]) -> FullScheduleRecord:
         """Save day-specific schedule rules"""
-        return self.repository.save_full_schedule(restaurant_id, rules)
+        saved = await self.repository.save_full_schedule(restaurant_id, rules)
+        self._schedule_changed(restaurant_id)
+        return schedule_record(saved)
 
-    def get_full_schedule(self, restaurant_id: int) -> dict[str, Any]:
+    async def get_full_schedule(self, restaurant_id: int) -> FullScheduleRecord:
         """Get day-specific schedule rules"""
-        return self.repository.get_full_schedule(restaurant_id)
+        return schedule_record(await self.repository.get_full_schedule(restaurant_id))
+
+    async def get_history(
+        self,
+        restaurant_id: int | None = None,
+        cursor: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        action: str | None = None,
+        limit: int = HISTORY_PAGE_SIZE,
+    ) -> tuple[list[LightHistoryRecord], str | None]:
+        """Return one history page and the cursor for the next one (None on the last page)."""
+        query = HistoryQuery(
+            before=decode_history_cursor(cursor) if cursor else None,
+            start=to_utc_iso(start) if start else None,
+            end=to_utc_iso(end) if end else None,
+            action=action,
+            limit=limit,
+        )
+        rows = await self.repository.get_history(restaurant_id, query)
+        # A full page whose oldest row is newer than everything archived needs no archive read
+        oldest = rows[-1]["timestamp"] if len(rows) == limit else None
+        if self.archive is not None and self.archive.covers(
+            "history", datetime.fromisoformat(oldest) if oldest else start
+        ):
+            archived = await asyncio.to_thread(self.archive.history_page, restaurant_id, query)
+            rows = merge_history_rows(rows, archived, limit)
+        next_cursor = encode_history_cursor(rows[-1]) if len(rows) == limit else None
+        return history_records(rows), next_cursor
 
-    def get_history(self, restaurant_id: int | None = None) -> list[dict[str, Any]]:
-        rows = self.repository.get_history(restaurant_id)
+    # Batch operations: one result per distinct restaurantId, in request order
+    async def get_status_batch(self, restaurant_ids: list[int]) -> list[dict[str, Any]]:
+        restaurant_ids = list(dict.fromkeys(restaurant_ids))
+        if self.status_cache is None:
+            rows, errors = await self.repository.get_lights(restaurant_ids)
+            return self._batch_results(restaurant_ids, rows, errors)
+        cached = await self.status_cache.get_many(restaurant_ids)
+        missing = [rid for rid in restaurant_ids if rid not in cached]
+        rows, errors = await self.repository.get_lights(missing) if missing else ({}, {})
+        for rid, row in rows.items():
+            cached[rid] = self.status_cache.fill(self._to_status_response(row))
         return [
-            {
-                "id": row["id"],
-                "restaurantId": row["restaurant_id"],
-                "action": row["action"],
-                "timestamp": row["timestamp"],
-            }
-            for row in rows
+            {"restaurantId": rid, "status": cached[rid]}
+            if rid in cached
+            else {"restaurantId": rid, "error": errors.get(rid, DEVICE_NOT_FOUND_ERROR)}
+            for rid in restaurant_ids
         ]
 
+    async def toggle_lights(self, restaurant_ids: list[int]) -> list[dict[str, Any]]:
+        """Each distinct restaurantId is toggled once, even if listed twice."""
+        restaurant_ids = list(dict.fromkeys(restaurant_ids))
+        rows, errors = await self.repository.toggle_lights(restaurant_ids)
+        return self._batch_results(restaurant_ids, rows, errors, notify=True)
+
+    async def set_lights(self, commands: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """commands: {restaurantId, state?, brightness?}; the last command per restaurant wins."""
+        by_restaurant: dict[int, LightCommand] = {
+            command["restaurantId"]: (command.get("state"), command.get("brightness"))
+            for command in commands
+        }
+        rows, errors = await self.repository.set_lights(by_restaurant)
+        return self._batch_results(list(by_restaurant), rows, errors, notify=True)
+
+    def _batch_results(
+        self,
+        restaurant_ids: list[int],
+        rows: dict[int, dict[str, Any]],
+        errors: dict[int, str],
+        notify: bool = False,
+    ) -> list[dict[str, Any]]:
+        results = []
+        for rid in restaurant_ids:
+            if rid in rows:
+                status = self._to_status_response(rows[rid])
+                if notify:
+                    self._status_changed(status)
+                results.append({"restaurantId": rid, "status": status})
+            else:
+                results.append({"restaurantId": rid, "error": errors.get(rid, DEVICE_NOT_FOUND_ERROR)})
+        return results
+
+    def status_from_document(self, document: dict[str, Any], restaurant_id: int) -> dict[str, Any]:
+        """Status response for a changed Devices document or SQLite restaurant_lights row."""
+        row = document if "restaurant_id" in document else _status_row(document, restaurant_id)
+        return self._to_status_response(row)
+
     @staticmethod
     def _to_status_response(row: dict[str, Any]) -> dict[str, Any]:
         return {
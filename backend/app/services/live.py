@@ -0,0 +1,98 @@
+"""
+Push channel behind the /lights/stream WebSocket.
+
+LiveHub fans status and history updates out to the connections subscribed to
+each restaurantId. Every connection has a bounded buffer so one slow client
+can never hold up a write or grow memory without limit:
+  - status updates are merged: only the newest status per restaurant is kept
+  - history rows queue up to LIVE_QUEUE_SIZE; beyond that the oldest are
+    dropped and the client is told how many, so it can refetch /lights/history
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import deque
+from datetime import datetime
+from typing import Any, Iterable
+
+from app.services.status_cache import _status_time
+
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "256"))
+
+MESSAGE_STATUS = "status"
+MESSAGE_HISTORY = "history"
+MESSAGE_DROPPED = "dropped"
+
+
+class LiveConnection:
+    def __init__(self, max_history: int = LIVE_QUEUE_SIZE) -> None:
+        self.restaurant_ids: set[int] = set()
+        self._statuses: dict[int, dict[str, Any]] = {}
+        self._history: deque[dict[str, Any]] = deque()
+        self._max_history = max_history
+        self._last_sent: dict[int, datetime] = {}  # restaurantId -> lastUpdated already delivered
+        self._dropped = 0
+        self._ready = asyncio.Event()
+
+    def push_status(self, status: dict[str, Any]) -> None:
+        rid = status["restaurantId"]
+        last_sent = self._last_sent.get(rid)
+        if last_sent is not None and _status_time(status) <= last_sent:
+            return  # same update seen from the write path and the change feed
+        self._statuses[rid] = status
+        self._ready.set()
+
+    def push_history(self, item: dict[str, Any]) -> None:
+        if len(self._history) >= self._max_history:
+            self._history.popleft()
+            self._dropped += 1
+        self._history.append(item)
+        self._ready.set()
+
+    async def next_messages(self) -> list[dict[str, Any]]:
+        """Wait for pending updates and take all of them."""
+        await self._ready.wait()
+        self._ready.clear()
+        messages: list[dict[str, Any]] = []
+        if self._dropped:
+            messages.append({"type": MESSAGE_DROPPED, "history": self._dropped})
+            self._dropped = 0
+        for status in self._statuses.values():
+            self._last_sent[status["restaurantId"]] = _status_time(status)
+            messages.append({"type": MESSAGE_STATUS, "data": status})
+        self._statuses.clear()
+        messages.extend({"type": MESSAGE_HISTORY, "data": item} for item in self._history)
+        self._history.clear()
+        return messages
+
+
+class LiveHub:
+    def __init__(self) -> None:
+        self._subscribers: dict[int, set[LiveConnection]] = {}
+
+    @property
+    def connections(self) -> int:
+        return len({conn for conns in self._subscribers.values() for conn in conns})
+
+    def subscribe(self, connection: LiveConnection, restaurant_ids: Iterable[int]) -> None:
+        for rid in restaurant_ids:
+            connection.restaurant_ids.add(rid)
+            self._subscribers.setdefault(rid, set()).add(connection)
+
+    def unsubscribe(self, connection: LiveConnection, restaurant_ids: Iterable[int] | None = None) -> None:
+        for rid in list(connection.restaurant_ids if restaurant_ids is None else restaurant_ids):
+            connection.restaurant_ids.discard(rid)
+            subscribers = self._subscribers.get(rid)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self._subscribers[rid]
+
+    def publish_status(self, status: dict[str, Any]) -> None:
+        for connection in self._subscribers.get(status["restaurantId"], ()):
+            connection.push_status(status)
+
+    def publish_history(self, item: dict[str, Any]) -> None:
+        for connection in self._subscribers.get(item["restaurantId"], ()):
+            connection.push_history(item)
@@ -0,0 +1,99 @@
+"""
+Typed results of the LightService read and write methods.
+
+Each record holds exactly the fields of its response model (a TypedDict:
+orjson encodes plain dicts fastest), with timestamps already parsed to
+datetime as the model would parse them. The routes either hand a record to
+its response_model or, with FAST_RESPONSES=1, write it straight to bytes
+(see app.routes.responses); both send the same body.
+
+Status listeners and the status cache keep the plain status dict with an ISO
+lastUpdated string; only what the service returns is a record.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Optional, TypedDict
+
+
+class LightStatusRecord(TypedDict):
+    """LightStatusResponse"""
+    restaurantId: int
+    state: str
+    brightness: int
+    lastUpdated: datetime | str
+
+
+class LightHistoryRecord(TypedDict):
+    """LightHistoryItem"""
+    id: int | str
+    restaurantId: int
+    action: str
+    timestamp: datetime | str
+
+
+class DayScheduleRecord(TypedDict):
+    """DayScheduleRule"""
+    days: list[str]
+    startTime: str
+    endTime: str
+    enabled: bool
+
+
+class FullScheduleRecord(TypedDict):
+    """FullScheduleResponse"""
+    deviceId: Optional[str]
+    rules: list[DayScheduleRecord]
+    createdAt: Optional[datetime | str]
+    updatedAt: Optional[datetime | str]
+
+
+def _timestamp(value: Any) -> Any:
+    """ISO string -> datetime, as the response model parses it; anything else passes through."""
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def status_record(status: dict[str, Any]) -> LightStatusRecord:
+    """From a status dict (restaurantId, state, brightness, lastUpdated)."""
+    return {
+        "restaurantId": status["restaurantId"],
+        "state": status["state"],
+        "brightness": status["brightness"],
+        "lastUpdated": _timestamp(status["lastUpdated"]),
+    }
+
+
+def history_records(rows: list[dict[str, Any]]) -> list[LightHistoryRecord]:
+    """From repository history rows (id, restaurant_id, action, timestamp)."""
+    return [
+        {
+            "id": row["id"],
+            "restaurantId": row["restaurant_id"],
+            "action": row["action"],
+            "timestamp": _timestamp(row["timestamp"]),
+        }
+        for row in rows
+    ]
+
+
+def schedule_record(schedule: dict[str, Any]) -> FullScheduleRecord:
+    """From a repository full-schedule response."""
+    return {
+        "deviceId": schedule.get("deviceId"),
+        "rules": [
+            {
+                "days": rule["days"],
+                "startTime": rule["startTime"],
+                "endTime": rule["endTime"],
+                "enabled": rule.get("enabled", True),
+            }
+            for rule in schedule.get("rules", [])
+        ],
+        "createdAt": _timestamp(schedule.get("createdAt")),
+        "updatedAt": _timestamp(schedule.get("updatedAt")),
+    }
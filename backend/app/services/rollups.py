@@ -0,0 +1,622 @@
+"""
+Multi-resolution Time_Data rollups.
+
+TelemetryRollupEngine folds raw readings into 1-minute, 1-hour and 1-day
+buckets per device: min/max/sum of V, I and P, sample count and energy (Wh).
+Each pass reads only readings with timestamp in [mark, now - lateness), so
+readings up to TELEMETRY_ROLLUP_LATENESS_SECONDS late are still counted, and
+merges them into the stored buckets with $min/$max/$inc (Mongo) or an
+ON CONFLICT upsert (SQLite). A bucket that straddles two passes is simply
+merged twice.
+
+Energy is the trapezoid between consecutive readings of a device, credited
+to the bucket of the later reading. Gaps longer than TELEMETRY_ROLLUP_MAX_GAP_SECONDS
+(device offline) add no energy. The last reading per device is kept with the
+mark, so integration continues across passes.
+
+Enable the background loop with TELEMETRY_ROLLUPS_ENABLED=1 on exactly one API
+process; two engines would both add every reading. On MongoDB the bucket
+writes and the mark are separate writes, so a crash between them can count
+one pass twice; on SQLite a pass is one transaction.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app.database.db import get_connection
+from app.database.mongo import get_async_mongo_db
+from app.models.collections import CollectionNames
+
+if TYPE_CHECKING:
+    from app.services.archive import ColdArchive
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_ROLLUPS_ENABLED = os.getenv("TELEMETRY_ROLLUPS_ENABLED", "").lower() in ("1", "true", "yes")
+TELEMETRY_ROLLUP_INTERVAL_SECONDS = float(os.getenv("TELEMETRY_ROLLUP_INTERVAL_SECONDS", "60"))
+TELEMETRY_ROLLUP_LATENESS_SECONDS = float(os.getenv("TELEMETRY_ROLLUP_LATENESS_SECONDS", "120"))
+TELEMETRY_ROLLUP_MAX_GAP_SECONDS = float(os.getenv("TELEMETRY_ROLLUP_MAX_GAP_SECONDS", "300"))
+# Longest time range read in one pass; a backlog is worked off in several passes
+TELEMETRY_ROLLUP_MAX_PASS = timedelta(hours=6)
+TELEMETRY_ROLLUP_CURSOR_BATCH = 10000
+
+# Bucket widths in seconds, coarsest first (the query picks the first that has enough points)
+RESOLUTIONS: dict[str, int] = {"1d": 86400, "1h": 3600, "1m": 60}
+RAW_RESOLUTION = "raw"
+MEASUREMENTS = ("V", "I", "P")
+SECONDS_PER_HOUR = 3600.0
+
+STATE_ID = "telemetry"  # the engine's one state document / row
+
+RawReading = tuple[datetime, dict[str, float]]
+RAW_PROJECTION = {
+    "_id": 0,
+    "timestamp": 1,
+    "metadata.deviceId": 1,
+    **{f"measurements.{name}": 1 for name in MEASUREMENTS},
+}
+
+
+@dataclass
+class ReadingColumns:
+    """One pass worth of readings as parallel arrays (timestamps in epoch seconds)."""
+    device_ids: np.ndarray
+    timestamps: np.ndarray
+    values: dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+@dataclass
+class RollupState:
+    mark: datetime | None = None
+    # deviceId -> (epoch seconds, P) of the newest reading already rolled up
+    last: dict[str, tuple[float, float]] = field(default_factory=dict)
+
+
+@dataclass
+class Bucket:
+    device_id: str
+    resolution: int
+    start: datetime
+    count: int
+    minimum: dict[str, float]
+    maximum: dict[str, float]
+    total: dict[str, float]
+    wh: float
+
+    def point(self) -> dict[str, Any]:
+        point: dict[str, Any] = {"t": self.start, "count": self.count, "Wh": self.wh}
+        for name in MEASUREMENTS:
+            point[name] = {
+                "min": self.minimum[name],
+                "max": self.maximum[name],
+                "mean": self.total[name] / self.count if self.count else None,
+            }
+        return point
+
+
+def _epoch(moment: datetime) -> float:
+    return moment.timestamp()
+
+
+def _utc(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+def _iso(moment: datetime) -> str:
+    """Same fixed-width text as the telemetry table, so SQLite compares it in time order."""
+    return moment.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def energy_wh(columns: ReadingColumns, state: RollupState, max_gap: float) -> np.ndarray:
+    """
+    Trapezoid energy per reading since the previous reading of the same
+    device. columns must be sorted by (device, timestamp); state.last is
+    updated to each device's newest reading.
+    """
+    timestamps, power, devices = columns.timestamps, columns.values["P"], columns.device_ids
+    if not len(timestamps):
+        return np.zeros(0)
+    previous_t = np.empty_like(timestamps)
+    previous_p = np.empty_like(power)
+    previous_t[1:], previous_p[1:] = timestamps[:-1], power[:-1]
+    first = np.ones(len(timestamps), dtype=bool)
+    first[1:] = devices[1:] != devices[:-1]
+    for index in np.flatnonzero(first):
+        previous_t[index], previous_p[index] = state.last.get(devices[index], (np.nan, np.nan))
+    gap = timestamps - previous_t
+    usable = (gap > 0) & (gap <= max_gap)  # NaN (no previous reading) compares False
+    energy = np.where(usable, (power + previous_p) / 2 * gap / SECONDS_PER_HOUR, 0.0)
+    last = np.ones(len(timestamps), dtype=bool)
+    last[:-1] = devices[1:] != devices[:-1]
+    for index in np.flatnonzero(last):
+        state.last[str(devices[index])] = (float(timestamps[index]), float(power[index]))
+    return energy
+
+
+def rollup_buckets(columns: ReadingColumns, energy: np.ndarray, width: int) -> list[Bucket]:
+    """Aggregate sorted columns into width-second buckets with vectorized reduceat passes."""
+    if not len(columns):
+        return []
+    starts = np.floor(columns.timestamps / width) * width
+    # columns are sorted by (device, timestamp), so each (device, bucket) run is contiguous
+    boundary = np.ones(len(starts), dtype=bool)
+    boundary[1:] = (columns.device_ids[1:] != columns.device_ids[:-1]) | (starts[1:] != starts[:-1])
+    offsets = np.flatnonzero(boundary)
+    counts = np.diff(np.append(offsets, len(starts)))
+    minimum = {name: np.minimum.reduceat(column, offsets) for name, column in columns.values.items()}
+    maximum = {name: np.maximum.reduceat(column, offsets) for name, column in columns.values.items()}
+    total = {name: np.add.reduceat(column, offsets) for name, column in columns.values.items()}
+    wh = np.add.reduceat(energy, offsets)
+    return [
+        Bucket(
+            device_id=str(columns.device_ids[offset]),
+            resolution=width,
+            start=_utc(float(starts[offset])),
+            count=int(counts[i]),
+            minimum={name: float(minimum[name][i]) for name in MEASUREMENTS},
+            maximum={name: float(maximum[name][i]) for name in MEASUREMENTS},
+            total={name: float(total[name][i]) for name in MEASUREMENTS},
+            wh=float(wh[i]),
+        )
+        for i, offset in enumerate(offsets)
+    ]
+
+
+def _sorted_columns(
+    device_ids: list[str] | np.ndarray, timestamps: list[float] | np.ndarray, values: dict[str, Any]
+) -> ReadingColumns:
+    devices = np.array(device_ids, dtype=object)
+    times = np.array(timestamps, dtype=np.float64)
+    order = np.lexsort((times, devices.astype(str))) if len(times) else np.zeros(0, dtype=np.int64)
+    return ReadingColumns(
+        device_ids=devices[order],
+        timestamps=times[order],
+        values={name: np.array(column, dtype=np.float64)[order] for name, column in values.items()},
+    )
+
+
+def choose_resolution(start: datetime, end: datetime, points: int) -> str:
+    """Coarsest resolution that still yields at least `points` buckets in [start, end)."""
+    span = (end - start).total_seconds()
+    for name, width in RESOLUTIONS.items():
+        if span / width >= points:
+            return name
+    return RAW_RESOLUTION
+
+
+class RollupStore(ABC):
+    # Cold storage for readings older than the live retention; set by the routes
+    archive: ColdArchive | None = None
+
+    async def read_readings(
+        self, start: datetime, end: datetime, device_ids: list[str] | None = None
+    ) -> ReadingColumns:
+        """read_columns merged with archived readings (rollup passes only need the live ones)."""
+        live = await self.read_columns(start, end, device_ids)
+        if self.archive is None or not self.archive.covers("telemetry", start):
+            return live
+        archived = await asyncio.to_thread(self.archive.telemetry_columns, start, end, device_ids)
+        return _sorted_columns(
+            np.concatenate([archived.device_ids, live.device_ids]),
+            np.concatenate([archived.timestamps, live.timestamps]),
+            {name: np.concatenate([archived.values[name], live.values[name]]) for name in MEASUREMENTS},
+        )
+
+    async def read_raw(self, device_id: str, start: datetime, end: datetime, limit: int) -> list[RawReading]:
+        """query_raw merged with archived readings."""
+        live = await self.query_raw(device_id, start, end, limit)
+        if self.archive is None or not self.archive.covers("telemetry", start):
+            return live
+        archived = await asyncio.to_thread(self.archive.telemetry_raw, device_id, start, end, limit)
+        return sorted(archived + live, key=lambda reading: reading[0])[:limit]
+
+    @abstractmethod
+    async def load_state(self) -> RollupState:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def earliest_reading(self) -> datetime | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def read_columns(
+        self, start: datetime, end: datetime, device_ids: list[str] | None = None
+    ) -> ReadingColumns:
+        """Raw readings with start <= timestamp < end, sorted by (device, timestamp); all devices by default."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def merge(self, buckets: list[Bucket], state: RollupState) -> None:
+        """Merge buckets into the stored rollups, then save state."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def device_for_restaurant(self, restaurant_id: int) -> str | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def query_buckets(self, device_id: str, width: int, start: datetime, end: datetime) -> list[Bucket]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def query_raw(self, device_id: str, start: datetime, end: datetime, limit: int) -> list[RawReading]:
+        """(timestamp, {"V", "I", "P"}) pairs in time order, at most limit."""
+        raise NotImplementedError
+
+
+class MongoRollupStore(RollupStore):
+    """Buckets in Time_Data_rollups, keyed (deviceId, resolution, bucket); state in Time_Data_rollup_state."""
+    DEVICES = CollectionNames.DEVICES
+    TIME_DATA = CollectionNames.TIME_DATA
+    ROLLUPS = CollectionNames.TIME_DATA_ROLLUPS
+    ROLLUP_STATE = CollectionNames.TIME_DATA_ROLLUP_STATE
+
+    def __init__(self) -> None:
+        self._db = get_async_mongo_db()
+
+    async def load_state(self) -> RollupState:
+        document = await self._db[self.ROLLUP_STATE].find_one({"_id": STATE_ID})
+        if document is None:
+            return RollupState()
+        mark = document.get("mark")
+        return RollupState(
+            mark=mark.replace(tzinfo=timezone.utc) if mark is not None and mark.tzinfo is None else mark,
+            # a list, not a dict: device ids are not safe as field names
+            last={device_id: (t, p) for device_id, t, p in document.get("last", [])},
+        )
+
+    async def earliest_reading(self) -> datetime | None:
+        document = await self._db[self.TIME_DATA].find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+        if document is None:
+            return None
+        return document["timestamp"].replace(tzinfo=timezone.utc)
+
+    async def read_columns(
+        self, start: datetime, end: datetime, device_ids: list[str] | None = None
+    ) -> ReadingColumns:
+        reading_filter: dict[str, Any] = {"timestamp": {"$gte": start, "$lt": end}}
+        if device_ids is not None:
+            reading_filter["metadata.deviceId"] = {"$in": device_ids}
+        devices: list[str] = []
+        timestamps: list[float] = []
+        values: dict[str, list[float]] = {name: [] for name in MEASUREMENTS}
+        cursor = self._db[self.TIME_DATA].find(reading_filter, RAW_PROJECTION).batch_size(
+            TELEMETRY_ROLLUP_CURSOR_BATCH
+        )
+        async for document in cursor:
+            measurements = document["measurements"]
+            devices.append(document["metadata"]["deviceId"])
+            timestamps.append(document["timestamp"].replace(tzinfo=timezone.utc).timestamp())
+            for name in MEASUREMENTS:
+                values[name].append(measurements[name])
+        return _sorted_columns(devices, timestamps, values)
+
+    async def merge(self, buckets: list[Bucket], state: RollupState) -> None:
+        operations = [
+            UpdateOne(
+                {"deviceId": bucket.device_id, "resolution": bucket.resolution, "bucket": bucket.start},
+                {
+                    "$min": {f"{name}.min": bucket.minimum[name] for name in MEASUREMENTS},
+                    "$max": {f"{name}.max": bucket.maximum[name] for name in MEASUREMENTS},
+                    "$inc": {
+                        "count": bucket.count,
+                        "Wh": bucket.wh,
+                        **{f"{name}.sum": bucket.total[name] for name in MEASUREMENTS},
+                    },
+                },
+                upsert=True,
+            )
+            for bucket in buckets
+        ]
+        if operations:
+            await self._db[self.ROLLUPS].bulk_write(operations, ordered=False)
+        await self._db[self.ROLLUP_STATE].replace_one(
+            {"_id": STATE_ID},
+            {"mark": state.mark, "last": [[device_id, t, p] for device_id, (t, p) in state.last.items()]},
+            upsert=True,
+        )
+
+    async def device_for_restaurant(self, restaurant_id: int) -> str | None:
+        device = await self._db[self.DEVICES].find_one({"legacyId": restaurant_id}, {"_id": 1})
+        return None if device is None else device["_id"]
+
+    async def query_buckets(self, device_id: str, width: int, start: datetime, end: datetime) -> list[Bucket]:
+        cursor = self._db[self.ROLLUPS].find(
+            {"deviceId": device_id, "resolution": width, "bucket": {"$gte": start, "$lt": end}}
+        ).sort("bucket", 1)
+        return [
+            Bucket(
+                device_id=device_id,
+                resolution=width,
+                start=document["bucket"].replace(tzinfo=timezone.utc),
+                count=document["count"],
+                minimum={name: document[name]["min"] for name in MEASUREMENTS},
+                maximum={name: document[name]["max"] for name in MEASUREMENTS},
+                total={name: document[name]["sum"] for name in MEASUREMENTS},
+                wh=document["Wh"],
+            )
+            async for document in cursor
+        ]
+
+    async def query_raw(self, device_id: str, start: datetime, end: datetime, limit: int) -> list[RawReading]:
+        cursor = self._db[self.TIME_DATA].find(
+            {"metadata.deviceId": device_id, "timestamp": {"$gte": start, "$lt": end}},
+            {"_id": 0, "timestamp": 1, "measurements": 1},
+        ).sort("timestamp", 1).limit(limit)
+        return [
+            (document["timestamp"].replace(tzinfo=timezone.utc), document["measurements"])
+            async for document in cursor
+        ]
+
+
+class SQLiteRollupStore(RollupStore):
+    """telemetry_rollups / telemetry_rollup_state tables; deviceId is the restaurant id."""
+
+    async def load_state(self) -> RollupState:
+        return await asyncio.to_thread(self._load_state)
+
+    @staticmethod
+    def _load_state() -> RollupState:
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM telemetry_rollup_state WHERE name = ?", (STATE_ID,)
+            ).fetchone()
+        if row is None:
+            return RollupState()
+        value = json.loads(row["value"])
+        return RollupState(
+            mark=datetime.fromisoformat(value["mark"]) if value.get("mark") else None,
+            last={device_id: (t, p) for device_id, t, p in value.get("last", [])},
+        )
+
+    async def earliest_reading(self) -> datetime | None:
+        return await asyncio.to_thread(self._earliest_reading)
+
+    @staticmethod
+    def _earliest_reading() -> datetime | None:
+        with get_connection() as conn:
+            row = conn.execute("SELECT min(timestamp) AS earliest FROM telemetry").fetchone()
+        return None if row["earliest"] is None else datetime.fromisoformat(row["earliest"])
+
+    async def read_columns(
+        self, start: datetime, end: datetime, device_ids: list[str] | None = None
+    ) -> ReadingColumns:
+        return await asyncio.to_thread(self._read_columns, start, end, device_ids)
+
+    @staticmethod
+    def _read_columns(start: datetime, end: datetime, device_ids: list[str] | None) -> ReadingColumns:
+        sql = """
+            SELECT restaurant_id, timestamp, voltage, current, power FROM telemetry
+            WHERE timestamp >= ? AND timestamp < ?
+        """
+        params: list[Any] = [_iso(start), _iso(end)]
+        if device_ids is not None:
+            sql += f" AND restaurant_id IN ({', '.join('?' * len(device_ids))})"
+            params.extend(int(device_id) for device_id in device_ids)
+        with get_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        # Stored as ISO text with microseconds and +00:00; numpy parses the naive part
+        stamps = np.array([row[1][:26] for row in rows], dtype="datetime64[us]").astype(np.int64) / 1e6
+        return _sorted_columns(
+            [str(row[0]) for row in rows],
+            stamps.tolist(),
+            {"V": [row[2] for row in rows], "I": [row[3] for row in rows], "P": [row[4] for row in rows]},
+        )
+
+    async def merge(self, buckets: list[Bucket], state: RollupState) -> None:
+        await asyncio.to_thread(self._merge, buckets, state)
+
+    @staticmethod
+    def _merge(buckets: list[Bucket], state: RollupState) -> None:
+        rows = [
+            (
+                int(bucket.device_id),
+                bucket.resolution,
+                _iso(bucket.start),
+                bucket.count,
+                bucket.minimum["V"], bucket.maximum["V"], bucket.total["V"],
+                bucket.minimum["I"], bucket.maximum["I"], bucket.total["I"],
+                bucket.minimum["P"], bucket.maximum["P"], bucket.total["P"],
+                bucket.wh,
+            )
+            for bucket in buckets
+        ]
+        value = json.dumps(
+            {
+                "mark": state.mark.isoformat() if state.mark else None,
+                "last": [[device_id, t, p] for device_id, (t, p) in state.last.items()],
+            }
+        )
+        # One transaction: buckets and mark move together
+        with get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO telemetry_rollups (
+                    restaurant_id, resolution, bucket, count,
+                    v_min, v_max, v_sum, i_min, i_max, i_sum, p_min, p_max, p_sum, wh
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (restaurant_id, resolution, bucket) DO UPDATE SET
+                    count = count + excluded.count,
+                    v_min = min(v_min, excluded.v_min), v_max = max(v_max, excluded.v_max),
+                    v_sum = v_sum + excluded.v_sum,
+                    i_min = min(i_min, excluded.i_min), i_max = max(i_max, excluded.i_max),
+                    i_sum = i_sum + excluded.i_sum,
+                    p_min = min(p_min, excluded.p_min), p_max = max(p_max, excluded.p_max),
+                    p_sum = p_sum + excluded.p_sum,
+                    wh = wh + excluded.wh
+                """,
+                rows,
+            )
+            conn.execute(
+                """
+                INSERT INTO telemetry_rollup_state (name, value) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET value = excluded.value
+                """,
+                (STATE_ID, value),
+            )
+
+    async def device_for_restaurant(self, restaurant_id: int) -> str | None:
+        return str(restaurant_id)
+
+    async def query_buckets(self, device_id: str, width: int, start: datetime, end: datetime) -> list[Bucket]:
+        return await asyncio.to_thread(self._query_buckets, device_id, width, start, end)
+
+    @staticmethod
+    def _query_buckets(device_id: str, width: int, start: datetime, end: datetime) -> list[Bucket]:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT * FROM telemetry_rollups
+                WHERE restaurant_id = ? AND resolution = ? AND bucket >= ? AND bucket < ?
+                ORDER BY bucket
+                """,
+                (int(device_id), width, _iso(start), _iso(end)),
+            ).fetchall()
+        return [
+            Bucket(
+                device_id=device_id,
+                resolution=width,
+                start=datetime.fromisoformat(row["bucket"]),
+                count=row["count"],
+                minimum={"V": row["v_min"], "I": row["i_min"], "P": row["p_min"]},
+                maximum={"V": row["v_max"], "I": row["i_max"], "P": row["p_max"]},
+                total={"V": row["v_sum"], "I": row["i_sum"], "P": row["p_sum"]},
+                wh=row["wh"],
+            )
+            for row in rows
+        ]
+
+    async def query_raw(self, device_id: str, start: datetime, end: datetime, limit: int) -> list[RawReading]:
+        return await asyncio.to_thread(self._query_raw, device_id, start, end, limit)
+
+    @staticmethod
+    def _query_raw(device_id: str, start: datetime, end: datetime, limit: int) -> list[RawReading]:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT timestamp, voltage, current, power FROM telemetry
+                WHERE restaurant_id = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp LIMIT ?
+                """,
+                (int(device_id), _iso(start), _iso(end), limit),
+            ).fetchall()
+        return [
+            (
+                datetime.fromisoformat(row["timestamp"]),
+                {"V": row["voltage"], "I": row["current"], "P": row["power"]},
+            )
+            for row in rows
+        ]
+
+
+class TelemetryRollupEngine:
+    def __init__(
+        self,
+        store: RollupStore,
+        interval_seconds: float = TELEMETRY_ROLLUP_INTERVAL_SECONDS,
+        lateness_seconds: float = TELEMETRY_ROLLUP_LATENESS_SECONDS,
+        max_gap_seconds: float = TELEMETRY_ROLLUP_MAX_GAP_SECONDS,
+    ) -> None:
+        self.store = store
+        self.interval_seconds = interval_seconds
+        self.lateness = timedelta(seconds=lateness_seconds)
+        self.max_gap_seconds = max_gap_seconds
+        self.mark: datetime | None = None
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.catch_up()
+            except Exception:
+                logger.exception("telemetry rollup pass failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def catch_up(self, now: datetime | None = None) -> int:
+        """Run passes until the mark reaches now - lateness; returns readings rolled up."""
+        total = 0
+        async with self._lock:
+            # Whole seconds: Mongo keeps milliseconds, and the stored mark must equal end exactly
+            end = ((now or datetime.now(timezone.utc)) - self.lateness).replace(microsecond=0)
+            while True:
+                rolled = await self._pass(end)
+                if rolled is None:
+                    break
+                total += rolled
+        return total
+
+    async def _pass(self, end: datetime) -> int | None:
+        state = await self.store.load_state()
+        if state.mark is None:
+            earliest = await self.store.earliest_reading()
+            if earliest is None:
+                return None
+            state.mark = earliest.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.mark = state.mark
+        if state.mark >= end:
+            return None
+        pass_end = min(end, state.mark + TELEMETRY_ROLLUP_MAX_PASS)
+        columns = await self.store.read_columns(state.mark, pass_end)
+        energy = energy_wh(columns, state, self.max_gap_seconds)
+        buckets = [bucket for width in RESOLUTIONS.values() for bucket in rollup_buckets(columns, energy, width)]
+        state.mark = pass_end
+        await self.store.merge(buckets, state)
+        self.mark = pass_end
+        return len(columns)
+
+
+async def query_telemetry(
+    store: RollupStore, restaurant_id: int, start: datetime, end: datetime, points: int, max_raw: int
+) -> dict[str, Any] | None:
+    """Series for one restaurant at the coarsest resolution giving at least `points` points."""
+    device_id = await store.device_for_restaurant(restaurant_id)
+    if device_id is None:
+        return None
+    resolution = choose_resolution(start, end, points)
+    if resolution == RAW_RESOLUTION:
+        series = [
+            {
+                "t": timestamp,
+                "count": 1,
+                "Wh": None,
+                **{name: dict.fromkeys(("min", "max", "mean"), values[name]) for name in MEASUREMENTS},
+            }
+            for timestamp, values in await store.read_raw(device_id, start, end, max_raw)
+        ]
+    else:
+        width = RESOLUTIONS[resolution]
+        # Include the bucket that contains `start`
+        aligned = _utc(_epoch(start) // width * width)
+        series = [bucket.point() for bucket in await store.query_buckets(device_id, width, aligned, end)]
+    return {
+        "restaurantId": restaurant_id,
+        "deviceId": device_id,
+        "resolution": resolution,
+        "from": start,
+        "to": end,
+        "points": series,
+    }
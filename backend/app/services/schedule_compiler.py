@@ -0,0 +1,270 @@
+"""
+Schedule compiler: turns a device's Schedules.rules into a minute-of-week
+bitmap (10080 bits, packed to 1260 bytes) and evaluates the whole fleet at an
+instant with one numpy gather.
+
+Rule semantics:
+  - days accepts any spelling whose first three letters name a day (MON, TUES,
+    THURSDAY, ...) plus DAILY, WEEKDAYS and WEEKENDS; unknown names are ignored
+  - disabled rules are skipped
+  - end <= start is an overnight span ending the next day (Sunday wraps to Monday)
+  - ON rules are ORed together; OFF rules (action "OFF") then clear their minutes,
+    so an OFF rule wins wherever it overlaps an ON rule
+  - times are wall-clock in SCHEDULE_TIMEZONE (default UTC)
+  - a stored rule or scheduleOn/Off pair with malformed times is skipped with a
+    warning, so one bad document cannot break evaluation for the fleet
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, time as wall_time, timedelta, timezone
+from typing import TYPE_CHECKING, Any
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from app.services.async_repository import AsyncLightRepository
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_TIMEZONE = os.getenv("SCHEDULE_TIMEZONE", "UTC")
+SCHEDULE_CACHE_TTL_SECONDS = float(os.getenv("SCHEDULE_CACHE_TTL_SECONDS", "60"))
+
+MINUTES_PER_DAY = 24 * 60
+DAYS_PER_WEEK = 7
+MINUTES_PER_WEEK = DAYS_PER_WEEK * MINUTES_PER_DAY
+PACKED_WEEK_BYTES = MINUTES_PER_WEEK // 8
+
+RULE_ACTION_ON = "ON"
+RULE_ACTION_OFF = "OFF"
+
+# Monday = 0, matching datetime.weekday()
+DAY_INDEX = {"MON": 0, "TUE": 1, "WED": 2, "THU": 3, "FRI": 4, "SAT": 5, "SUN": 6}
+DAY_GROUPS = {
+    "DAILY": tuple(range(DAYS_PER_WEEK)),
+    "WEEKDAYS": (0, 1, 2, 3, 4),
+    "WEEKENDS": (5, 6),
+}
+
+
+def parse_days(days: list[str]) -> set[int]:
+    parsed: set[int] = set()
+    for day in days:
+        name = str(day).strip().upper()
+        if name in DAY_GROUPS:
+            parsed.update(DAY_GROUPS[name])
+        elif name[:3] in DAY_INDEX:
+            parsed.add(DAY_INDEX[name[:3]])
+    return parsed
+
+
+def _minute_of_day(hour: Any, minute: Any) -> int:
+    """Raises ValueError (or TypeError) unless 0 <= hour < 24 and 0 <= minute < 60."""
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"invalid time of day {hour}:{minute}")
+    return hour * 60 + minute
+
+
+def parse_time_of_day(value: str) -> tuple[int, int]:
+    """'HH:MM' -> (hour, minute); ValueError for anything else."""
+    hour, separator, minute = str(value).partition(":")
+    if not separator or not hour.isdigit() or not minute.isdigit():
+        raise ValueError(f"invalid time of day {value!r}")
+    _minute_of_day(hour, minute)
+    return int(hour), int(minute)
+
+
+def _rule_minutes(rule: dict[str, Any]) -> tuple[int, int]:
+    """(start, end) minute of day; end is pushed past midnight for overnight spans."""
+    start = _minute_of_day(rule.get("startHour", 0), rule.get("startMinute", 0))
+    end = _minute_of_day(rule.get("endHour", 0), rule.get("endMinute", 0))
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return start, end
+
+
+def _fill(bits: np.ndarray, start: int, end: int, value: bool) -> None:
+    if end <= MINUTES_PER_WEEK:
+        bits[start:end] = value
+    else:
+        bits[start:] = value
+        bits[: end - MINUTES_PER_WEEK] = value
+
+
+def compile_rules(rules: list[dict[str, Any]]) -> np.ndarray:
+    """Stored-format rules (startHour/startMinute/...) -> bool array, one entry per minute of week."""
+    bits = np.zeros(MINUTES_PER_WEEK, dtype=bool)
+    off_spans: list[tuple[int, int]] = []
+    for rule in rules:
+        if not rule.get("enabled", True):
+            continue
+        try:
+            start, end = _rule_minutes(rule)
+        except (TypeError, ValueError) as exc:
+            logger.warning("skipping schedule rule %r: %s", rule, exc)
+            continue
+        is_off = str(rule.get("action", RULE_ACTION_ON)).upper() == RULE_ACTION_OFF
+        for day in parse_days(rule.get("days", [])):
+            span = (day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end)
+            if is_off:
+                off_spans.append(span)
+            else:
+                _fill(bits, *span, True)
+    for span in off_spans:
+        _fill(bits, *span, False)
+    return bits
+
+
+def compile_packed(rules: list[dict[str, Any]]) -> np.ndarray:
+    return np.packbits(compile_rules(rules))
+
+
+def daily_rule(schedule_on: str, schedule_off: str) -> dict[str, Any]:
+    """The legacy scheduleOn/scheduleOff pair as a stored-format rule for every day."""
+    on_hour, on_minute = parse_time_of_day(schedule_on)
+    off_hour, off_minute = parse_time_of_day(schedule_off)
+    return {
+        "days": ["DAILY"],
+        "startHour": on_hour,
+        "startMinute": on_minute,
+        "endHour": off_hour,
+        "endMinute": off_minute,
+        "action": RULE_ACTION_ON,
+        "enabled": True,
+    }
+
+
+def effective_rules(
+    rules: list[dict[str, Any]] | None, schedule_on: str | None, schedule_off: str | None
+) -> list[dict[str, Any]]:
+    """Full Schedules rules win; otherwise fall back to the simple daily on/off pair."""
+    if rules:
+        return rules
+    if schedule_on and schedule_off:
+        try:
+            return [daily_rule(schedule_on, schedule_off)]
+        except ValueError as exc:
+            logger.warning("skipping daily schedule %r-%r: %s", schedule_on, schedule_off, exc)
+    return []
+
+
+def minute_of_week(at: datetime, tz: ZoneInfo) -> int:
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    local = at.astimezone(tz)
+    return local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+
+def week_start(at: datetime, tz: ZoneInfo) -> datetime:
+    """Monday 00:00 local time of the week containing `at`."""
+    local = at.astimezone(tz)
+    monday = local.date() - timedelta(days=local.weekday())
+    return datetime.combine(monday, wall_time(0, 0), tzinfo=tz)
+
+
+def wall_clock(at: datetime, tz: ZoneInfo, minute: int) -> datetime:
+    """UTC instant of minute-of-week `minute` (may exceed one week) counted from at's week."""
+    start = week_start(at, tz)
+    days, minute_of_day = divmod(minute, MINUTES_PER_DAY)
+    hour, minute_of_hour = divmod(minute_of_day, 60)
+    local = datetime.combine(start.date() + timedelta(days=days), wall_time(hour, minute_of_hour), tzinfo=tz)
+    return local.astimezone(timezone.utc)
+
+
+@dataclass(frozen=True)
+class CompiledSchedule:
+    """One device's bitmap reduced to its transitions: the minutes where the state flips."""
+    minutes: np.ndarray  # ascending minute-of-week of each transition
+    states: np.ndarray  # bool state entered at that minute
+    constant: bool  # the state all week when there are no transitions
+
+    @classmethod
+    def from_rules(cls, rules: list[dict[str, Any]]) -> CompiledSchedule:
+        bits = compile_rules(rules)
+        minutes = np.flatnonzero(bits != np.roll(bits, 1))
+        return cls(minutes, bits[minutes], bool(bits[0]))
+
+    def state_at(self, minute: int) -> bool:
+        if not len(self.minutes):
+            return self.constant
+        # index -1 (before the first transition) wraps to last week's final state
+        return bool(self.states[np.searchsorted(self.minutes, minute, side="right") - 1])
+
+    def next_transition(self, minute: int) -> int | None:
+        """Minute of the next flip after `minute`; >= MINUTES_PER_WEEK means next week."""
+        if not len(self.minutes):
+            return None
+        index = int(np.searchsorted(self.minutes, minute, side="right"))
+        if index == len(self.minutes):
+            return int(self.minutes[0]) + MINUTES_PER_WEEK
+        return int(self.minutes[index])
+
+
+@dataclass(frozen=True)
+class FleetSchedule:
+    """Packed bitmaps for every scheduled device, row i belonging to restaurant_ids[i]."""
+    restaurant_ids: np.ndarray  # int64, shape (n,)
+    bitmaps: np.ndarray  # uint8, shape (n, PACKED_WEEK_BYTES)
+    tz: ZoneInfo
+
+    @classmethod
+    def compile(cls, schedules: dict[int, list[dict[str, Any]]], tz: ZoneInfo) -> FleetSchedule:
+        scheduled = {rid: rules for rid, rules in schedules.items() if rules}
+        bitmaps = np.zeros((len(scheduled), PACKED_WEEK_BYTES), dtype=np.uint8)
+        for row, rules in enumerate(scheduled.values()):
+            bitmaps[row] = compile_packed(rules)
+        return cls(np.fromiter(scheduled, dtype=np.int64, count=len(scheduled)), bitmaps, tz)
+
+    def evaluate(self, at: datetime) -> np.ndarray:
+        """Bool per device: should it be ON at `at`? One column gather and shift."""
+        minute = minute_of_week(at, self.tz)
+        column = self.bitmaps[:, minute >> 3]
+        return ((column >> (7 - (minute & 7))) & 1).astype(bool)
+
+
+class ScheduleEvaluator:
+    """
+    Caches the compiled fleet; it is rebuilt after SCHEDULE_CACHE_TTL_SECONDS or
+    when invalidate() is called (LightService schedule listeners do that on writes).
+    """
+
+    def __init__(
+        self,
+        repository: AsyncLightRepository,
+        tz: str = SCHEDULE_TIMEZONE,
+        ttl_seconds: float = SCHEDULE_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.repository = repository
+        self.tz = ZoneInfo(tz)
+        self.ttl_seconds = ttl_seconds
+        self._fleet: FleetSchedule | None = None
+        self._compiled_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, restaurant_id: int | None = None) -> None:
+        self._fleet = None
+
+    async def fleet(self) -> FleetSchedule:
+        async with self._lock:
+            if self._fleet is None or time.monotonic() - self._compiled_at > self.ttl_seconds:
+                schedules = await self.repository.get_schedule_rules()
+                self._fleet = await asyncio.to_thread(FleetSchedule.compile, schedules, self.tz)
+                self._compiled_at = time.monotonic()
+            return self._fleet
+
+    async def evaluate(self, at: datetime) -> dict[str, Any]:
+        fleet = await self.fleet()
+        should_be_on = fleet.evaluate(at)
+        return {
+            "at": at,
+            "timezone": self.tz.key,
+            "devices": len(fleet.restaurant_ids),
+            "on": fleet.restaurant_ids[should_be_on].tolist(),
+            "off": fleet.restaurant_ids[~should_be_on].tolist(),
+        }
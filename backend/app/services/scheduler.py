@@ -0,0 +1,216 @@
+"""
+Server-side schedule execution.
+
+LightScheduler keeps a min-heap of every scheduled device's next on/off
+transition (from schedule_compiler.CompiledSchedule) and sleeps until the
+earliest one. Everything due at a wake-up is applied as one batched
+set_lights call, which also writes the history rows; the written rows are
+handed to on_written (LightService.lights_written), so status listeners see
+scheduled changes too. Schedule writes go through LightService schedule
+listeners and only recompile the devices that changed.
+
+On start it reconciles desired vs actual state for the whole fleet in bulk, so
+transitions missed while the server was down are replayed as one batch holding
+each device's current target state. Schedules are reloaded every
+SCHEDULER_RESYNC_SECONDS to pick up edits made outside the API.
+
+Enable with SCHEDULER_ENABLED=1 on exactly one API process; two schedulers
+would both apply (and record) every transition.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable
+from zoneinfo import ZoneInfo
+
+from app.models.light import BATCH_MAX_SIZE
+from app.services.schedule_compiler import (
+    SCHEDULE_TIMEZONE,
+    CompiledSchedule,
+    minute_of_week,
+    wall_clock,
+)
+
+if TYPE_CHECKING:
+    from app.services.async_repository import AsyncLightRepository
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "").lower() in ("1", "true", "yes")
+SCHEDULER_RESYNC_SECONDS = float(os.getenv("SCHEDULER_RESYNC_SECONDS", "3600"))
+SCHEDULER_BATCH_SIZE = BATCH_MAX_SIZE
+
+LIGHT_ON = "on"
+LIGHT_OFF = "off"
+
+
+class LightScheduler:
+    def __init__(
+        self,
+        repository: AsyncLightRepository,
+        tz: str = SCHEDULE_TIMEZONE,
+        resync_seconds: float = SCHEDULER_RESYNC_SECONDS,
+        batch_size: int = SCHEDULER_BATCH_SIZE,
+        on_written: Callable[[dict[int, dict[str, Any]]], None] | None = None,
+    ) -> None:
+        self.repository = repository
+        self.on_written = on_written
+        self.tz = ZoneInfo(tz)
+        self.resync_seconds = resync_seconds
+        self.batch_size = batch_size
+        self._schedules: dict[int, CompiledSchedule] = {}
+        # (due UTC, restaurant_id, generation); stale entries are skipped on pop
+        self._heap: list[tuple[datetime, int, int]] = []
+        self._generation: dict[int, int] = {}
+        self._dirty: set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._last_resync = 0.0
+        self.transitions_applied = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        # Only startup reconciles the whole fleet; periodic resyncs must not undo
+        # manual toggles made between two transitions.
+        await self._resync(reconcile=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def reschedule(self, restaurant_id: int) -> None:
+        """Schedule listener: recompile this device on the next loop iteration."""
+        self._dirty.add(restaurant_id)
+        self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Heap maintenance
+    # ------------------------------------------------------------------
+
+    def _load(self, schedules: dict[int, list[dict]], restaurant_ids: list[int] | None) -> None:
+        """Install compiled schedules; with restaurant_ids, devices missing from schedules are dropped."""
+        if restaurant_ids is None:
+            self._schedules.clear()
+            self._heap.clear()
+            restaurant_ids = list(schedules)
+        now = datetime.now(timezone.utc)
+        for rid in restaurant_ids:
+            self._generation[rid] = self._generation.get(rid, 0) + 1
+            rules = schedules.get(rid)
+            if rules:
+                self._schedules[rid] = CompiledSchedule.from_rules(rules)
+                self._push(rid, now)
+            else:
+                self._schedules.pop(rid, None)
+
+    def _push(self, restaurant_id: int, now: datetime) -> None:
+        minute = self._schedules[restaurant_id].next_transition(minute_of_week(now, self.tz))
+        if minute is None:
+            return  # always on or always off; reconcile covers it
+        due = wall_clock(now, self.tz, minute)
+        heapq.heappush(self._heap, (due, restaurant_id, self._generation[restaurant_id]))
+
+    def _pop_due(self, now: datetime) -> list[int]:
+        due: list[int] = []
+        while self._heap and self._heap[0][0] <= now:
+            _due, rid, generation = heapq.heappop(self._heap)
+            if self._generation.get(rid) == generation and rid in self._schedules:
+                due.append(rid)
+        return due
+
+    def _desired_states(self, restaurant_ids: list[int], now: datetime) -> dict[int, str]:
+        minute = minute_of_week(now, self.tz)
+        return {
+            rid: LIGHT_ON if self._schedules[rid].state_at(minute) else LIGHT_OFF
+            for rid in restaurant_ids
+            if rid in self._schedules
+        }
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    async def _apply(self, desired: dict[int, str]) -> None:
+        """One set_lights (bulk write + bulk history) per batch_size devices."""
+        restaurant_ids = list(desired)
+        for start in range(0, len(restaurant_ids), self.batch_size):
+            chunk = restaurant_ids[start:start + self.batch_size]
+            rows, _errors = await self.repository.set_lights({rid: (desired[rid], None) for rid in chunk})
+            self.transitions_applied += len(chunk)
+            if self.on_written is not None:
+                self.on_written(rows)
+
+    async def _reconcile(self, restaurant_ids: list[int]) -> None:
+        """Bring lights whose actual state differs from their schedule in line, in bulk."""
+        desired = self._desired_states(restaurant_ids, datetime.now(timezone.utc))
+        mismatched: dict[int, str] = {}
+        ids = list(desired)
+        for start in range(0, len(ids), self.batch_size):
+            rows, _errors = await self.repository.get_lights(ids[start:start + self.batch_size])
+            mismatched.update(
+                (rid, desired[rid]) for rid, row in rows.items() if row["state"] != desired[rid]
+            )
+        if mismatched:
+            logger.info("scheduler: reconciling %d lights", len(mismatched))
+            await self._apply(mismatched)
+
+    async def _resync(self, reconcile: bool = False) -> None:
+        """Reload every schedule (catches edits made outside the API)."""
+        self._load(await self.repository.get_schedule_rules(), None)
+        self._last_resync = time.monotonic()
+        if reconcile:
+            await self._reconcile(list(self._schedules))
+
+    async def _refresh_dirty(self) -> None:
+        dirty = list(self._dirty)
+        self._dirty.clear()
+        self._load(await self.repository.get_schedule_rules(dirty), dirty)
+        await self._reconcile(dirty)
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        until_resync = self.resync_seconds - (time.monotonic() - self._last_resync)
+        if not self._heap:
+            return max(until_resync, 0.0)
+        return max(min((self._heap[0][0] - now).total_seconds(), until_resync), 0.0)
+
+    async def _run(self) -> None:
+        while True:
+            # Clear before the work: a reschedule() during it must wake the next wait.
+            self._wakeup.clear()
+            try:
+                if self._dirty:
+                    await self._refresh_dirty()
+                if time.monotonic() - self._last_resync >= self.resync_seconds:
+                    await self._resync()
+                now = datetime.now(timezone.utc)
+                due = self._pop_due(now)
+                if due:
+                    # Apply the state each device should have now, not the popped
+                    # transition's: after a stall only the latest one matters.
+                    desired = self._desired_states(due, now)
+                    for rid in due:
+                        self._push(rid, now)
+                    await self._apply(desired)
+            except Exception:
+                logger.exception("scheduler iteration failed")
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self._seconds_until_next(datetime.now(timezone.utc))
+                )
+            except asyncio.TimeoutError:
+                pass
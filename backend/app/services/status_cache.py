@@ -0,0 +1,268 @@
+"""
+Read-through cache for light status in front of the repository.
+
+LightService.get_status and get_status_batch read an in-process LRU first,
+then, when STATUS_CACHE_REDIS_URL is set, a Redis tier shared by all API
+processes, and only then the database. Concurrent misses for one restaurant
+share a single load (single-flight), so a dashboard refresh across many
+clients costs one query per restaurant.
+
+Writes are cached as they happen: the cache is a LightService status listener
+(toggle, schedule and batch writes), and the event bus feeds it changes made by
+the scheduler, fan-out jobs and other processes. Entries expire after
+STATUS_CACHE_TTL_SECONDS as a backstop for changes nothing reported. A status
+never replaces a cached one with a newer lastUpdated, so a slow load or a
+lagging change event cannot undo a write.
+
+The Redis tier needs `pip install redis` and works with any Redis-compatible
+server (Redis, Valkey, KeyDB). Its writes are coalesced per restaurant and
+pipelined by one background task. While it is unreachable, reads fall through
+to the database and it is retried after STATUS_CACHE_REDIS_RETRY_SECONDS.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+STATUS_CACHE_ENABLED = os.getenv("STATUS_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+STATUS_CACHE_MAX_ENTRIES = int(os.getenv("STATUS_CACHE_MAX_ENTRIES", "10000"))
+STATUS_CACHE_TTL_SECONDS = float(os.getenv("STATUS_CACHE_TTL_SECONDS", "30"))
+STATUS_CACHE_REDIS_URL = os.getenv("STATUS_CACHE_REDIS_URL", "")
+STATUS_CACHE_REDIS_PREFIX = os.getenv("STATUS_CACHE_REDIS_PREFIX", "lights:status:")
+STATUS_CACHE_REDIS_RETRY_SECONDS = float(os.getenv("STATUS_CACHE_REDIS_RETRY_SECONDS", "5"))
+
+# A status response: restaurantId, state, brightness, lastUpdated (ISO string)
+Status = dict[str, Any]
+
+
+def _status_time(status: Status) -> datetime:
+    """lastUpdated as an aware datetime (naive means UTC); unreadable sorts first."""
+    value = status.get("lastUpdated")
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return datetime.min.replace(tzinfo=timezone.utc)
+    if not isinstance(value, datetime):
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _is_older(status: Status, cached: Status) -> bool:
+    # Parsed, not compared as strings: writers differ in offset form and precision
+    return _status_time(status) < _status_time(cached)
+
+
+class StatusCache:
+    """
+    LRU with TTL, optional Redis tier and single-flight loads. Only used from
+    the event loop, so the in-process tier needs no lock.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = STATUS_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = STATUS_CACHE_TTL_SECONDS,
+        redis_url: str = STATUS_CACHE_REDIS_URL,
+        redis_prefix: str = STATUS_CACHE_REDIS_PREFIX,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis_url = redis_url
+        self.redis_prefix = redis_prefix
+        self._clock = clock
+        # restaurant_id -> (expires_at, status)
+        self._entries: OrderedDict[int, tuple[float, Status]] = OrderedDict()
+        # restaurant_id -> load shared by concurrent misses
+        self._loads: dict[int, asyncio.Task[Status]] = {}
+        self._redis: Any = None
+        self._redis_down_until = 0.0
+        self._dirty: dict[int, Status] = {}  # waiting to be written to Redis
+        self._wake = asyncio.Event()
+        self._flusher: asyncio.Task[None] | None = None
+        self._closing = False
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.stale = 0
+        self.evictions = 0
+        self.redis_errors = 0
+
+    async def start(self) -> None:
+        if not self.redis_url or self._flusher is not None:
+            return
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("STATUS_CACHE_REDIS_URL is set but redis is not installed") from exc
+        self._redis = redis.from_url(self.redis_url)
+        self._closing = False
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Flush pending Redis writes and disconnect."""
+        if self._flusher is not None:
+            self._closing = True
+            self._wake.set()
+            await self._flusher
+            self._flusher = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    # -- reads --------------------------------------------------------------
+
+    async def get(self, restaurant_id: int, load: Callable[[], Awaitable[Status]]) -> Status:
+        """Cached status, or `load()`'s result; concurrent misses await one load."""
+        status = self._get_local(restaurant_id)
+        if status is not None:
+            self.hits += 1
+            return status
+        task = self._loads.get(restaurant_id)
+        if task is None:
+            # A task, so a cancelled caller does not cancel the load other callers wait on
+            task = asyncio.ensure_future(self._load(restaurant_id, load))
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._loads[restaurant_id] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def get_many(self, restaurant_ids: list[int]) -> dict[int, Status]:
+        """Cached statuses by restaurant id; the caller loads the rest and fill()s them."""
+        found: dict[int, Status] = {}
+        remote: list[int] = []
+        for rid in restaurant_ids:
+            status = self._get_local(rid)
+            if status is not None:
+                found[rid] = status
+            else:
+                remote.append(rid)
+        self.hits += len(found)
+        if remote and self._redis_available():
+            try:
+                values = await self._redis.mget([self._key(rid) for rid in remote])
+            except Exception:
+                self._redis_failed()
+                values = [None] * len(remote)
+            for rid, value in zip(remote, values):
+                if value is not None:
+                    found[rid] = self._store(rid, json.loads(value))
+                    self.redis_hits += 1
+        self.misses += len(restaurant_ids) - len(found)
+        return found
+
+    async def _load(self, restaurant_id: int, load: Callable[[], Awaitable[Status]]) -> Status:
+        try:
+            status = await self._get_remote(restaurant_id)
+            if status is not None:
+                self.redis_hits += 1
+                return status
+            self.misses += 1
+            return self.fill(await load())
+        finally:
+            self._loads.pop(restaurant_id, None)
+
+    async def _get_remote(self, restaurant_id: int) -> Status | None:
+        if not self._redis_available():
+            return None
+        try:
+            value = await self._redis.get(self._key(restaurant_id))
+        except Exception:
+            self._redis_failed()
+            return None
+        return None if value is None else self._store(restaurant_id, json.loads(value))
+
+    def _get_local(self, restaurant_id: int) -> Status | None:
+        entry = self._entries.get(restaurant_id)
+        if entry is None or entry[0] <= self._clock():
+            return None  # an expired entry stays until replaced, to reject older statuses
+        self._entries.move_to_end(restaurant_id)
+        return entry[1]
+
+    # -- writes -------------------------------------------------------------
+
+    def put(self, status: Status) -> None:
+        """Write-through for a status the service (or the event bus) just saw change."""
+        self.writes += 1
+        self.fill(status)
+
+    def fill(self, status: Status) -> Status:
+        """Cache a status read from the database (both tiers); returns the status now cached."""
+        restaurant_id = status["restaurantId"]
+        cached = self._store(restaurant_id, status)
+        if cached is status and self._redis is not None:
+            self._dirty[restaurant_id] = status
+            self._wake.set()
+        return cached
+
+    def invalidate(self, restaurant_id: int) -> None:
+        self._entries.pop(restaurant_id, None)
+
+    def _store(self, restaurant_id: int, status: Status) -> Status:
+        entry = self._entries.get(restaurant_id)
+        if entry is not None and _is_older(status, entry[1]):
+            self.stale += 1
+            return entry[1]
+        self._entries[restaurant_id] = (self._clock() + self.ttl_seconds, status)
+        self._entries.move_to_end(restaurant_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return status
+
+    # -- Redis tier ---------------------------------------------------------
+
+    def _key(self, restaurant_id: int) -> str:
+        return f"{self.redis_prefix}{restaurant_id}"
+
+    def _redis_available(self) -> bool:
+        return self._redis is not None and self._redis_down_until <= self._clock()
+
+    def _redis_failed(self) -> None:
+        if self._redis_down_until <= self._clock():
+            logger.warning("status cache: Redis unavailable, retrying in %ss", STATUS_CACHE_REDIS_RETRY_SECONDS)
+        self.redis_errors += 1
+        self._redis_down_until = self._clock() + STATUS_CACHE_REDIS_RETRY_SECONDS
+
+    async def _flush_loop(self) -> None:
+        while not self._closing or self._dirty:
+            await self._wake.wait()
+            self._wake.clear()
+            batch, self._dirty = self._dirty, {}
+            if not batch or not self._redis_available():
+                continue  # dropped: Redis entries expire on their own
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for rid, status in batch.items():
+                        pipe.set(self._key(rid), json.dumps(status), px=int(self.ttl_seconds * 1000))
+                    await pipe.execute()
+            except Exception:
+                self._redis_failed()
+
+    def stats(self) -> dict[str, int | float | bool]:
+        lookups = self.hits + self.redis_hits + self.misses + self.coalesced
+        return {
+            "redis": self._redis is not None,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "redisHits": self.redis_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "writes": self.writes,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "redisErrors": self.redis_errors,
+            "hitRatio": 1 - self.misses / lookups if lookups else 0.0,
+        }
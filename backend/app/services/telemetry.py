@@ -0,0 +1,452 @@
+"""
+Time_Data ingestion: ESP32 V/I/P/uptime readings in, batched inserts out.
+
+Readings arrive through POST /telemetry/batch or, when TELEMETRY_MQTT_HOST is
+set, an MQTT subscription on TELEMETRY_MQTT_TOPIC (one JSON reading or a list
+per message; the device id is the topic level matched by "+").
+
+decode_readings() checks a whole batch with plain type checks, without a
+Pydantic model per reading. Accepted readings go into a bounded BatchWriter
+buffer, which insert_many's them into Time_Data (the telemetry table on
+SQLite) in TELEMETRY_BATCH_SIZE groups; a reading's Time_Data _id is derived
+from the reading, so a retried batch does not store it twice. Devices.status.lastReading/lastSeen is
+refreshed at most once per TELEMETRY_STATUS_INTERVAL_SECONDS per device.
+
+Wire format of one reading:
+  {"deviceId": "ESP32_MCD_DARIEN_001", "timestamp": "2026-01-01T12:00:00Z" | epoch seconds,
+   "V": 120.1, "I": 0.42, "P": 50.4, "uptime": 3600}
+timestamp defaults to the receive time. On SQLite, deviceId is the restaurant id.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.database.db import get_connection
+from app.database.mongo import get_async_mongo_db
+from app.models.collections import CollectionNames
+from app.services.batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "5000"))
+TELEMETRY_FLUSH_INTERVAL_SECONDS = float(os.getenv("TELEMETRY_FLUSH_INTERVAL_SECONDS", "0.25"))
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "200000"))
+TELEMETRY_STATUS_INTERVAL_SECONDS = float(os.getenv("TELEMETRY_STATUS_INTERVAL_SECONDS", "30"))
+# How long POST /telemetry/batch waits for buffer space before answering 503
+TELEMETRY_SUBMIT_TIMEOUT_SECONDS = float(os.getenv("TELEMETRY_SUBMIT_TIMEOUT_SECONDS", "2"))
+TELEMETRY_MAX_CLOCK_SKEW = timedelta(minutes=5)
+TELEMETRY_MAX_REJECTIONS_REPORTED = 100
+
+TELEMETRY_MQTT_HOST = os.getenv("TELEMETRY_MQTT_HOST", "")
+TELEMETRY_MQTT_PORT = int(os.getenv("TELEMETRY_MQTT_PORT", "1883"))
+TELEMETRY_MQTT_TOPIC = os.getenv("TELEMETRY_MQTT_TOPIC", "devices/+/telemetry")
+TELEMETRY_MQTT_QOS = int(os.getenv("TELEMETRY_MQTT_QOS", "0"))
+TELEMETRY_MQTT_CLIENT_ID = os.getenv("TELEMETRY_MQTT_CLIENT_ID", "lighting-telemetry")
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Devices fields copied into Time_Data.metadata next to deviceId
+DEVICE_METADATA_FIELDS = ("restaurant", "restaurantId", "location")
+
+
+class Reading(NamedTuple):
+    device_id: str
+    timestamp: datetime
+    voltage: float
+    current: float
+    power: float
+    uptime: int
+
+
+def _number(value: Any) -> float | None:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return None
+    return float(value)
+
+
+def _timestamp(value: Any, received_at: datetime) -> datetime | None:
+    if value is None:
+        return received_at
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            return parsed.replace(tzinfo=timezone.utc)
+        try:
+            return parsed.astimezone(timezone.utc)
+        except OverflowError:  # e.g. 0001-01-01T00:00:00+05:00
+            return None
+    seconds = _number(value)
+    if seconds is None or seconds < 0:
+        return None
+    try:
+        return datetime.fromtimestamp(seconds, timezone.utc)
+    except (OverflowError, ValueError, OSError):  # beyond what datetime or the platform can represent
+        return None
+
+
+def decode_readings(
+    items: Any, device_id: str | None = None, received_at: datetime | None = None
+) -> tuple[list[Reading], list[dict[str, Any]]]:
+    """
+    Validate a decoded JSON batch. Returns the good readings and one
+    {"index", "error"} per rejected item. device_id (from the MQTT topic)
+    overrides any deviceId in the items.
+    """
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return [], [{"index": None, "error": "expected a reading or a list of readings"}]
+    received_at = received_at or datetime.now(timezone.utc)
+    latest_allowed = received_at + TELEMETRY_MAX_CLOCK_SKEW
+    readings: list[Reading] = []
+    rejected: list[dict[str, Any]] = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            rejected.append({"index": index, "error": "reading must be an object"})
+            continue
+        device = device_id or item.get("deviceId")
+        if isinstance(device, int) and not isinstance(device, bool):
+            device = str(device)
+        if not isinstance(device, str) or not device:
+            rejected.append({"index": index, "error": "deviceId is required"})
+            continue
+        voltage, current, power = _number(item.get("V")), _number(item.get("I")), _number(item.get("P"))
+        if voltage is None or current is None or power is None:
+            rejected.append({"index": index, "error": "V, I and P must be finite numbers"})
+            continue
+        uptime = item.get("uptime")
+        if isinstance(uptime, bool) or not isinstance(uptime, int) or uptime < 0:
+            rejected.append({"index": index, "error": "uptime must be a non-negative integer"})
+            continue
+        timestamp = _timestamp(item.get("timestamp"), received_at)
+        if timestamp is None:
+            rejected.append({"index": index, "error": "timestamp must be ISO 8601 or epoch seconds"})
+            continue
+        if timestamp > latest_allowed:
+            rejected.append({"index": index, "error": "timestamp is ahead of the server clock"})
+            continue
+        readings.append(Reading(device, timestamp, voltage, current, power, uptime))
+    return readings, rejected
+
+
+def reading_id(reading: Reading) -> ObjectId:
+    """Same reading, same _id: the reading's time in seconds, then a hash of the reading."""
+    key = f"{reading.device_id}|{reading.timestamp.isoformat()}|{reading.uptime}".encode()
+    seconds = max(int(reading.timestamp.timestamp()), 0)
+    return ObjectId(seconds.to_bytes(4, "big") + hashlib.blake2b(key, digest_size=8).digest())
+
+
+def latest_by_device(readings: list[Reading]) -> dict[str, Reading]:
+    latest: dict[str, Reading] = {}
+    for reading in readings:
+        current = latest.get(reading.device_id)
+        if current is None or reading.timestamp >= current.timestamp:
+            latest[reading.device_id] = reading
+    return latest
+
+
+class TelemetryStore(ABC):
+    @abstractmethod
+    async def insert_readings(self, readings: list[Reading]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_device_status(self, latest: dict[str, Reading]) -> None:
+        """Record each device's newest reading as its lastReading/lastSeen."""
+        raise NotImplementedError
+
+
+class MongoTelemetryStore(TelemetryStore):
+    """Time_Data time-series inserts and Devices.status updates over the asyncio client."""
+    DEVICES = CollectionNames.DEVICES
+    TIME_DATA = CollectionNames.TIME_DATA
+
+    def __init__(self) -> None:
+        self._db = get_async_mongo_db()
+        # deviceId -> Time_Data metadata; devices are looked up once, on first reading
+        self._metadata: dict[str, dict[str, Any]] = {}
+        # _ids of the last batch whose insert failed; part of it may be stored
+        self._unconfirmed: set[ObjectId] = set()
+
+    async def _load_metadata(self, device_ids: set[str]) -> None:
+        missing = [device_id for device_id in device_ids if device_id not in self._metadata]
+        if not missing:
+            return
+        for device_id in missing:
+            self._metadata[device_id] = {"deviceId": device_id}
+        cursor = self._db[self.DEVICES].find(
+            {"_id": {"$in": missing}}, {field: 1 for field in DEVICE_METADATA_FIELDS}
+        )
+        async for device in cursor:
+            metadata = self._metadata[device["_id"]]
+            for key in DEVICE_METADATA_FIELDS:
+                if device.get(key) is not None:
+                    metadata[key] = device[key]
+
+    async def insert_readings(self, readings: list[Reading]) -> None:
+        await self._load_metadata({reading.device_id for reading in readings})
+        documents = [
+            {
+                "_id": reading_id(reading),
+                "timestamp": reading.timestamp,
+                "metadata": self._metadata[reading.device_id],
+                "measurements": {
+                    "V": reading.voltage,
+                    "I": reading.current,
+                    "P": reading.power,
+                    "uptime": reading.uptime,
+                },
+            }
+            for reading in readings
+        ]
+        if self._unconfirmed:
+            documents = await self._without_stored(documents)
+        try:
+            if documents:
+                await self._db[self.TIME_DATA].insert_many(documents, ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                self._unconfirmed = {document["_id"] for document in documents}
+                raise
+        except Exception:
+            self._unconfirmed = {document["_id"] for document in documents}
+            raise
+        self._unconfirmed = set()
+
+    async def _without_stored(self, documents: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Drop readings a failed attempt already stored. Time-series collections
+        have no unique _id index, so resending them would not fail, it would
+        duplicate them.
+        """
+        retried = [document for document in documents if document["_id"] in self._unconfirmed]
+        if not retried:
+            return documents
+        timestamps = [document["timestamp"] for document in retried]
+        cursor = self._db[self.TIME_DATA].find(
+            {
+                "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)},
+                "_id": {"$in": [document["_id"] for document in retried]},
+            },
+            {"_id": 1},
+        )
+        stored = {document["_id"] async for document in cursor}
+        return [document for document in documents if document["_id"] not in stored]
+
+    async def update_device_status(self, latest: dict[str, Reading]) -> None:
+        operations = [
+            UpdateOne(
+                # Never move lastSeen backwards when batches arrive out of order
+                {"_id": device_id, "status.lastSeen": {"$not": {"$gte": reading.timestamp}}},
+                {
+                    "$set": {
+                        "status.lastSeen": reading.timestamp,
+                        "status.isOnline": True,
+                        "status.lastUptime": reading.uptime,
+                        "status.lastReading": {"V": reading.voltage, "I": reading.current, "P": reading.power},
+                    }
+                },
+            )
+            for device_id, reading in latest.items()
+        ]
+        if operations:
+            await self._db[self.DEVICES].bulk_write(operations, ordered=False)
+
+
+class SQLiteTelemetryStore(TelemetryStore):
+    """telemetry table of the SQLite placeholder; deviceId must be a restaurant id."""
+
+    async def insert_readings(self, readings: list[Reading]) -> None:
+        rows = [
+            (
+                int(reading.device_id),
+                reading.timestamp.isoformat(timespec="microseconds"),
+                reading.voltage,
+                reading.current,
+                reading.power,
+                reading.uptime,
+            )
+            for reading in readings
+            if reading.device_id.isdigit()
+        ]
+        if len(rows) < len(readings):
+            logger.warning("dropped %d readings without a numeric deviceId", len(readings) - len(rows))
+        if rows:
+            await asyncio.to_thread(self._insert_rows, rows)
+
+    @staticmethod
+    def _insert_rows(rows: list[tuple[Any, ...]]) -> None:
+        with get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO telemetry (restaurant_id, timestamp, voltage, current, power, uptime)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+
+    async def update_device_status(self, latest: dict[str, Reading]) -> None:
+        """restaurant_lights has no device status columns; the telemetry table is the record."""
+
+
+class TelemetryIngestor:
+    """Bounded buffer in front of a TelemetryStore, flushed in batches by size or time."""
+
+    def __init__(
+        self,
+        store: TelemetryStore,
+        batch_size: int = TELEMETRY_BATCH_SIZE,
+        flush_interval_seconds: float = TELEMETRY_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = TELEMETRY_QUEUE_SIZE,
+        status_interval_seconds: float = TELEMETRY_STATUS_INTERVAL_SECONDS,
+    ) -> None:
+        self.store = store
+        self.status_interval_seconds = status_interval_seconds
+        self._status_written: dict[str, float] = {}  # deviceId -> monotonic time of last status write
+        self._writer = BatchWriter(
+            self._write_batch,
+            batch_size=batch_size,
+            flush_interval_seconds=flush_interval_seconds,
+            max_pending=max_pending,
+            name="telemetry",
+        )
+        self.accepted = 0
+        self.rejected = 0
+
+    async def start(self) -> None:
+        await self._writer.start()
+
+    async def close(self) -> None:
+        await self._writer.close()
+
+    async def submit(self, readings: list[Reading], timeout: float | None = TELEMETRY_SUBMIT_TIMEOUT_SECONDS) -> None:
+        """
+        Buffer readings, waiting up to timeout for room for all of them.
+        asyncio.TimeoutError means the buffer stayed full and nothing was
+        buffered; once there is room the readings are always taken.
+        """
+        await asyncio.wait_for(self._writer.wait_for_space(len(readings)), timeout)
+        await self._writer.submit(readings)
+        self.accepted += len(readings)
+
+    def offer(self, readings: list[Reading]) -> int:
+        """Non-blocking variant for the MQTT thread; readings that do not fit are dropped."""
+        taken = self._writer.offer(readings)
+        self.accepted += taken
+        return taken
+
+    async def _write_batch(self, readings: list[Reading]) -> None:
+        await self.store.insert_readings(readings)
+        now = time.monotonic()
+        due = {
+            device_id: reading
+            for device_id, reading in latest_by_device(readings).items()
+            if now - self._status_written.get(device_id, -math.inf) >= self.status_interval_seconds
+        }
+        if not due:
+            return
+        try:
+            await self.store.update_device_status(due)
+        except Exception as exc:  # readings are stored; retrying the batch would duplicate them
+            logger.warning("device status update failed: %s", exc)
+            return
+        for device_id in due:
+            self._status_written[device_id] = now
+
+    def stats(self) -> dict[str, Any]:
+        writer = self._writer.stats()
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "pending": writer["pending"],
+            "written": writer["written"],
+            "batches": writer["batches"],
+            "dropped": writer["dropped"],
+        }
+
+
+class TelemetryMqttSubscriber:
+    """
+    paho-mqtt subscriber feeding a TelemetryIngestor. Payloads are decoded
+    and validated on paho's network thread, then handed to the event loop.
+    """
+
+    def __init__(
+        self,
+        ingestor: TelemetryIngestor,
+        host: str = TELEMETRY_MQTT_HOST,
+        port: int = TELEMETRY_MQTT_PORT,
+        topic: str = TELEMETRY_MQTT_TOPIC,
+        qos: int = TELEMETRY_MQTT_QOS,
+        client_id: str = TELEMETRY_MQTT_CLIENT_ID,
+    ) -> None:
+        self.ingestor = ingestor
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.qos = qos
+        self.client_id = client_id
+        # Topic level that carries the device id, e.g. 1 for "devices/+/telemetry"
+        levels = topic.split("/")
+        self._device_level = levels.index("+") if "+" in levels else None
+        self._client: Any = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def start(self) -> None:
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError as exc:
+            raise RuntimeError("TELEMETRY_MQTT_HOST is set but paho-mqtt is not installed") from exc
+        self._loop = asyncio.get_running_loop()
+        if hasattr(mqtt, "CallbackAPIVersion"):  # paho-mqtt 2.x
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
+        else:
+            client = mqtt.Client(client_id=self.client_id)
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        client.connect_async(self.host, self.port)
+        client.loop_start()
+        self._client = client
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            self._client.disconnect()
+            self._client.loop_stop()
+            self._client = None
+
+    def _on_connect(self, client: Any, userdata: Any, flags: Any, reason_code: Any, properties: Any = None) -> None:
+        # (Re)subscribe on every connect so a broker restart does not lose the subscription
+        client.subscribe(self.topic, qos=self.qos)
+
+    def _on_message(self, client: Any, userdata: Any, message: Any) -> None:
+        device_id = None
+        if self._device_level is not None:
+            levels = message.topic.split("/")
+            if len(levels) > self._device_level:
+                device_id = levels[self._device_level]
+        try:
+            payload = json.loads(message.payload)
+        except ValueError:
+            self.ingestor.rejected += 1
+            return
+        readings, rejected = decode_readings(payload, device_id)
+        self.ingestor.rejected += len(rejected)
+        if readings and self._loop is not None:
+            self._loop.call_soon_threadsafe(self.ingestor.offer, readings)
@@ -0,0 +1,143 @@
+"""
+Deterministic fleets for the benchmarks: N restaurants (legacyId 1..N) and H
+light_history rows spread across them, one second apart from FLEET_EPOCH.
+The same arguments always produce the same data on both backends.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator
+
+FLEET_MAX_DEVICES = 100_000
+FLEET_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# address.state values cycle through the fleet; the fan-out scenario selects one
+FLEET_STATES = ("CT", "NY", "NJ", "MA", "PA", "TX", "CA", "FL", "IL", "OH")
+FLEET_DAYS = ("MON", "TUES", "WED", "THURS", "FRI", "SAT", "SUN")
+# Every SCHEDULED_EVERY-th device has a Schedules document (Mongo only)
+SCHEDULED_EVERY = 4
+INSERT_CHUNK = 10_000
+
+
+@dataclass(frozen=True)
+class Fleet:
+    devices: int
+    history: int
+
+    def __post_init__(self) -> None:
+        if not 1 <= self.devices <= FLEET_MAX_DEVICES:
+            raise ValueError(f"devices must be between 1 and {FLEET_MAX_DEVICES}")
+        if self.history < 0:
+            raise ValueError("history must be >= 0")
+
+    @property
+    def key(self) -> str:
+        return f"{self.devices}d-{self.history}h"
+
+    def history_rows(self) -> Iterator[tuple[int, str, str]]:
+        """(restaurant_id, action, ISO timestamp), oldest first."""
+        for i in range(self.history):
+            restaurant_id = i % self.devices + 1  # round-robin: every restaurant gets history
+            action = "toggle_on" if i % 2 else "toggle_off"
+            yield restaurant_id, action, (FLEET_EPOCH + timedelta(seconds=i)).isoformat()
+
+    @property
+    def last_updated(self) -> datetime:
+        return FLEET_EPOCH + timedelta(seconds=self.history)
+
+
+def device_id(restaurant_id: int) -> str:
+    return f"ESP32_BENCH_{restaurant_id:06d}"
+
+
+def seed_sqlite(fleet: Fleet) -> None:
+    """Replace restaurant_lights and light_history in LIGHTS_DB_PATH with the fleet."""
+    from app.database.db import get_connection, init_db
+
+    init_db()
+    last_updated = fleet.last_updated.isoformat()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM restaurant_lights")
+        conn.execute("DELETE FROM light_history")
+        conn.executemany(
+            "INSERT INTO restaurant_lights (restaurant_id, state, brightness, last_updated) VALUES (?, 'off', 0, ?)",
+            ((rid, last_updated) for rid in range(1, fleet.devices + 1)),
+        )
+        conn.executemany(
+            "INSERT INTO light_history (restaurant_id, action, timestamp) VALUES (?, ?, ?)",
+            fleet.history_rows(),
+        )
+
+
+def _device_document(restaurant_id: int, updated_at: datetime) -> dict[str, Any]:
+    return {
+        "_id": device_id(restaurant_id),
+        "restaurantId": f"bench_{restaurant_id}",
+        "restaurant": f"Bench {restaurant_id}",
+        "legacyId": restaurant_id,
+        "lightState": "off",
+        "brightness": 0,
+        "lastUpdated": updated_at.isoformat(),
+        "updatedAt": updated_at,
+        "address": {"state": FLEET_STATES[restaurant_id % len(FLEET_STATES)], "city": "Benchville"},
+        "ownerEmail": f"owner{restaurant_id % 100}@bench.local",
+        "device": {"firmware": "1.0.0"},
+    }
+
+
+def _schedule_document(restaurant_id: int, updated_at: datetime) -> dict[str, Any]:
+    return {
+        "deviceId": device_id(restaurant_id),
+        "restaurantId": f"bench_{restaurant_id}",
+        "restaurant": f"Bench {restaurant_id}",
+        "rules": [
+            {"days": [day], "startHour": 6, "startMinute": 0, "endHour": 23, "endMinute": 0,
+             "action": "ON", "enabled": True}
+            for day in FLEET_DAYS
+        ],
+        "createdAt": updated_at,
+        "updatedAt": updated_at,
+    }
+
+
+def _chunks(documents: Iterator[dict[str, Any]]) -> Iterator[list[dict[str, Any]]]:
+    chunk: list[dict[str, Any]] = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) == INSERT_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed_mongo(fleet: Fleet) -> None:
+    """Drop and refill Devices, Schedules and light_history in MONGODB_DB_NAME."""
+    from app.database.mongo import MONGODB_DB_NAME, get_mongo_db
+    from app.models.collections import CollectionNames
+
+    if not MONGODB_DB_NAME.endswith("bench"):
+        raise RuntimeError(f"refusing to overwrite {MONGODB_DB_NAME!r}; benchmark databases end in 'bench'")
+    db = get_mongo_db()
+    updated_at = fleet.last_updated
+    rids = range(1, fleet.devices + 1)
+    collections = {
+        CollectionNames.DEVICES: (_device_document(rid, updated_at) for rid in rids),
+        CollectionNames.SCHEDULES: (
+            _schedule_document(rid, updated_at) for rid in rids if rid % SCHEDULED_EVERY == 0
+        ),
+        CollectionNames.LIGHT_HISTORY: (
+            {
+                "restaurantId": f"bench_{rid}",
+                "deviceId": device_id(rid),
+                "action": action,
+                "timestamp": timestamp,
+                "legacyId": rid,
+            }
+            for rid, action, timestamp in fleet.history_rows()
+        ),
+    }
+    for name, documents in collections.items():
+        db.drop_collection(name)
+        for chunk in _chunks(documents):
+            db[name].insert_many(chunk, ordered=False)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+CPU time per request for the light GET endpoints, model-validated vs FAST_RESPONSES=1.
+Usage (from backend/): python -m benchmarks.responses [requests_per_endpoint]
+Runs each mode in a child process against a throwaway SQLite database seeded
+with HISTORY_ROWS history rows. "request" is a whole in-process ASGI request;
+"encode" is only the step the mode replaces (response_model validation and
+serialization vs orjson) on the same service records. Both modes
+must send identical bodies.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HISTORY_ROWS = 1000
+RESTAURANT_ID = 1
+ENDPOINTS = ["status", "history x100", "schedule/full"]
+
+
+async def child(requests: int) -> None:
+    from datetime import datetime, timedelta, timezone
+
+    import httpx
+    from pydantic import TypeAdapter
+
+    from app.database.db import get_connection
+    from app.main import app, lifespan
+    from app.models.light import FullScheduleResponse, LightHistoryItem, LightStatusResponse
+    from app.routes import responses
+    from app.routes.lights import service
+
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        with get_connection() as conn:
+            # Fixed timestamps so both modes' bodies can be compared
+            conn.execute(
+                "INSERT OR REPLACE INTO restaurant_lights (restaurant_id, state, brightness, last_updated)"
+                " VALUES (?, 'on', 100, ?)",
+                (RESTAURANT_ID, start.isoformat()),
+            )
+            conn.executemany(
+                "INSERT INTO light_history (restaurant_id, action, timestamp) VALUES (?, ?, ?)",
+                [
+                    (RESTAURANT_ID, "toggle_on" if i % 2 else "toggle_off", (start + timedelta(seconds=i)).isoformat())
+                    for i in range(HISTORY_ROWS)
+                ],
+            )
+
+        history, _ = await service.get_history(RESTAURANT_ID, limit=100)
+        cases = {
+            "status": ("/lights/status", {"restaurantId": RESTAURANT_ID}, LightStatusResponse,
+                       await service.get_status(RESTAURANT_ID)),
+            "history x100": ("/lights/history", {"restaurantId": RESTAURANT_ID, "limit": 100},
+                             list[LightHistoryItem], history),
+            "schedule/full": ("/lights/schedule/full", {"restaurantId": RESTAURANT_ID}, FullScheduleResponse,
+                              await service.get_full_schedule(RESTAURANT_ID)),
+        }
+        results = {}
+        for name in ENDPOINTS:
+            path, params, model, data = cases[name]
+            for _ in range(min(requests, 50)):  # warm up
+                await client.get(path, params=params)
+            began = time.process_time()
+            for _ in range(requests):
+                response = await client.get(path, params=params)
+            request_us = (time.process_time() - began) / requests * 1_000_000
+
+            if responses.FAST_RESPONSES:
+                encode = lambda: responses.FastJSONResponse(data).body
+            else:
+                adapter = TypeAdapter(model)
+                encode = lambda: adapter.dump_json(adapter.validate_python(data))
+            began = time.process_time()
+            for _ in range(requests * 10):
+                encode()
+            encode_us = (time.process_time() - began) / (requests * 10) * 1_000_000
+            results[name] = {"request_us": request_us, "encode_us": encode_us, "body": response.text}
+    print(json.dumps(results))
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    runs = {}
+    for fast in ("0", "1"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, FAST_RESPONSES=fast, LIGHTS_DB_PATH=str(Path(tmp) / "lights.db"))
+            env.pop("MONGODB_URI", None)
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.responses", "--child", str(requests)],
+                env=env, cwd=Path(__file__).resolve().parent.parent, capture_output=True, text=True, check=True,
+            ).stdout
+        runs[fast] = json.loads(output.splitlines()[-1])
+
+    print(f"{'us/request':<16}{'model':>9}{'fast':>9}{'saved':>8}{'encode model':>15}{'fast':>9}{'saved':>8}  same body")
+    for name in ENDPOINTS:
+        model, fast = runs["0"][name], runs["1"][name]
+        print(
+            f"{name:<16}{model['request_us']:>9.0f}{fast['request_us']:>9.0f}"
+            f"{1 - fast['request_us'] / model['request_us']:>8.0%}"
+            f"{model['encode_us']:>15.1f}{fast['encode_us']:>9.1f}"
+            f"{1 - fast['encode_us'] / model['encode_us']:>8.0%}  {model['body'] == fast['body']}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        asyncio.run(child(int(sys.argv[2])))
+    else:
+        main()
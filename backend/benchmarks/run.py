@@ -0,0 +1,313 @@
+"""
+Drive every /lights/* route through the ASGI app in process and compare the
+results with stored baselines.
+
+Usage (from backend/, after `pip install -r requirements-dev.txt`):
+  python -m benchmarks.run                                  # SQLite, 1k devices, 100k history rows
+  python -m benchmarks.run --devices 100000 --history 5000000
+  python -m benchmarks.run --backend mongo --mongo-uri mongodb://localhost:27017
+  python -m benchmarks.run --update-baseline                # record the current numbers
+
+SQLite runs against a fresh database file in a temporary directory. Mongo runs
+need a local, disposable mongod: the BENCH database (default SD_IoT_bench) is
+dropped and reseeded. A throwaway server is enough, e.g.
+  docker run --rm -p 27017:27017 mongo
+The change feed, scheduler, rollups, archiver and MQTT are switched off so
+only request work is measured; FAST_RESPONSES, STATUS_CACHE_* and other
+settings pass through from the environment.
+
+Per scenario the report shows p50/p95/p99 latency, requests per second at
+--concurrency (each the median of --repeat timed runs), and database round
+trips per request: MongoDB commands seen by
+a pymongo CommandListener, or SQL statements executed on SQLite (including
+BEGIN/COMMIT and background history group commits landing during the run).
+
+Baselines live in benchmarks/baselines/<backend>.json, keyed by fleet size
+and concurrency. The run exits with status 1 when a request fails, when p95
+or RPS is worse than the baseline by more than --tolerance, or when round
+trips per request grow. Latency baselines are machine-specific: record them
+on the machine that enforces them.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from benchmarks.fleet import Fleet
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+# Timing on shared machines is noisy; round trips catch N+1s exactly, latency catches big slowdowns
+DEFAULT_TOLERANCE = 0.5
+LATENCY_SLACK_MS = 1.0  # sub-millisecond routes jitter by more than any tolerance
+# Round trips are deterministic up to background batching, so they get a tighter bound
+ROUND_TRIP_TOLERANCE = 0.1
+ROUND_TRIP_SLACK = 0.05
+WARMUP_REQUESTS = 20
+QUIESCE_TIMEOUT_SECONDS = 10.0
+
+
+class RoundTripCounter:
+    """Counts database round trips from any thread."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def increment(self, *_args: Any) -> None:
+        with self._lock:
+            self.count += 1
+
+    def reset(self) -> int:
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+
+def _configure_environment(args: argparse.Namespace, workdir: Path) -> None:
+    """Must run before anything under app/ is imported: settings are read at import."""
+    os.environ.update(
+        {
+            "EVENT_BUS_MODE": "off",
+            "SCHEDULER_ENABLED": "0",
+            "TELEMETRY_ROLLUPS_ENABLED": "0",
+            "ARCHIVE_ENABLED": "0",
+            "ARCHIVE_DIR": str(workdir / "archive"),
+            "COMMAND_MQTT_HOST": "",
+            "TELEMETRY_MQTT_HOST": "",
+            "LIGHTS_DB_PATH": str(workdir / "lights.db"),
+            # Set even when empty so a MONGODB_URI in .env cannot switch the backend
+            "MONGODB_URI": args.mongo_uri if args.backend == "mongo" else "",
+            "MONGODB_DB_NAME": args.mongo_db,
+        }
+    )
+
+
+def _install_counter(backend: str, counter: RoundTripCounter) -> None:
+    if backend == "mongo":
+        from pymongo import monitoring
+
+        class CommandCounter(monitoring.CommandListener):
+            def started(self, event: monitoring.CommandStartedEvent) -> None:
+                counter.increment()
+
+            def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+                pass
+
+            def failed(self, event: monitoring.CommandFailedEvent) -> None:
+                pass
+
+        # Listeners must be registered before the clients are created
+        monitoring.register(CommandCounter())
+    else:
+        from app.database.db import add_connection_hook
+
+        add_connection_hook(lambda conn: conn.set_trace_callback(counter.increment))
+
+
+def _percentile(sorted_ms: list[float], fraction: float) -> float:
+    if len(sorted_ms) == 1:
+        return sorted_ms[0]
+    return statistics.quantiles(sorted_ms, n=100, method="inclusive")[round(fraction * 100) - 1]
+
+
+async def _quiesce() -> None:
+    """Let history from earlier write scenarios land so it is not billed to the next one."""
+    from app.routes.lights import history_writer
+
+    deadline = time.perf_counter() + QUIESCE_TIMEOUT_SECONDS
+    while history_writer.pending and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    gc.collect()
+
+
+async def _run_scenario(client: Any, scenario: Any, fleet: Fleet, args: argparse.Namespace,
+                        counter: RoundTripCounter) -> dict[str, Any]:
+    rng = random.Random(f"{args.seed}:{scenario.name}")
+    state = await scenario.setup(client, fleet, rng) if scenario.setup else {}
+    total = min(args.requests, scenario.max_requests or args.requests)
+    warmup = min(WARMUP_REQUESTS, total)
+    bodies: list[Any] = []
+    errors: list[str] = []
+
+    async def send(request: Any) -> float:
+        started = time.perf_counter()
+        response = await client.request(
+            request.method, request.url, params=request.params, json=request.json, headers=request.headers
+        )
+        elapsed = time.perf_counter() - started
+        if response.status_code not in scenario.expect:
+            errors.append(f"{response.status_code} {response.text[:200]}")
+        elif scenario.settle is not None:
+            bodies.append(response.json())
+        return elapsed
+
+    for _ in range(warmup):
+        await send(scenario.request(rng, fleet, state))
+    errors.clear()
+
+    runs = []
+    for _ in range(args.repeat):
+        await _quiesce()
+        pending = iter([scenario.request(rng, fleet, state) for _ in range(total)])
+        latencies: list[float] = []
+
+        async def worker() -> None:
+            for request in pending:
+                latencies.append(await send(request))
+
+        counter.reset()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - started
+        round_trips = counter.reset()
+        if scenario.settle is not None:
+            await scenario.settle(client, bodies)
+            bodies.clear()
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        runs.append(
+            {
+                "p50Ms": _percentile(latencies_ms, 0.50),
+                "p95Ms": _percentile(latencies_ms, 0.95),
+                "p99Ms": _percentile(latencies_ms, 0.99),
+                "rps": total / wall,
+                "roundTrips": round_trips / total,
+            }
+        )
+
+    # Median of the repeats: one noisy repeat (GC, a WAL checkpoint) does not move the result
+    result: dict[str, Any] = {
+        metric: round(statistics.median(run[metric] for run in runs), 3 if metric.endswith("Ms") else 2)
+        for metric in runs[0]
+    }
+    result.update(requests=total, errors=len(errors), firstError=errors[0] if errors else None)
+    return result
+
+
+async def _run(args: argparse.Namespace, fleet: Fleet, counter: RoundTripCounter) -> dict[str, dict[str, Any]]:
+    import httpx
+
+    from app.main import app, lifespan
+    from benchmarks.fleet import seed_mongo, seed_sqlite
+    from benchmarks.scenarios import SCENARIOS
+
+    started = time.perf_counter()
+    (seed_mongo if args.backend == "mongo" else seed_sqlite)(fleet)
+    print(f"seeded {fleet.devices} devices, {fleet.history} history rows in {time.perf_counter() - started:.1f}s")
+    _print_header()
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in SCENARIOS:
+            if args.backend not in scenario.backends:
+                continue
+            if args.scenario and scenario.name not in args.scenario:
+                continue
+            results[scenario.name] = await _run_scenario(client, scenario, fleet, args, counter)
+            _print_row(scenario.name, results[scenario.name])
+    return results
+
+
+def _print_header() -> None:
+    print(f"{'scenario':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'trips':>8}{'errors':>8}")
+
+
+def _print_row(name: str, result: dict[str, Any]) -> None:
+    print(
+        f"{name:<20}{result['p50Ms']:>9.2f}{result['p95Ms']:>9.2f}{result['p99Ms']:>9.2f}"
+        f"{result['rps']:>9.0f}{result['roundTrips']:>8.2f}{result['errors']:>8}"
+    )
+    if result["firstError"]:
+        print(f"    first error: {result['firstError']}")
+
+
+def _regressions(results: dict[str, dict[str, Any]], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    found = []
+    for name, result in results.items():
+        if result["errors"]:
+            found.append(f"{name}: {result['errors']} failed requests")
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["p95Ms"] > base["p95Ms"] * (1 + tolerance) + LATENCY_SLACK_MS:
+            found.append(f"{name}: p95 {result['p95Ms']:.2f}ms vs baseline {base['p95Ms']:.2f}ms")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            found.append(f"{name}: {result['rps']:.0f} req/s vs baseline {base['rps']:.0f}")
+        if result["roundTrips"] > base["roundTrips"] * (1 + ROUND_TRIP_TOLERANCE) + ROUND_TRIP_SLACK:
+            found.append(f"{name}: {result['roundTrips']:.2f} round trips vs baseline {base['roundTrips']:.2f}")
+    return found
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("sqlite", "mongo"), default="sqlite")
+    parser.add_argument("--devices", type=int, default=1000, help="fleet size, 1..100000")
+    parser.add_argument("--history", type=int, default=100_000, help="light_history rows to seed")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per scenario; the median is reported")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenario", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--baseline", type=Path, help="default: benchmarks/baselines/<backend>.json")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed p95 / RPS regression as a fraction (default 0.5)")
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--mongo-db", default=os.getenv("BENCH_MONGODB_DB_NAME", "SD_IoT_bench"))
+    args = parser.parse_args(argv)
+    if min(args.requests, args.concurrency, args.repeat) < 1:
+        parser.error("--requests, --concurrency and --repeat must be >= 1")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    fleet = Fleet(args.devices, args.history)
+    with tempfile.TemporaryDirectory(prefix="lights-bench-") as workdir:
+        _configure_environment(args, Path(workdir))
+        counter = RoundTripCounter()
+        _install_counter(args.backend, counter)
+        print(f"{args.backend}: {fleet.key}, {args.requests} requests x {args.concurrency} concurrent per scenario")
+        results = asyncio.run(_run(args, fleet, counter))
+
+    key = f"{fleet.key}-c{args.concurrency}"
+    baseline_path = args.baseline or BASELINE_DIR / f"{args.backend}.json"
+    baselines = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    if args.json:
+        args.json.write_text(json.dumps({"backend": args.backend, "key": key, "results": results}, indent=2))
+    if args.update_baseline:
+        failed = [name for name, result in results.items() if result["errors"]]
+        if failed:
+            print(f"not recording a baseline: requests failed in {', '.join(failed)}")
+            return 1
+        baselines[key] = {
+            name: {metric: result[metric] for metric in ("p50Ms", "p95Ms", "p99Ms", "rps", "roundTrips")}
+            for name, result in results.items()
+        }
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"baseline {key} written to {baseline_path}")
+        return 0
+
+    if key not in baselines:
+        print(f"no baseline for {key} in {baseline_path}; record one with --update-baseline")
+    regressions = _regressions(results, baselines.get(key, {}), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+One scenario per /lights/* route (plus variants worth tracking separately:
+conditional status reads, fleet-wide and deep history pages). Each builds its
+requests from a seeded RNG, so a run is repeatable. The /lights/stream
+WebSocket is not covered: httpx has no WebSocket client.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, NamedTuple
+
+import httpx
+
+from benchmarks.fleet import FLEET_DAYS, FLEET_STATES, Fleet
+
+BATCH_SIZE = 100
+HISTORY_LIMIT = 100
+# Restaurants whose ETag / cursors are prepared before a scenario runs
+SAMPLE_SIZE = 100
+DEEP_HISTORY_PAGES = 20
+FANOUT_POLL_SECONDS = 0.05
+
+
+class Request(NamedTuple):
+    method: str
+    url: str
+    params: dict[str, Any] | None = None
+    json: Any = None
+    headers: dict[str, str] | None = None
+
+
+State = dict[str, Any]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    request: Callable[[random.Random, Fleet, State], Request]
+    expect: tuple[int, ...] = (200,)
+    backends: tuple[str, ...] = ("sqlite", "mongo")
+    max_requests: int | None = None  # for routes that write a whole fleet slice per call
+    # Runs before the timed requests; returns the State handed to request()
+    setup: Callable[[httpx.AsyncClient, Fleet, random.Random], Awaitable[State]] | None = None
+    # Runs after them with the JSON bodies, e.g. to wait for background jobs
+    settle: Callable[[httpx.AsyncClient, list[Any]], Awaitable[None]] | None = field(default=None)
+
+
+def _rid(rng: random.Random, fleet: Fleet) -> int:
+    return rng.randint(1, fleet.devices)
+
+
+def _rids(rng: random.Random, fleet: Fleet, count: int = BATCH_SIZE) -> list[int]:
+    return rng.sample(range(1, fleet.devices + 1), min(count, fleet.devices))
+
+
+def _hhmm(rng: random.Random, low: int, high: int) -> str:
+    return f"{rng.randint(low, high):02d}:{rng.choice((0, 15, 30, 45)):02d}"
+
+
+async def _etags(client: httpx.AsyncClient, fleet: Fleet, rng: random.Random) -> State:
+    etags = {}
+    for rid in _rids(rng, fleet, SAMPLE_SIZE):
+        response = await client.get("/lights/status", params={"restaurantId": rid})
+        if "etag" in response.headers:
+            etags[rid] = response.headers["etag"]
+    return {"etags": list(etags.items())}
+
+
+async def _deep_cursors(client: httpx.AsyncClient, fleet: Fleet, rng: random.Random) -> State:
+    cursors = []
+    params: dict[str, Any] = {"limit": HISTORY_LIMIT}
+    for _ in range(DEEP_HISTORY_PAGES):
+        cursor = (await client.get("/lights/history", params=params)).headers.get("x-next-cursor")
+        if cursor is None:
+            break
+        cursors.append(cursor)
+        params["cursor"] = cursor
+    return {"cursors": cursors}
+
+
+async def _fanout_job(client: httpx.AsyncClient, fleet: Fleet, rng: random.Random) -> State:
+    job = (await client.post("/lights/fanout", json=_fanout_body(rng, fleet, {}).json)).json()
+    await _wait_for_jobs(client, [job])
+    return {"jobId": job["jobId"]}
+
+
+async def _wait_for_jobs(client: httpx.AsyncClient, jobs: list[Any]) -> None:
+    for job in jobs:
+        while job.get("status") in ("pending", "running"):
+            await asyncio.sleep(FANOUT_POLL_SECONDS)
+            job = (await client.get(f"/lights/fanout/{job['jobId']}")).json()
+
+
+def _conditional_status(rng: random.Random, fleet: Fleet, state: State) -> Request:
+    if not state["etags"]:
+        return Request("GET", "/lights/status", {"restaurantId": _rid(rng, fleet)})
+    rid, etag = rng.choice(state["etags"])
+    return Request("GET", "/lights/status", {"restaurantId": rid}, headers={"If-None-Match": etag})
+
+
+def _deep_history(rng: random.Random, fleet: Fleet, state: State) -> Request:
+    params: dict[str, Any] = {"limit": HISTORY_LIMIT}
+    if state["cursors"]:
+        params["cursor"] = rng.choice(state["cursors"])
+    return Request("GET", "/lights/history", params)
+
+
+def _fanout_body(rng: random.Random, fleet: Fleet, state: State) -> Request:
+    return Request(
+        "POST", "/lights/fanout",
+        json={"selector": {"state": rng.choice(FLEET_STATES)}, "state": rng.choice(("on", "off"))},
+    )
+
+
+SCENARIOS: list[Scenario] = [
+    Scenario("status", lambda rng, fleet, state: Request(
+        "GET", "/lights/status", {"restaurantId": _rid(rng, fleet)})),
+    Scenario("status 304", _conditional_status, expect=(304,), setup=_etags),
+    Scenario("toggle", lambda rng, fleet, state: Request(
+        "POST", "/lights/toggle", json={"restaurantId": _rid(rng, fleet), "action": "toggle"})),
+    Scenario("status batch", lambda rng, fleet, state: Request(
+        "POST", "/lights/status/batch", json={"restaurantIds": _rids(rng, fleet)})),
+    Scenario("toggle batch", lambda rng, fleet, state: Request(
+        "POST", "/lights/toggle/batch", json={"restaurantIds": _rids(rng, fleet)})),
+    Scenario("set batch", lambda rng, fleet, state: Request(
+        "POST", "/lights/set/batch", json={"items": [
+            {"restaurantId": rid, "state": rng.choice(("on", "off")), "brightness": rng.randint(0, 100)}
+            for rid in _rids(rng, fleet)
+        ]})),
+    Scenario("schedule", lambda rng, fleet, state: Request(
+        "POST", "/lights/schedule", json={
+            "restaurantId": _rid(rng, fleet), "scheduleOn": _hhmm(rng, 5, 9), "scheduleOff": _hhmm(rng, 20, 23),
+        })),
+    Scenario("schedule/full set", lambda rng, fleet, state: Request(
+        "POST", "/lights/schedule/full", json={"restaurantId": _rid(rng, fleet), "rules": [
+            {"days": [day], "startTime": _hhmm(rng, 5, 9), "endTime": _hhmm(rng, 20, 23)} for day in FLEET_DAYS
+        ]})),
+    Scenario("schedule/full get", lambda rng, fleet, state: Request(
+        "GET", "/lights/schedule/full", {"restaurantId": _rid(rng, fleet)})),
+    Scenario("schedule/evaluate", lambda rng, fleet, state: Request(
+        "GET", "/lights/schedule/evaluate", {"at": f"2026-01-0{rng.randint(1, 7)}T{_hhmm(rng, 0, 23)}:00Z"})),
+    Scenario("history", lambda rng, fleet, state: Request(
+        "GET", "/lights/history", {"restaurantId": _rid(rng, fleet), "limit": HISTORY_LIMIT})),
+    Scenario("history fleet", lambda rng, fleet, state: Request(
+        "GET", "/lights/history", {"limit": HISTORY_LIMIT})),
+    Scenario("history deep", _deep_history, setup=_deep_cursors),
+    Scenario("history range", lambda rng, fleet, state: Request(
+        "GET", "/lights/history", {
+            "restaurantId": _rid(rng, fleet), "action": "toggle_on", "limit": HISTORY_LIMIT,
+            "from": "2026-01-01T00:00:00Z", "to": "2026-01-02T00:00:00Z",
+        })),
+    Scenario("fanout", _fanout_body, expect=(202,), backends=("mongo",), max_requests=10,
+             settle=_wait_for_jobs),
+    Scenario("fanout job", lambda rng, fleet, state: Request("GET", f"/lights/fanout/{state['jobId']}"),
+             backends=("mongo",), setup=_fanout_job),
+    Scenario("cache stats", lambda rng, fleet, state: Request("GET", "/lights/cache/stats"), expect=(200, 404)),
+    Scenario("commands stats", lambda rng, fleet, state: Request("GET", "/lights/commands/stats"),
+             expect=(200, 404)),
+]
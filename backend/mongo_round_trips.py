@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Count MongoDB round trips for one toggle against a local mongod.
+Usage: MONGODB_URI=mongodb://localhost:27017 python mongo_round_trips.py [restaurant_id]
+Defaults to restaurant_id=1 if not specified. Toggles twice so the light ends where it started.
+"""
+
+from dotenv import load_dotenv
+import asyncio
+import sys
+from pathlib import Path
+
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+from pymongo import monitoring
+
+class CommandCounter(monitoring.CommandListener):
+    """Records every command sent to the server."""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+# Listeners must be registered before the client is created.
+counter = CommandCounter()
+monitoring.register(counter)
+
+from app.database.mongo import close_mongo_clients
+from app.services.async_repository import AsyncMongoLightRepository
+
+async def main():
+    restaurant_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    repository = AsyncMongoLightRepository()
+
+    for _ in range(2):
+        counter.commands.clear()
+        row = await repository.toggle_light(restaurant_id)
+        print(f"toggle -> {row['state']}: {len(counter.commands)} round trips {counter.commands}")
+    await close_mongo_clients()
+
+if __name__ == "__main__":
+    asyncio.run(main())
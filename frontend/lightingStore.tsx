@@ -1,4 +1,4 @@
-import React, { createContext, ReactNode, useContext, useEffect, useMemo, useState } from "react";
+import React, { createContext, ReactNode, useContext, useEffect, useMemo, useRef, useState } from "react";
 
 type BackendStatus = {
   restaurantId: number;
@@ -8,12 +8,17 @@ type BackendStatus = {
 };
 
 type BackendHistory = {
-  id: number;
+  id: number | string;
   restaurantId: number;
   action: string;
   timestamp: string;
 };
 
+type LiveMessage =
+  | { type: "status"; data: BackendStatus }
+  | { type: "history"; data: BackendHistory }
+  | { type: "dropped"; history: number };
+
 type ScheduleRule = {
   days: string[];
   startTime: string;
@@ -49,6 +54,12 @@ type LightingContextType = {
 const LightingContext = createContext<LightingContextType | undefined>(undefined);
 
 const RESTAURANT_ID = 1;
+// Same page size the backend returns from /lights/history
+const HISTORY_LIMIT = 100;
+const LIVE_RECONNECT_MS = 3000;
+// How long a write waits for its history row over /lights/stream before refetching
+// (the backend only pushes history when its change feed is running)
+const LIVE_HISTORY_GRACE_MS = 2000;
 
 export const LightingProvider = ({ children }: { children: ReactNode }) => {
   const baseUrl = useMemo(
@@ -60,6 +71,7 @@ export const LightingProvider = ({ children }: { children: ReactNode }) => {
   const [history, setHistory] = useState<BackendHistory[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const lastHistoryPush = useRef(0);
 
   const refreshStatus = async () => {
     const response = await fetch(`${baseUrl}/lights/status?restaurantId=${RESTAURANT_ID}`);
@@ -79,6 +91,16 @@ export const LightingProvider = ({ children }: { children: ReactNode }) => {
     setHistory(body);
   };
 
+  // Fallback for the push: refetch if no history row arrived since the write
+  const refreshHistoryUnlessPushed = () => {
+    const writtenAt = Date.now();
+    setTimeout(() => {
+      if (lastHistoryPush.current < writtenAt) {
+        void refreshHistory().catch(() => undefined);
+      }
+    }, LIVE_HISTORY_GRACE_MS);
+  };
+
   const toggleLight = async () => {
     setLoading(true);
     setError(null);
@@ -96,7 +118,7 @@ export const LightingProvider = ({ children }: { children: ReactNode }) => {
       }
       const body = (await response.json()) as BackendStatus;
       setStatus(body);
-      await refreshHistory();
+      refreshHistoryUnlessPushed();
     } catch (err) {
       setError(err instanceof Error ? err.message : "Unknown toggle error");
       throw err;
@@ -123,7 +145,7 @@ export const LightingProvider = ({ children }: { children: ReactNode }) => {
       }
       const body = (await response.json()) as BackendStatus;
       setStatus(body);
-      await refreshHistory();
+      refreshHistoryUnlessPushed();
     } catch (err) {
       setError(err instanceof Error ? err.message : "Unknown schedule error");
       throw err;
@@ -198,6 +220,55 @@ export const LightingProvider = ({ children }: { children: ReactNode }) => {
     };
   }, []);
 
+  // Live status and history pushed by the backend instead of refetching after every action
+  useEffect(() => {
+    let socket: WebSocket | null = null;
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+    let closed = false;
+    let reconnecting = false;
+
+    const connect = () => {
+      socket = new WebSocket(`${baseUrl.replace(/^http/, "ws")}/lights/stream?restaurantId=${RESTAURANT_ID}`);
+      socket.onopen = () => {
+        if (reconnecting) {
+          // Rows written while we were disconnected were never pushed
+          void refreshHistory().catch(() => undefined);
+        }
+      };
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data) as LiveMessage;
+        if (message.type === "status") {
+          setStatus(message.data);
+        } else if (message.type === "history") {
+          lastHistoryPush.current = Date.now();
+          setHistory((prev) =>
+            prev.some((item) => item.id === message.data.id)
+              ? prev
+              : [message.data, ...prev].slice(0, HISTORY_LIMIT)
+          );
+        } else if (message.type === "dropped") {
+          // We fell behind and missed rows; reload the page once
+          void refreshHistory().catch(() => undefined);
+        }
+      };
+      socket.onclose = () => {
+        if (!closed) {
+          reconnecting = true;
+          reconnectTimer = setTimeout(connect, LIVE_RECONNECT_MS);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      if (reconnectTimer) {
+        clearTimeout(reconnectTimer);
+      }
+      socket?.close();
+    };
+  }, [baseUrl]);
+
   return (
     <LightingContext.Provider
       value={{
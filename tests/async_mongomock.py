@@ -0,0 +1,83 @@
+"""
+Just enough of pymongo's asyncio API over mongomock for the repository tests:
+collection methods become coroutines and cursors support async iteration.
+Every call is logged as (collection, method) in AsyncDatabase.calls, so tests
+can count round trips.
+"""
+from typing import Any
+
+import mongomock
+
+
+class AsyncCursor:
+    def __init__(self, cursor: Any) -> None:
+        self._cursor = cursor
+
+    def sort(self, *args: Any, **kwargs: Any) -> "AsyncCursor":
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, count: int) -> "AsyncCursor":
+        self._cursor = self._cursor.skip(count)
+        return self
+
+    def limit(self, count: int) -> "AsyncCursor":
+        self._cursor = self._cursor.limit(count)
+        return self
+
+    def batch_size(self, size: int) -> "AsyncCursor":
+        return self
+
+    async def to_list(self, length: int | None = None) -> list[Any]:
+        documents = list(self._cursor)
+        return documents[:length] if length else documents
+
+    def __aiter__(self) -> "AsyncCursor":
+        self._iterator = iter(self._cursor)
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+class AsyncCollection:
+    def __init__(self, collection: Any, calls: list[tuple[str, str]]) -> None:
+        self._collection = collection
+        self._calls = calls
+        self.name = collection.name
+
+    def find(self, *args: Any, **kwargs: Any) -> AsyncCursor:
+        self._calls.append((self.name, "find"))
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, *args: Any, **kwargs: Any) -> AsyncCursor:
+        self._calls.append((self.name, "aggregate"))
+        return AsyncCursor(self._collection.aggregate(*args, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self._collection, name)
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            self._calls.append((self.name, name))
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self, database: Any) -> None:
+        self.sync = database
+        self.calls: list[tuple[str, str]] = []
+
+    def __getitem__(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self.sync[name], self.calls)
+
+    def __getattr__(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self.sync[name], self.calls)
+
+
+def async_database(name: str = "SD_IoT") -> AsyncDatabase:
+    return AsyncDatabase(mongomock.MongoClient()[name])
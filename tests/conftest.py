@@ -0,0 +1,87 @@
+"""
+Offline test setup: the backend runs against a throwaway SQLite file, and tests
+that need MongoDB use mongomock through tests/async_mongomock.py. Nothing here
+touches the network.
+
+The app reads its settings when its modules are imported, so they are pinned
+here before any test imports app.*.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+TESTS_DIR = Path(__file__).resolve().parent
+sys.path[:0] = [str(BACKEND_DIR), str(TESTS_DIR)]
+
+os.environ.update(
+    {
+        "LIGHTS_DB_PATH": str(Path(tempfile.mkdtemp(prefix="lights-tests-")) / "lights.db"),
+        "MONGODB_URI": "",  # set before app.main's load_dotenv, so a local .env cannot point tests at Atlas
+        "EVENT_BUS_MODE": "off",
+        "SCHEDULER_ENABLED": "",
+        "TELEMETRY_ROLLUPS_ENABLED": "",
+        "ARCHIVE_ENABLED": "",
+        "COMMAND_MQTT_HOST": "",
+        "TELEMETRY_MQTT_HOST": "",
+        "STATUS_CACHE_REDIS_URL": "",
+        "HISTORY_WRITER_MODE": "sync",  # history is committed before each write request returns
+        "LIGHT_COALESCE_WINDOW_MS": "0",
+    }
+)
+
+# test_db.py is a manual check against the live Atlas cluster and runs at import
+collect_ignore = ["test_db.py"]
+
+
+@pytest.fixture(scope="session")
+def sqlite_db():
+    from app.database.db import init_db
+
+    init_db()
+
+
+@pytest.fixture(scope="session")
+def client(sqlite_db):
+    """The whole app in process, lifespan included (SQLite backend)."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """A fresh mongomock database that AsyncMongoLightRepository() will use."""
+    from async_mongomock import async_database
+
+    import app.services.async_repository as async_repository
+
+    database = async_database()
+    monkeypatch.setattr(async_repository, "get_async_mongo_db", lambda: database)
+    return database
+
+
+@pytest.fixture
+def mongo_devices(mongo_db):
+    """mongo_db with Devices ESP32_1..ESP32_5 (legacyId 1..5, CT for 1-3, NY for 4-5), all off."""
+    mongo_db.sync.Devices.insert_many(
+        [
+            {
+                "_id": f"ESP32_{i}",
+                "legacyId": i,
+                "restaurantId": f"mcd_{i}",
+                "restaurant": f"Restaurant {i}",
+                "address": {"state": "CT" if i <= 3 else "NY"},
+                "lightState": "off",
+                "brightness": 0,
+            }
+            for i in range(1, 6)
+        ]
+    )
+    return mongo_db
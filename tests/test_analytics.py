@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.database.db import get_connection
+from app.services.analytics import EnergyAnalytics, SQLiteAnalyticsStore, compute_energy_report
+from app.services.light_service import SQLiteLightRepository, to_utc_iso
+from app.services.rollups import SQLiteRollupStore
+from app.services.telemetry import Reading, SQLiteTelemetryStore
+
+START = datetime(2020, 2, 3, tzinfo=timezone.utc)
+RESTAURANT = 951
+
+
+def test_report_splits_energy_by_light_state_and_counts_hours_lit():
+    # restaurant 0: off at start, on at 0.5 h, 1 kW readings hourly; restaurant 1: on all along, no readings
+    result = compute_energy_report(
+        reading_codes=np.array([0, 0, 0]),
+        reading_times=np.array([0.0, 3600.0, 7200.0]),
+        power=np.array([1000.0, 1000.0, 1000.0]),
+        event_codes=np.array([0]),
+        event_times=np.array([1800.0]),
+        event_on=np.array([True]),
+        initial_on=np.array([False, True]),
+        start=0.0,
+        end=7200.0,
+        max_gap=4000.0,
+    )
+
+    assert result["kwh"].tolist() == pytest.approx([2.0, 0.0])
+    assert result["kwh_while_off"].tolist() == pytest.approx([0.0, 0.0])
+    assert result["hours_lit"].tolist() == pytest.approx([1.5, 2.0])
+    assert result["readings"].tolist() == [3, 0]
+
+
+def test_energy_drawn_while_recorded_off_is_reported():
+    result = compute_energy_report(
+        np.array([0, 0]), np.array([0.0, 3600.0]), np.array([500.0, 500.0]),
+        np.array([0]), np.array([600.0]), np.array([False]), np.array([True]),
+        0.0, 3600.0, 4000.0,
+    )
+
+    assert result["kwh_while_off"].tolist() == pytest.approx([0.5])
+    assert result["hours_lit"].tolist() == pytest.approx([600 / 3600])
+
+
+@pytest.fixture
+def restaurant(sqlite_db):
+    def clear():
+        with get_connection() as conn:
+            conn.execute("DELETE FROM light_history WHERE restaurant_id = ?", (RESTAURANT,))
+            conn.execute("DELETE FROM telemetry WHERE restaurant_id = ?", (RESTAURANT,))
+
+    SQLiteLightRepository().get_or_create_light(RESTAURANT)
+    clear()
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO light_history (restaurant_id, action, timestamp) VALUES (?, ?, ?)",
+            [
+                (RESTAURANT, "toggle_on", to_utc_iso(START - timedelta(days=1))),  # state at start
+                (RESTAURANT, "schedule_set", to_utc_iso(START + timedelta(minutes=10))),  # not a state change
+                (RESTAURANT, "set_off", to_utc_iso(START + timedelta(minutes=30))),
+            ],
+        )
+    readings = [
+        Reading(str(RESTAURANT), START + timedelta(minutes=m), 120.0, 1.0, 120.0, m) for m in (0, 20, 40, 60)
+    ]
+    asyncio.run(SQLiteTelemetryStore().insert_readings(readings))
+    yield
+    clear()
+
+
+@pytest.mark.parametrize("inline_max_readings", [1000, 0])  # inline, then in the worker process
+def test_sqlite_report_for_one_restaurant(restaurant, inline_max_readings):
+    analytics = EnergyAnalytics(
+        SQLiteAnalyticsStore(SQLiteRollupStore()), inline_max_readings=inline_max_readings, max_gap_seconds=3600
+    )
+
+    try:
+        report = asyncio.run(analytics.report(START, START + timedelta(hours=1), [RESTAURANT]))
+    finally:
+        analytics.shutdown()
+
+    (row,) = report["restaurants"]
+    assert row["restaurantId"] == RESTAURANT
+    # readings at 0, 20 and 40 min (60 is past the end); the last two each add 20 min at 120 W
+    assert row["kWh"] == pytest.approx(0.08)
+    assert row["kWhWhileOff"] == pytest.approx(0.04)  # the 40 min reading follows set_off
+    assert row["hoursLit"] == pytest.approx(0.5)
+    assert report["fleet"]["readings"] == 3
+
+
+def test_report_range_is_validated():
+    analytics = EnergyAnalytics(SQLiteAnalyticsStore(SQLiteRollupStore()))
+
+    with pytest.raises(ValueError, match="before"):
+        asyncio.run(analytics.report(START, START))
+    with pytest.raises(ValueError, match="at most"):
+        asyncio.run(analytics.report(START, START + timedelta(days=60)))
@@ -0,0 +1,62 @@
+import asyncio
+
+from app.services.async_repository import AsyncMongoLightRepository
+from app.services.light_service import DEVICE_NOT_FOUND_ERROR, LightService
+
+
+def _results(response):
+    assert response.status_code == 200
+    return {item["restaurantId"]: item for item in response.json()["results"]}
+
+
+def test_status_batch_returns_every_restaurant(client):
+    results = _results(client.post("/lights/status/batch", json={"restaurantIds": [601, 602, 603]}))
+
+    assert set(results) == {601, 602, 603}
+    assert all(item["status"]["state"] == "off" and "error" not in item for item in results.values())
+
+
+def test_toggle_batch_toggles_each_restaurant_once(client):
+    results = _results(client.post("/lights/toggle/batch", json={"restaurantIds": [611, 612, 611]}))
+
+    assert [item["status"]["state"] for item in results.values()] == ["on", "on"]
+    history = client.get("/lights/history", params={"restaurantId": 611}).json()
+    assert [row["action"] for row in history] == ["toggle_on"]
+
+
+def test_set_batch_last_command_per_restaurant_wins(client):
+    items = [
+        {"restaurantId": 621, "state": "off"},
+        {"restaurantId": 622, "brightness": 50},
+        {"restaurantId": 621, "state": "on", "brightness": 70},
+    ]
+
+    results = _results(client.post("/lights/set/batch", json={"items": items}))
+
+    assert (results[621]["status"]["state"], results[621]["status"]["brightness"]) == ("on", 70)
+    assert results[622]["status"]["state"] == "off"  # brightness alone does not switch a light on
+
+
+def test_batch_size_is_validated(client):
+    assert client.post("/lights/status/batch", json={"restaurantIds": []}).status_code == 422
+
+
+def test_mongo_toggle_batch_is_three_round_trips_with_per_item_errors(mongo_devices):
+    service = LightService(AsyncMongoLightRepository())
+
+    results = asyncio.run(service.toggle_lights([1, 2, 99]))
+
+    assert [call[1] for call in mongo_devices.calls] == ["update_many", "find", "insert_many"]
+    by_id = {item["restaurantId"]: item for item in results}
+    assert by_id[1]["status"]["state"] == by_id[2]["status"]["state"] == "on"
+    assert by_id[99] == {"restaurantId": 99, "error": DEVICE_NOT_FOUND_ERROR}
+    assert mongo_devices.sync.light_history.count_documents({}) == 2
+
+
+def test_mongo_status_batch_is_one_query(mongo_devices):
+    service = LightService(AsyncMongoLightRepository())
+
+    results = asyncio.run(service.get_status_batch([3, 4, 5]))
+
+    assert mongo_devices.calls == [("Devices", "find")]
+    assert [item["status"]["restaurantId"] for item in results] == [3, 4, 5]
@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+
+from app.services.batch_writer import BATCH_WRITE_ATTEMPTS, BatchWriter
+from app.services.history_writer import HISTORY_BATCH_SIZE, HISTORY_QUEUE_SIZE, HistoryWriter
+
+
+class Sink:
+    def __init__(self, delay=0.0, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.batches = []
+
+    async def __call__(self, entries):
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("write failed")
+        self.batches.append(list(entries))
+
+
+def _writer(sink, batch_size=500, flush_interval_seconds=0.05, max_pending=10000, **options):
+    options.setdefault("retry_seconds", 0)
+    return BatchWriter(sink, batch_size, flush_interval_seconds, max_pending, **options)
+
+
+def test_close_lets_the_flush_in_progress_finish():
+    sink = Sink(delay=0.05)
+
+    async def main():
+        writer = _writer(sink, durable=True, batch_size=2, flush_interval_seconds=0.01)
+        await writer.start()
+        submits = [asyncio.create_task(writer.submit([i])) for i in range(5)]
+        await asyncio.sleep(0.02)  # the first batch is inside the sink now
+        await writer.close()
+        await asyncio.wait_for(asyncio.gather(*submits), timeout=1)
+        return writer
+
+    writer = asyncio.run(main())
+
+    assert sorted(entry for batch in sink.batches for entry in batch) == [0, 1, 2, 3, 4]
+    assert writer.pending == 0
+    assert writer.written == 5
+    assert writer.dropped == 0
+
+
+def test_close_flushes_buffered_entries():
+    sink = Sink()
+
+    async def main():
+        writer = _writer(sink, flush_interval_seconds=60)
+        await writer.start()
+        await writer.submit(["a", "b"])
+        await writer.close()
+
+    asyncio.run(main())
+
+    assert sink.batches == [["a", "b"]]
+
+
+def test_sync_submit_waits_for_the_commit_and_sees_failures():
+    sink = Sink(failures=BATCH_WRITE_ATTEMPTS)
+
+    async def main():
+        writer = _writer(sink, durable=True, flush_interval_seconds=0.01)
+        await writer.start()
+        with pytest.raises(RuntimeError):
+            await writer.submit(["lost"])
+        await writer.submit(["kept"])
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(main())
+
+    assert sink.batches == [["kept"]]
+    assert writer.dropped == 1
+
+
+def test_unstarted_writer_writes_through():
+    sink = Sink()
+
+    asyncio.run(_writer(sink).submit(["a"]))
+
+    assert sink.batches == [["a"]]
+
+
+def test_offer_drops_what_does_not_fit():
+    async def main():
+        writer = _writer(Sink(), batch_size=2, max_pending=3)
+        return writer, writer.offer([1, 2, 3, 4, 5])
+
+    writer, taken = asyncio.run(main())
+
+    assert taken == 3
+    assert writer.pending == 3
+    assert writer.dropped == 2
+
+
+def test_unstarted_durable_writer_writes_through_more_than_one_batch():
+    sink = Sink()
+
+    async def main():
+        writer = _writer(sink, durable=True, batch_size=2)
+        await asyncio.wait_for(writer.submit([1, 2, 3, 4, 5]), timeout=1)
+        return writer
+
+    writer = asyncio.run(main())
+
+    assert sink.batches == [[1, 2], [3, 4], [5]]
+    assert writer.pending == 0
+
+
+def test_large_submit_never_overfills_the_buffer():
+    pending_seen = []
+
+    async def main():
+        async def sink(entries):
+            pending_seen.append(writer.pending + len(entries))
+            await asyncio.sleep(0.01)
+
+        writer = _writer(sink, durable=True, batch_size=2, max_pending=2, flush_interval_seconds=0.01)
+        await writer.start()
+        await asyncio.wait_for(writer.submit(list(range(7))), timeout=1)
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(main())
+
+    assert max(pending_seen) <= 2
+    assert writer.written == 7
+
+
+def test_no_retry_delay_after_the_last_attempt():
+    sink = Sink(failures=BATCH_WRITE_ATTEMPTS)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await _writer(sink, retry_seconds=0.2).submit(["lost"])
+        return loop.time() - started
+
+    elapsed = asyncio.run(main())
+
+    # one delay between each pair of attempts, none after the final failure
+    assert elapsed < 0.2 * BATCH_WRITE_ATTEMPTS
+
+
+def test_wait_for_space_waits_for_room_for_the_whole_submit():
+    async def main():
+        writer = _writer(Sink(), batch_size=2, max_pending=4)
+        writer.offer([1, 2, 3])
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(writer.wait_for_space(2), timeout=0.05)
+        await asyncio.wait_for(writer.wait_for_space(1), timeout=0.05)
+        await writer.start()  # flushing frees the buffer
+        await asyncio.wait_for(writer.wait_for_space(10), timeout=1)  # capped at a full buffer
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_history_writer_uses_the_history_settings():
+    async def main():
+        return HistoryWriter(Sink(), durable=True)
+
+    writer = asyncio.run(main())
+
+    assert (writer.name, writer.batch_size, writer.max_pending) == ("history", HISTORY_BATCH_SIZE, HISTORY_QUEUE_SIZE)
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from benchmarks.fleet import Fleet
+from benchmarks.run import BASELINE_DIR, DEFAULT_TOLERANCE, _parse_args, _percentile, _regressions
+from benchmarks.scenarios import SCENARIOS
+
+BASE = {"p50Ms": 2.0, "p95Ms": 4.0, "p99Ms": 6.0, "rps": 1000.0, "roundTrips": 2.0}
+
+
+def _result(**changes):
+    result = dict(BASE, requests=200, errors=0, firstError=None)
+    result.update(changes)
+    return result
+
+
+def test_results_within_tolerance_pass():
+    results = {
+        "status": _result(p95Ms=4.0 * 1.5 + 0.9, rps=1000.0 * 0.51, roundTrips=2.0 * 1.1 + 0.04),
+        "new scenario": _result(p95Ms=1000.0),  # nothing to compare with yet
+    }
+
+    assert _regressions(results, {"status": BASE}, DEFAULT_TOLERANCE) == []
+
+
+def test_each_kind_of_regression_is_reported():
+    results = {
+        "status": _result(p95Ms=7.1),
+        "toggle": _result(rps=499.0),
+        "history": _result(roundTrips=2.3),
+        "set batch": _result(errors=3, firstError="500 boom"),
+    }
+    baseline = {name: BASE for name in ("status", "toggle", "history")}
+
+    assert _regressions(results, baseline, DEFAULT_TOLERANCE) == [
+        "status: p95 7.10ms vs baseline 4.00ms",
+        "toggle: 499 req/s vs baseline 1000",
+        "history: 2.30 round trips vs baseline 2.00",
+        "set batch: 3 failed requests",
+    ]
+
+
+def test_percentiles_are_inclusive():
+    latencies = [float(ms) for ms in range(1, 101)]
+
+    assert _percentile(latencies, 0.50) == pytest.approx(50.5)
+    assert _percentile(latencies, 0.99) == pytest.approx(99.01)
+    assert _percentile([3.0], 0.95) == 3.0
+
+
+def test_stored_baselines_cover_known_scenarios_with_every_metric():
+    default_key = f"{Fleet(1000, 100_000).key}-c{_parse_args([]).concurrency}"
+    names = {scenario.name for scenario in SCENARIOS}
+
+    baselines = json.loads((BASELINE_DIR / "sqlite.json").read_text())
+
+    assert default_key in baselines
+    for key, scenarios in baselines.items():
+        assert set(scenarios) <= names, key
+        for name, metrics in scenarios.items():
+            assert set(metrics) == set(BASE), (key, name)
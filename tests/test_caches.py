@@ -0,0 +1,137 @@
+import asyncio
+
+from app.services.async_repository import AsyncMongoLightRepository
+from app.services.device_cache import MISS, DeviceResolutionCache
+from app.services.status_cache import StatusCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _status(restaurant_id, last_updated, state="on"):
+    return {"restaurantId": restaurant_id, "state": state, "brightness": 100, "lastUpdated": last_updated}
+
+
+# -- device resolution cache ---------------------------------------------------
+
+
+def test_device_cache_keeps_only_the_reference_fields():
+    cache = DeviceResolutionCache()
+
+    cache.put(1, {"_id": "ESP32_1", "legacyId": 1, "restaurant": "R1", "lightState": "on"})
+
+    assert cache.get(1) == {"_id": "ESP32_1", "legacyId": 1, "restaurant": "R1"}
+
+
+def test_device_cache_expires_and_caches_unknown_ids_briefly():
+    clock = FakeClock()
+    cache = DeviceResolutionCache(ttl_seconds=300, negative_ttl_seconds=30, clock=clock)
+    cache.put(1, {"_id": "ESP32_1"})
+    cache.put(2, None)
+
+    assert cache.get(2) is None
+    clock.now += 31
+    assert cache.get(2) is MISS
+    assert cache.get(1) == {"_id": "ESP32_1"}
+    clock.now += 300
+    assert cache.get(1) is MISS
+
+
+def test_device_cache_evicts_least_recently_used():
+    cache = DeviceResolutionCache(max_entries=2)
+    for legacy_id in (1, 2):
+        cache.put(legacy_id, {"_id": f"ESP32_{legacy_id}"})
+    cache.get(1)
+
+    cache.put(3, {"_id": "ESP32_3"})
+
+    assert cache.get(2) is MISS
+    assert cache.get(1) is not MISS and cache.get(3) is not MISS
+    assert cache.stats()["evictions"] == 1
+
+
+def test_device_cache_invalidates_by_device_id():
+    cache = DeviceResolutionCache()
+    cache.put(1, {"_id": "ESP32_1"})
+
+    cache.invalidate_device("ESP32_1")
+
+    assert cache.get(1) is MISS
+
+
+def test_batch_reads_cache_complete_device_refs(mongo_db):
+    mongo_db.sync.Devices.insert_many(
+        [
+            {"_id": f"ESP32_{i}", "legacyId": i, "restaurantId": f"mcd_{i}", "restaurant": f"R{i}",
+             "scheduleId": f"S{i}", "lightState": "off", "brightness": 0}
+            for i in (1, 2)
+        ]
+    )
+    repository = AsyncMongoLightRepository()
+
+    asyncio.run(repository.get_lights([1, 2]))
+
+    assert repository.device_cache.get(1) == {
+        "_id": "ESP32_1", "legacyId": 1, "restaurantId": "mcd_1", "restaurant": "R1", "scheduleId": "S1"
+    }
+
+
+# -- status cache ----------------------------------------------------------------
+
+
+def test_status_cache_rejects_older_statuses_across_formats():
+    cache = StatusCache()
+    cache.put(_status(1, "2026-01-05T12:00:00.500000+00:00"))
+
+    cache.put(_status(1, "2026-01-05T12:00:00", state="off"))  # naive: UTC
+    cache.put(_status(1, "2026-01-05T13:00:00.100+01:00", state="off"))  # 12:00:00.100 UTC
+
+    assert cache._get_local(1)["state"] == "on"
+    assert cache.stats()["stale"] == 2
+
+    cache.put(_status(1, "2026-01-05T12:00:01Z", state="off"))
+    assert cache._get_local(1)["state"] == "off"
+
+
+def test_status_cache_shares_one_load_between_concurrent_misses():
+    cache = StatusCache()
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return _status(1, "2026-01-05T12:00:00+00:00")
+
+    async def main():
+        return await asyncio.gather(*(cache.get(1, load) for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert loads == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_status_cache_reloads_after_ttl():
+    clock = FakeClock()
+    cache = StatusCache(ttl_seconds=30, clock=clock)
+    loads = []
+
+    async def load():
+        loads.append(clock.now)
+        return _status(1, "2026-01-05T12:00:00+00:00")
+
+    async def main():
+        await cache.get(1, load)
+        await cache.get(1, load)
+        clock.now += 31
+        await cache.get(1, load)
+
+    asyncio.run(main())
+
+    assert len(loads) == 2
@@ -0,0 +1,112 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.services.commands import Command, CommandAck, CommandDispatcher, CommandStore, decode_ack
+
+
+class FakeClient:
+    """The paho calls CommandDispatcher makes; PUBACKs are delivered by the test."""
+
+    def __init__(self):
+        self.published = []
+
+    def max_inflight_messages_set(self, count):
+        pass
+
+    def connect_async(self, host, port, keepalive):
+        pass
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload, qos):
+        self.published.append((topic, json.loads(payload)))
+        return SimpleNamespace(mid=len(self.published))
+
+
+class Store(CommandStore):
+    def __init__(self, devices):
+        self.devices = devices
+        self.records = []
+
+    async def device_ids(self, restaurant_ids):
+        return {rid: self.devices[rid] for rid in restaurant_ids if rid in self.devices}
+
+    async def record(self, updates):
+        self.records.extend(updates)
+
+
+def _status(rid, state, brightness):
+    return {"restaurantId": rid, "state": state, "brightness": brightness}
+
+
+def _dispatcher(store):
+    dispatcher = CommandDispatcher(store, topic="devices/{deviceId}/commands")
+    dispatcher._create_client = FakeClient
+    return dispatcher
+
+
+def test_commands_are_coalesced_and_unchanged_states_skipped():
+    store = Store({1: "ESP32_1", 2: "ESP32_2"})
+    dispatcher = _dispatcher(store)
+
+    async def main():
+        await dispatcher.start()
+        dispatcher.submit(_status(1, "on", 40))
+        dispatcher.submit(_status(1, "on", 85))  # replaces the queued command
+        dispatcher.submit(_status(2, "off", 0))
+        dispatcher.submit(_status(3, "on", 85))  # no device
+        await asyncio.sleep(0.01)
+        dispatcher.submit(_status(2, "off", 0))  # already published
+        client = dispatcher._client
+        await dispatcher.stop()
+        return client
+
+    client = asyncio.run(main())
+
+    assert [(topic, body["state"], body["brightness"]) for topic, body in client.published] == [
+        ("devices/ESP32_1/commands", "on", 85),
+        ("devices/ESP32_2/commands", "off", 0),
+    ]
+    stats = dispatcher.stats()
+    assert (stats["published"], stats["coalesced"], stats["unchanged"], stats["unknownDevices"]) == (2, 1, 1, 1)
+    assert [command.device_id for command in store.records] == ["ESP32_1", "ESP32_2"]  # flushed on stop
+
+
+def test_pubacks_and_device_acks_are_counted_and_recorded():
+    store = Store({1: "ESP32_1"})
+    dispatcher = _dispatcher(store)
+
+    async def main():
+        await dispatcher.start()
+        dispatcher.submit(_status(1, "on", 85))
+        await asyncio.sleep(0.01)
+        command_id = dispatcher._client.published[0][1]["commandId"]
+        dispatcher._delivered(1)
+        dispatcher._delivered(1)  # a duplicate PUBACK counts once
+        dispatcher._acknowledged(decode_ack("ESP32_1", json.dumps({"commandId": command_id}).encode()))
+        dispatcher._acknowledged(
+            decode_ack("ESP32_1", json.dumps({"commandId": "old", "ok": False, "error": "busy"}).encode())
+        )
+        await dispatcher.stop()
+
+    asyncio.run(main())
+
+    stats = dispatcher.stats()
+    assert (stats["delivered"], stats["inflight"], stats["acked"], stats["failed"]) == (1, 0, 1, 1)
+    assert [type(update) for update in store.records] == [Command, CommandAck, CommandAck]
+
+
+def test_malformed_acks_are_ignored():
+    assert decode_ack("ESP32_1", b"not json") is None
+    assert decode_ack("ESP32_1", b'{"ok": true}') is None
+    assert decode_ack(None, b'{"commandId": "a"}') is None
+    ack = decode_ack("ESP32_1", b'{"commandId": "a", "ok": "yes", "error": 5}')
+    assert (ack.ok, ack.error) == (False, None)  # only a literal true counts
@@ -0,0 +1,48 @@
+def _status(client, restaurant_id=401, **headers):
+    return client.get("/lights/status", params={"restaurantId": restaurant_id}, headers=headers)
+
+
+def test_status_sends_validators(client):
+    response = _status(client)
+
+    assert response.status_code == 200
+    assert response.headers["ETag"].startswith('"')
+    assert "Last-Modified" in response.headers
+    assert "Cache-Control" in response.headers
+
+
+def test_matching_etag_gets_304_without_a_body(client):
+    etag = _status(client).headers["ETag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = _status(client, **{"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+
+def test_write_changes_the_etag(client):
+    etag = _status(client, 402).headers["ETag"]
+
+    client.post("/lights/toggle", json={"restaurantId": 402, "action": "toggle"})
+    response = _status(client, 402, **{"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["restaurantId"] == 402
+
+
+def test_if_modified_since(client):
+    last_modified = _status(client, 403).headers["Last-Modified"]
+
+    assert _status(client, 403, **{"If-Modified-Since": last_modified}).status_code == 304
+    assert _status(client, 403, **{"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    assert _status(client, 403, **{"If-Modified-Since": "yesterday"}).status_code == 200
+
+
+def test_if_none_match_wins_over_if_modified_since(client):
+    last_modified = _status(client, 404).headers["Last-Modified"]
+
+    response = _status(client, 404, **{"If-None-Match": '"stale"', "If-Modified-Since": last_modified})
+
+    assert response.status_code == 200
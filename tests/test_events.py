@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.services.events import (
+    DeviceChanged,
+    EventBus,
+    HistoryAppended,
+    MongoPollingSource,
+    ScheduleChanged,
+    SQLitePollingSource,
+)
+from app.services.light_service import SQLiteLightRepository
+
+
+def test_bus_dispatches_by_type_to_sync_and_async_handlers():
+    bus = EventBus()
+    seen = []
+
+    async def record_async(event):
+        seen.append(("async", event.restaurant_id))
+
+    def broken(event):
+        raise RuntimeError("handler bug")
+
+    bus.subscribe(DeviceChanged, broken)
+    bus.subscribe(DeviceChanged, lambda event: seen.append(("sync", event.restaurant_id)))
+    unsubscribe = bus.subscribe(DeviceChanged, record_async)
+    bus.subscribe(HistoryAppended, lambda event: seen.append(("history", event.restaurant_id)))
+
+    asyncio.run(bus.publish(DeviceChanged("ESP32_1", 1, "update")))
+    unsubscribe()
+    asyncio.run(bus.publish(DeviceChanged("ESP32_2", 2, "update")))
+
+    assert seen == [("sync", 1), ("async", 1), ("sync", 2)]  # a failing handler does not stop the rest
+    assert bus.published == 2
+
+
+def test_device_changed_touches_only_named_fields_when_known():
+    partial = DeviceChanged("ESP32_1", 1, "update", updated_fields=frozenset({"telemetry.power"}))
+
+    assert partial.touches(["telemetry"])
+    assert not partial.touches(["lightState", "brightness"])
+    assert DeviceChanged("ESP32_1", 1, "update").touches(["lightState"])
+    assert DeviceChanged("ESP32_1", 1, "insert", updated_fields=frozenset()).touches(["lightState"])
+
+
+def test_sqlite_poll_publishes_each_change_once(sqlite_db):
+    repository = SQLiteLightRepository()
+    source = SQLitePollingSource()
+    asyncio.run(source.prime())
+
+    repository.toggle_light(701)
+    repository.set_schedule(702, "08:00", "20:00")
+    events = asyncio.run(source.poll())
+
+    assert {(type(event), event.restaurant_id) for event in events} == {
+        (DeviceChanged, 701),
+        (DeviceChanged, 702),
+        (ScheduleChanged, 702),
+        (HistoryAppended, 701),
+        (HistoryAppended, 702),
+    }
+    assert asyncio.run(source.poll()) == []
+
+
+def test_mongo_history_poll_picks_up_rows_committed_behind_the_mark(mongo_db):
+    source = MongoPollingSource(mongo_db, lookback_seconds=2)
+    now = datetime.now(timezone.utc)
+    history = mongo_db.sync.light_history
+
+    stamped = (now + timedelta(seconds=1.5)).isoformat()
+    history.insert_one({"_id": "a", "legacyId": 1, "action": "toggle_on", "timestamp": stamped})
+    first = asyncio.run(source.poll())
+    # committed after "a" but stamped earlier, e.g. by a retried group commit
+    late = (now + timedelta(seconds=0.5)).isoformat()
+    history.insert_one({"_id": "b", "legacyId": 2, "action": "toggle_off", "timestamp": late})
+    second = asyncio.run(source.poll())
+
+    assert [event.id for event in first] == ["a"]
+    assert [event.id for event in second] == ["b"]
+    assert asyncio.run(source.poll()) == []
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from app.services.async_repository import AsyncMongoLightRepository
+from app.services.fanout import JOB_COMPLETED, JOB_FAILED, FanOutService, selector_filter
+
+
+def test_selector_maps_to_devices_fields():
+    assert selector_filter({"state": "CT", "firmware": "1.0", "city": None}) == {
+        "address.state": "CT",
+        "device.firmware": "1.0",
+    }
+    with pytest.raises(ValueError):
+        selector_filter({"city": None})
+
+
+def _run_job(service, *args):
+    async def main():
+        job = service.start(*args)
+        await asyncio.gather(*service._tasks.values())
+        return job
+
+    return asyncio.run(main())
+
+
+def test_job_writes_every_matching_device_in_chunks(mongo_devices):
+    repository = AsyncMongoLightRepository()
+    service = FanOutService(repository, chunk_size=2)
+
+    job = _run_job(service, {"state": "CT"}, "on", 60)
+
+    assert (job.status, job.matched, job.modified, job.history_written) == (JOB_COMPLETED, 3, 3, 3)
+    assert [call[1] for call in mongo_devices.calls].count("update_many") == 2  # chunks of 2 and 1
+    states = {doc["_id"]: (doc["lightState"], doc["brightness"]) for doc in mongo_devices.sync.Devices.find()}
+    assert states["ESP32_1"] == states["ESP32_3"] == ("on", 60)
+    assert states["ESP32_4"] == ("off", 0)
+    assert {doc["action"] for doc in mongo_devices.sync.light_history.find()} == {"set_on"}
+    assert service.get(job.id).to_dict()["historyWritten"] == 3
+
+
+def test_written_devices_are_handed_to_on_written(mongo_devices):
+    written = {}
+    service = FanOutService(AsyncMongoLightRepository(), chunk_size=2, on_written=written.update)
+
+    _run_job(service, {"state": "CT"}, "on", 60)
+
+    assert {rid: (row["state"], row["brightness"]) for rid, row in written.items()} == {
+        1: ("on", 60),
+        2: ("on", 60),
+        3: ("on", 60),
+    }
+
+
+def test_failed_job_records_the_error(mongo_devices):
+    repository = AsyncMongoLightRepository()
+
+    async def broken(*args):
+        raise RuntimeError("primary stepped down")
+
+    repository.set_devices = broken
+
+    job = _run_job(FanOutService(repository), {"state": "NY"}, "off", None)
+
+    assert (job.status, job.error, job.finished_at is not None) == (JOB_FAILED, "primary stepped down", True)
+
+
+def test_sqlite_backend_answers_501(client):
+    response = client.post("/lights/fanout", json={"selector": {"state": "CT"}, "state": "on"})
+
+    assert response.status_code == 501
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.services.async_repository import AsyncMongoLightRepository
+from app.services.light_service import LightService
+
+NEXT_CURSOR = "X-Next-Cursor"
+
+
+def _pages(client, **params):
+    pages = []
+    cursor = None
+    while True:
+        response = client.get("/lights/history", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_walks_every_row_once_newest_first(client):
+    for _ in range(7):
+        assert client.post("/lights/toggle", json={"restaurantId": 101, "action": "toggle"}).status_code == 200
+
+    pages = _pages(client, restaurantId=101, limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    rows = [row for page in pages for row in page]
+    assert len({row["id"] for row in rows}) == 7
+    keys = [(row["timestamp"], row["id"]) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+    assert [row["action"] for row in rows[:2]] == ["toggle_on", "toggle_off"]
+
+
+def test_full_last_page_is_followed_by_an_empty_one(client):
+    for _ in range(2):
+        client.post("/lights/toggle", json={"restaurantId": 102, "action": "toggle"})
+
+    pages = _pages(client, restaurantId=102, limit=2)
+
+    assert [len(page) for page in pages] == [2, 0]
+
+
+def test_malformed_cursor_is_rejected(client):
+    response = client.get("/lights/history", params={"restaurantId": 101, "cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+def test_mongo_cursor_breaks_timestamp_ties_by_id(mongo_db):
+    timestamp = datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)
+    mongo_db.sync.light_history.insert_many(
+        [{"legacyId": 1, "action": f"tied_{i}", "timestamp": timestamp.isoformat()} for i in range(4)]
+        + [{"legacyId": 1, "action": "older", "timestamp": (timestamp - timedelta(minutes=1)).isoformat()}]
+        + [{"legacyId": 2, "action": "other_restaurant", "timestamp": timestamp.isoformat()}]
+    )
+    service = LightService(AsyncMongoLightRepository())
+
+    async def walk():
+        rows, cursor = [], None
+        while True:
+            page, cursor = await service.get_history(1, cursor=cursor, limit=2)
+            rows.extend(page)
+            if cursor is None:
+                return rows
+
+    rows = asyncio.run(walk())
+
+    assert [row["action"] for row in rows] == ["tied_3", "tied_2", "tied_1", "tied_0", "older"]
@@ -0,0 +1,85 @@
+import mongomock
+import pytest
+
+from app.database.db import get_connection
+from app.database.indexes import (
+    MONGO_INDEXES,
+    MODE_CHECK,
+    IndexCheckError,
+    bootstrap_indexes,
+    ensure_mongo_collections,
+    ensure_mongo_indexes,
+    verify_mongo_indexes,
+    verify_sqlite_indexes,
+)
+from app.models.collections import CollectionNames
+
+
+@pytest.fixture
+def mongo():
+    return mongomock.MongoClient()["SD_IoT"]
+
+
+def test_mongo_indexes_are_created_and_verified(mongo):
+    ensure_mongo_indexes(mongo)
+
+    report = verify_mongo_indexes(mongo)
+
+    assert report.ok
+    assert report.unexpected == []
+    for collection_name, specs in MONGO_INDEXES.items():
+        names = {info["name"] for info in mongo[collection_name].list_indexes()}
+        assert {spec.name for spec in specs} <= names
+
+
+def test_every_devices_legacy_id_lookup_uses_the_compound_index():
+    devices = {spec.name: spec.keys for spec in MONGO_INDEXES[CollectionNames.DEVICES]}
+
+    assert "legacyId_1" not in devices
+    assert devices["legacyId_1_updatedAt_1"][0] == ("legacyId", 1)
+
+
+def test_missing_and_unmanaged_mongo_indexes_are_reported(mongo):
+    ensure_mongo_indexes(mongo)
+    mongo.Schedules.drop_index("updatedAt_1")
+    mongo.Devices.create_index("legacyId", name="legacyId_1")
+
+    report = verify_mongo_indexes(mongo)
+
+    assert report.missing == ["Schedules.updatedAt_1"]
+    assert report.unexpected == ["Devices.legacyId_1"]
+    assert not report.ok
+
+
+def test_time_data_is_created_as_a_time_series_collection():
+    created = {}
+
+    class Database:
+        def list_collection_names(self):
+            return [CollectionNames.DEVICES]
+
+        def create_collection(self, name, **options):
+            created[name] = options
+
+    ensure_mongo_collections(Database())
+
+    assert created[CollectionNames.TIME_DATA]["timeseries"]["timeField"] == "timestamp"
+
+
+def test_sqlite_schema_has_every_index(sqlite_db):
+    report = verify_sqlite_indexes()
+
+    assert report.ok and report.unexpected == []
+
+
+def test_check_mode_fails_fast_on_a_missing_sqlite_index(sqlite_db):
+    with get_connection() as conn:
+        conn.execute("DROP INDEX idx_restaurant_lights_last_updated")
+    try:
+        with pytest.raises(IndexCheckError, match="idx_restaurant_lights_last_updated"):
+            bootstrap_indexes(MODE_CHECK)
+    finally:
+        with get_connection() as conn:
+            conn.execute(
+                "CREATE INDEX idx_restaurant_lights_last_updated ON restaurant_lights (last_updated)"
+            )
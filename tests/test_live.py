@@ -0,0 +1,66 @@
+import asyncio
+
+from app.services.live import MESSAGE_DROPPED, MESSAGE_HISTORY, MESSAGE_STATUS, LiveConnection, LiveHub
+
+
+def _status(rid, last_updated, state="on"):
+    return {"restaurantId": rid, "state": state, "lastUpdated": last_updated}
+
+
+def _drain(connection):
+    return asyncio.run(connection.next_messages())
+
+
+def test_only_the_newest_pending_status_is_sent():
+    connection = LiveConnection()
+    connection.push_status(_status(1, "2026-01-01T00:00:00+00:00", "on"))
+    connection.push_status(_status(1, "2026-01-01T00:00:01+00:00", "off"))
+
+    assert _drain(connection) == [
+        {"type": MESSAGE_STATUS, "data": _status(1, "2026-01-01T00:00:01+00:00", "off")}
+    ]
+
+
+def test_an_update_already_delivered_is_not_resent_in_another_offset_form():
+    connection = LiveConnection()
+    connection.push_status(_status(1, "2026-01-01T10:00:00.500+00:00"))
+    _drain(connection)
+
+    # the same instant from the change feed as naive UTC, and as a +02:00 wall clock
+    connection.push_status(_status(1, "2026-01-01T10:00:00.500000"))
+    connection.push_status(_status(1, "2026-01-01T12:00:00.5+02:00"))
+    assert not connection._ready.is_set()
+
+    connection.push_status(_status(1, "2026-01-01T11:00:00+05:00"))  # 06:00 UTC: older, but the larger string
+    assert not connection._ready.is_set()
+
+    connection.push_status(_status(1, "2026-01-01T10:00:01+00:00"))
+    assert [message["type"] for message in _drain(connection)] == [MESSAGE_STATUS]
+
+
+def test_slow_client_is_told_how_many_history_rows_were_dropped():
+    connection = LiveConnection(max_history=2)
+    for i in range(5):
+        connection.push_history({"restaurantId": 1, "id": i})
+
+    messages = _drain(connection)
+
+    assert messages[0] == {"type": MESSAGE_DROPPED, "history": 3}
+    assert [message["data"]["id"] for message in messages if message["type"] == MESSAGE_HISTORY] == [3, 4]
+
+
+def test_hub_routes_by_subscription():
+    hub = LiveHub()
+    first, second = LiveConnection(), LiveConnection()
+    hub.subscribe(first, [1, 2])
+    hub.subscribe(second, [2])
+
+    hub.publish_status(_status(2, "2026-01-01T00:00:00+00:00"))
+    hub.unsubscribe(first, [2])
+    hub.publish_history({"restaurantId": 2, "id": 7})
+    hub.unsubscribe(second)
+
+    assert [message["type"] for message in _drain(first)] == [MESSAGE_STATUS]
+    assert [message["type"] for message in _drain(second)] == [MESSAGE_STATUS, MESSAGE_HISTORY]
+    assert hub.connections == 1
+    assert first.restaurant_ids == {1} and second.restaurant_ids == set()
@@ -0,0 +1,79 @@
+import threading
+
+from app.metrics import (
+    METRICS_CONTENT_TYPE,
+    Counter,
+    Histogram,
+    Registry,
+    RequestStats,
+    _request_stats,
+    record_db,
+    record_fetch,
+)
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = Registry()
+    histogram = registry.register(Histogram("op_seconds", "Op time", ("op",), buckets=(0.1, 1.0)))
+    counter = registry.register(Counter("rows_total", "Rows", ("op",)))
+    histogram.observe(0.05, "read")
+    histogram.observe(0.5, "read")
+    counter.inc(3, 'say "hi"')
+
+    assert registry.render().splitlines() == [
+        "# HELP op_seconds Op time",
+        "# TYPE op_seconds histogram",
+        'op_seconds_bucket{op="read",le="0.1"} 1',
+        'op_seconds_bucket{op="read",le="1.0"} 2',
+        'op_seconds_bucket{op="read",le="+Inf"} 2',
+        'op_seconds_sum{op="read"} 0.55',
+        'op_seconds_count{op="read"} 2',
+        "# HELP rows_total Rows",
+        "# TYPE rows_total counter",
+        'rows_total{op="say \\"hi\\""} 3',
+    ]
+
+
+def test_updates_from_worker_threads_are_not_lost():
+    histogram = Histogram("threaded_seconds", "Threaded", buckets=(1.0,))
+    counter = Counter("threaded_total", "Threaded")
+
+    def work():
+        for _ in range(2000):
+            histogram.observe(0.5)
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert histogram.labels().counts == [8000, 0]
+    assert counter._values[()] == 8000
+
+
+def test_round_trips_and_rows_are_attributed_to_the_current_request():
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    try:
+        record_db("sqlite", "select", 0.002)
+        record_fetch("sqlite", "select", 0.001, 4)
+        record_db("sqlite", "insert", 0.003, 1)
+    finally:
+        _request_stats.reset(token)
+    record_db("sqlite", "select", 1.0)  # outside any request
+
+    assert (stats.round_trips, stats.rows) == (2, 5)
+    assert abs(stats.db_seconds - 0.006) < 1e-9
+
+
+def test_requests_carry_server_timing_and_show_up_in_metrics(client):
+    response = client.get("/lights/status", params={"restaurantId": 981})
+    metrics = client.get("/metrics")
+
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=") and 'desc="round_trips=' in timing and ", app;dur=" in timing
+    assert metrics.headers["content-type"] == METRICS_CONTENT_TYPE
+    assert 'http_request_duration_seconds_count{method="GET",route="/lights/status",status="200"}' in metrics.text
+    assert 'db_operation_seconds_count{backend="sqlite",operation="select"}' in metrics.text
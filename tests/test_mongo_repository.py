@@ -0,0 +1,49 @@
+import asyncio
+
+from app.services.async_repository import AsyncMongoLightRepository
+
+
+def _device_writes(mongo_db):
+    return [call for call in mongo_db.calls if call[0] == "Devices"]
+
+
+def test_toggle_is_one_find_and_update_plus_the_history_insert(mongo_devices):
+    repository = AsyncMongoLightRepository()
+    asyncio.run(repository.get_or_create_light(1))  # resolves and caches the device
+    mongo_devices.calls.clear()
+
+    row = asyncio.run(repository.toggle_light(1))
+
+    assert mongo_devices.calls == [("Devices", "find_one_and_update"), ("light_history", "insert_one")]
+    assert (row["state"], row["brightness"]) == ("on", 85)
+    device = mongo_devices.sync.Devices.find_one({"_id": "ESP32_1"})
+    assert (device["lightState"], device["brightness"]) == ("on", 85)
+    history = mongo_devices.sync.light_history.find_one({"legacyId": 1})
+    assert (history["action"], history["deviceId"]) == ("toggle_on", "ESP32_1")
+    assert history["timestamp"] == row["last_updated"]
+
+
+def test_toggle_keeps_a_set_brightness_and_turns_off_to_zero(mongo_devices):
+    mongo_devices.sync.Devices.update_one({"_id": "ESP32_2"}, {"$set": {"brightness": 40}})
+    repository = AsyncMongoLightRepository()
+
+    on = asyncio.run(repository.toggle_light(2))
+    off = asyncio.run(repository.toggle_light(2))
+
+    assert (on["state"], on["brightness"]) == ("on", 40)
+    assert (off["state"], off["brightness"]) == ("off", 0)
+    actions = [doc["action"] for doc in mongo_devices.sync.light_history.find({"legacyId": 2}).sort("_id", 1)]
+    assert actions == ["toggle_on", "toggle_off"]
+
+
+def test_set_schedule_is_one_find_and_update(mongo_devices):
+    repository = AsyncMongoLightRepository()
+    asyncio.run(repository.get_or_create_light(3))
+    mongo_devices.calls.clear()
+
+    row = asyncio.run(repository.set_schedule(3, "18:00", "23:00"))
+
+    assert _device_writes(mongo_devices) == [("Devices", "find_one_and_update")]
+    assert (row["schedule_on"], row["schedule_off"]) == ("18:00", "23:00")
+    device = mongo_devices.sync.Devices.find_one({"_id": "ESP32_3"})
+    assert (device["scheduleOn"], device["scheduleOff"]) == ("18:00", "23:00")
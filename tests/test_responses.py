@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import pytest
+from pydantic import TypeAdapter
+
+import app.routes.responses as responses
+from app.models.light import FullScheduleResponse, LightHistoryItem, LightStatusResponse
+from app.services.async_repository import ThreadedLightRepository
+from app.services.light_service import LightService, SQLiteLightRepository
+from app.services.records import status_record
+
+RESTAURANT = 971
+
+
+@pytest.fixture
+def fast_mode(monkeypatch):
+    """FastJSONResponse without FAST_RESPONSES=1 at import (orjson is only imported in fast mode)."""
+    monkeypatch.setattr(responses, "orjson", orjson, raising=False)
+
+
+def _model_body(model, record):
+    adapter = TypeAdapter(model)
+    return adapter.dump_json(adapter.validate_python(record))
+
+
+def test_service_returns_records_with_parsed_timestamps(sqlite_db):
+    service = LightService(ThreadedLightRepository(SQLiteLightRepository()))
+
+    async def main():
+        toggled = await service.toggle_light(RESTAURANT)
+        status = await service.get_status(RESTAURANT)
+        history, _cursor = await service.get_history(RESTAURANT, limit=1)
+        schedule = await service.set_full_schedule(
+            RESTAURANT, [{"days": ["mon"], "startTime": "08:00", "endTime": "17:00", "enabled": True}]
+        )
+        return toggled, status, history, schedule
+
+    toggled, status, history, schedule = asyncio.run(main())
+
+    assert toggled == status
+    assert set(status) == set(LightStatusResponse.model_fields)
+    assert isinstance(status["lastUpdated"], datetime)
+    assert set(history[0]) == set(LightHistoryItem.model_fields)
+    assert history[0]["restaurantId"] == RESTAURANT and isinstance(history[0]["timestamp"], datetime)
+    assert set(schedule) == set(FullScheduleResponse.model_fields)  # the repository's restaurantId is dropped
+    assert schedule["rules"] == [{"days": ["mon"], "startTime": "08:00", "endTime": "17:00", "enabled": True}]
+
+
+@pytest.mark.parametrize(
+    "last_updated",
+    [
+        datetime(2026, 1, 1, 12, 0, 0, 250000, tzinfo=timezone.utc).isoformat(),
+        datetime(2026, 1, 1, 12, 0, tzinfo=timezone(timedelta(hours=5))).isoformat(),
+        "2026-01-01T12:00:00",  # naive stays naive
+    ],
+)
+def test_fast_body_is_the_model_body(fast_mode, last_updated):
+    record = status_record({"restaurantId": 1, "state": "on", "brightness": 85, "lastUpdated": last_updated})
+
+    assert responses.FastJSONResponse(record).body == _model_body(LightStatusResponse, record)
+
+
+def test_fast_response_keeps_the_route_headers(fast_mode, sqlite_db):
+    service = LightService(ThreadedLightRepository(SQLiteLightRepository()))
+    history, _cursor = asyncio.run(service.get_history(RESTAURANT))
+    route_response = responses.Response()
+    route_response.headers["X-Next-Cursor"] = "abc"
+
+    fast = responses.fast_response(history, route_response)
+
+    assert fast.headers["X-Next-Cursor"] == "abc"
+    assert fast.body == _model_body(list[LightHistoryItem], history)
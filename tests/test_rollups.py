@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.database.db import get_connection
+from app.services.rollups import (
+    RAW_RESOLUTION,
+    RollupState,
+    SQLiteRollupStore,
+    TelemetryRollupEngine,
+    _sorted_columns,
+    choose_resolution,
+    energy_wh,
+    query_telemetry,
+    rollup_buckets,
+)
+from app.services.telemetry import Reading, SQLiteTelemetryStore
+
+START = datetime(2020, 1, 6, tzinfo=timezone.utc)  # a Monday, far behind any live test data
+DEVICE = "901"
+
+
+def _columns(rows):
+    """rows: (device, seconds after START, P); V and I mirror P."""
+    devices = [device for device, _offset, _power in rows]
+    stamps = [START.timestamp() + offset for _device, offset, _power in rows]
+    power = [power for _device, _offset, power in rows]
+    return _sorted_columns(devices, stamps, {"V": power, "I": power, "P": power})
+
+
+def test_energy_is_the_trapezoid_per_device_and_skips_gaps():
+    columns = _columns([("a", 0, 60), ("b", 0, 100), ("a", 60, 120), ("a", 1000, 60), ("b", 30, 100)])
+    state = RollupState()
+
+    energy = energy_wh(columns, state, max_gap=300)
+
+    # sorted (a@0, a@60, a@1000, b@0, b@30): first readings and the 940 s gap add nothing
+    assert energy.tolist() == pytest.approx([0, 1.5, 0, 0, 100 * 30 / 3600])
+    assert state.last == {"a": (START.timestamp() + 1000, 60.0), "b": (START.timestamp() + 30, 100.0)}
+
+
+def test_energy_continues_from_the_previous_pass():
+    state = RollupState(last={"a": (START.timestamp() - 60, 60.0)})
+
+    energy = energy_wh(_columns([("a", 0, 60)]), state, max_gap=300)
+
+    assert energy.tolist() == pytest.approx([1.0])
+
+
+def test_buckets_aggregate_each_device_and_width():
+    columns = _columns([("a", 0, 10), ("a", 30, 30), ("a", 60, 50), ("b", 10, 5)])
+
+    buckets = rollup_buckets(columns, np.array([0.0, 1.0, 2.0, 4.0]), 60)
+
+    summary = [
+        (bucket.device_id, bucket.start, bucket.count, bucket.minimum["P"], bucket.maximum["P"], bucket.total["P"])
+        for bucket in buckets
+    ]
+    assert [bucket.wh for bucket in buckets] == [1.0, 2.0, 4.0]
+    assert summary == [
+        ("a", START, 2, 10, 30, 40),
+        ("a", START + timedelta(minutes=1), 1, 50, 50, 50),
+        ("b", START, 1, 5, 5, 5),
+    ]
+
+
+def test_resolution_is_the_coarsest_with_enough_points():
+    assert choose_resolution(START, START + timedelta(days=30), 20) == "1d"
+    assert choose_resolution(START, START + timedelta(days=1), 20) == "1h"
+    assert choose_resolution(START, START + timedelta(hours=1), 20) == "1m"
+    assert choose_resolution(START, START + timedelta(minutes=5), 20) == RAW_RESOLUTION
+
+
+@pytest.fixture
+def rollup_tables(sqlite_db):
+    def clear():
+        with get_connection() as conn:
+            conn.execute("DELETE FROM telemetry_rollup_state")
+            conn.execute("DELETE FROM telemetry_rollups WHERE restaurant_id = ?", (int(DEVICE),))
+            conn.execute("DELETE FROM telemetry WHERE restaurant_id = ?", (int(DEVICE),))
+
+    clear()
+    yield
+    clear()
+
+
+def test_sqlite_engine_merges_buckets_across_passes(rollup_tables):
+    readings = [Reading(DEVICE, START + timedelta(seconds=s), 120.0, 0.5, 60.0, s) for s in (0, 20, 40, 80)]
+    store = SQLiteRollupStore()
+    engine = TelemetryRollupEngine(store, lateness_seconds=0)
+
+    async def main():
+        await SQLiteTelemetryStore().insert_readings(readings)
+        first = await engine.catch_up(START + timedelta(seconds=30))  # splits the first minute
+        second = await engine.catch_up(START + timedelta(minutes=2))
+        again = await engine.catch_up(START + timedelta(minutes=2))
+        series = await query_telemetry(store, int(DEVICE), START, START + timedelta(hours=1), 60, 100)
+        return (first, second, again), series
+
+    rolled, series = asyncio.run(main())
+
+    assert rolled == (2, 2, 0)
+    assert engine.mark == START + timedelta(minutes=2)
+    assert series["resolution"] == "1m"
+    points = [(point["t"], point["count"], point["P"]["mean"]) for point in series["points"]]
+    assert points == [(START, 3, 60.0), (START + timedelta(minutes=1), 1, 60.0)]
+    # 20 s + 20 s + 40 s at 60 W, integrated across the pass boundary
+    assert sum(point["Wh"] for point in series["points"]) == pytest.approx(60 * 80 / 3600)
+
+
+def test_short_ranges_return_raw_readings(rollup_tables):
+    readings = [Reading(DEVICE, START + timedelta(seconds=s), 120.0, 0.5, 60.0, s) for s in (0, 20)]
+    store = SQLiteRollupStore()
+
+    async def main():
+        await SQLiteTelemetryStore().insert_readings(readings)
+        return await query_telemetry(store, int(DEVICE), START, START + timedelta(minutes=1), 60, 100)
+
+    series = asyncio.run(main())
+
+    assert series["resolution"] == RAW_RESOLUTION
+    assert [point["t"] for point in series["points"]] == [START, START + timedelta(seconds=20)]
+    assert series["points"][0]["P"] == {"min": 60.0, "max": 60.0, "mean": 60.0}
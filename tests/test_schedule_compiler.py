@@ -0,0 +1,130 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from app.services.schedule_compiler import (
+    MINUTES_PER_DAY,
+    CompiledSchedule,
+    FleetSchedule,
+    compile_rules,
+    effective_rules,
+)
+
+MON, FRI, SAT, SUN = 0, 4, 5, 6
+UTC = ZoneInfo("UTC")
+
+
+def _rule(days, start, end, action="ON", enabled=True):
+    (start_hour, start_minute), (end_hour, end_minute) = start, end
+    return {
+        "days": days,
+        "startHour": start_hour,
+        "startMinute": start_minute,
+        "endHour": end_hour,
+        "endMinute": end_minute,
+        "action": action,
+        "enabled": enabled,
+    }
+
+
+def _minute(day, hour, minute=0):
+    return day * MINUTES_PER_DAY + hour * 60 + minute
+
+
+def test_rule_covers_start_but_not_end():
+    bits = compile_rules([_rule(["MON"], (9, 0), (17, 0))])
+
+    assert not bits[_minute(MON, 8, 59)]
+    assert bits[_minute(MON, 9)]
+    assert bits[_minute(MON, 16, 59)]
+    assert not bits[_minute(MON, 17)]
+    assert bits.sum() == 8 * 60
+
+
+def test_overnight_rule_ends_the_next_day():
+    bits = compile_rules([_rule(["FRI"], (22, 0), (2, 0))])
+
+    assert bits[_minute(FRI, 23)]
+    assert bits[_minute(SAT, 1, 59)]
+    assert not bits[_minute(SAT, 2)]
+    assert not bits[_minute(FRI, 1)]  # Thursday night was not scheduled
+
+
+def test_sunday_overnight_wraps_to_monday():
+    bits = compile_rules([_rule(["SUN"], (23, 0), (1, 0))])
+
+    assert bits[_minute(SUN, 23, 30)]
+    assert bits[_minute(MON, 0, 30)]
+    assert not bits[_minute(MON, 1)]
+
+
+def test_off_rule_wins_over_on_whatever_the_order():
+    on = _rule(["DAILY"], (8, 0), (20, 0))
+    off = _rule(["MON"], (12, 0), (13, 0), action="OFF")
+
+    for rules in ([on, off], [off, on]):
+        bits = compile_rules(rules)
+        assert not bits[_minute(MON, 12, 30)]
+        assert bits[_minute(MON, 11, 59)]
+        assert bits[_minute(MON, 13)]
+        assert bits[_minute(1, 12, 30)]
+
+
+def test_disabled_and_malformed_rules_are_skipped():
+    rules = [
+        _rule(["MON"], (9, 0), (10, 0), enabled=False),
+        _rule(["MON"], (25, 0), (26, 0)),
+        {"days": ["MON"], "startHour": "nine"},
+        _rule(["WEEKENDS"], (10, 0), (11, 0)),
+    ]
+
+    bits = compile_rules(rules)
+
+    assert not bits[_minute(MON, 9, 30)]
+    assert bits[_minute(SAT, 10, 30)] and bits[_minute(SUN, 10, 30)]
+    assert bits.sum() == 2 * 60
+
+
+def test_effective_rules_fall_back_to_the_daily_pair():
+    assert effective_rules([], "18:00", "23:00")[0]["startHour"] == 18
+    assert effective_rules([], "8pm", "23:00") == []
+    stored = [_rule(["MON"], (1, 0), (2, 0))]
+    assert effective_rules(stored, "18:00", "23:00") is stored
+
+
+def test_compiled_schedule_transitions():
+    schedule = CompiledSchedule.from_rules([_rule(["MON"], (9, 0), (17, 0))])
+
+    assert schedule.state_at(_minute(MON, 10))
+    assert not schedule.state_at(_minute(SUN, 10))
+    assert schedule.next_transition(_minute(MON, 10)) == _minute(MON, 17)
+    assert schedule.next_transition(_minute(MON, 18)) == _minute(MON, 9) + 7 * MINUTES_PER_DAY
+
+
+def test_fleet_evaluate_matches_each_device():
+    fleet = FleetSchedule.compile(
+        {
+            1: [_rule(["DAILY"], (18, 0), (6, 0))],
+            2: [_rule(["WEEKDAYS"], (9, 0), (17, 0))],
+            3: [_rule(["DAILY"], (0, 0), (0, 0)), _rule(["SAT"], (0, 0), (0, 0), action="OFF")],
+            4: [],  # unscheduled devices are left out
+        },
+        UTC,
+    )
+    # 2026-01-05 is a Monday
+    cases = {
+        datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc): [False, True, True],
+        datetime(2026, 1, 5, 23, 0, tzinfo=timezone.utc): [True, False, True],
+        datetime(2026, 1, 10, 3, 0, tzinfo=timezone.utc): [True, False, False],
+    }
+
+    assert fleet.restaurant_ids.tolist() == [1, 2, 3]
+    for at, expected in cases.items():
+        assert fleet.evaluate(at).tolist() == expected
+
+
+def test_fleet_evaluate_uses_the_schedule_timezone():
+    fleet = FleetSchedule.compile({1: [_rule(["MON"], (9, 0), (10, 0))]}, ZoneInfo("America/New_York"))
+
+    # 14:30 UTC is 09:30 in New York in January
+    assert fleet.evaluate(datetime(2026, 1, 5, 14, 30, tzinfo=timezone.utc)).tolist() == [True]
+    assert fleet.evaluate(datetime(2026, 1, 5, 9, 30, tzinfo=timezone.utc)).tolist() == [False]
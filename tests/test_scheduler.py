@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.services.async_repository import ThreadedLightRepository
+from app.services.light_service import LightService, SQLiteLightRepository
+from app.services.scheduler import LightScheduler
+from app.services.status_cache import StatusCache
+
+ALWAYS_ON = [{"days": ["DAILY"], "startHour": 0, "startMinute": 0, "endHour": 0, "endMinute": 0}]
+
+
+class FakeRepository:
+    """The slice of AsyncLightRepository the scheduler uses, over plain dicts."""
+
+    def __init__(self, states):
+        self.states = dict(states)
+        self.rules: dict[int, list[dict]] = {}
+        self.writes: list[dict[int, str]] = []
+        self.rule_reads: list[list[int] | None] = []
+        self.on_write = None
+
+    async def get_schedule_rules(self, restaurant_ids=None):
+        self.rule_reads.append(restaurant_ids)
+        ids = self.rules if restaurant_ids is None else restaurant_ids
+        return {rid: self.rules[rid] for rid in ids if rid in self.rules}
+
+    async def get_lights(self, restaurant_ids):
+        return {rid: {"state": self.states[rid]} for rid in restaurant_ids if rid in self.states}, []
+
+    async def set_lights(self, commands):
+        for rid, (state, _brightness) in commands.items():
+            self.states[rid] = state
+        self.writes.append({rid: state for rid, (state, _brightness) in commands.items()})
+        if self.on_write is not None:
+            self.on_write()
+        return {rid: {"state": self.states[rid]} for rid in commands}, {}
+
+
+def test_start_reconciles_lights_that_missed_their_transition():
+    repository = FakeRepository({1: "off", 2: "on"})
+    repository.rules = {1: ALWAYS_ON, 2: ALWAYS_ON}
+    scheduler = LightScheduler(repository)
+
+    async def main():
+        await scheduler.start()
+        await scheduler.stop()
+
+    asyncio.run(main())
+
+    assert repository.writes == [{1: "on"}]
+    assert scheduler.transitions_applied == 1
+
+
+def test_stale_heap_entries_are_skipped():
+    scheduler = LightScheduler(FakeRepository({}))
+    scheduler._load({1: ALWAYS_ON}, None)
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    scheduler._heap = [(past, 1, 0), (past, 1, scheduler._generation[1])]
+
+    assert scheduler._pop_due(datetime.now(timezone.utc)) == [1]
+
+
+def test_reschedule_during_apply_is_not_lost():
+    repository = FakeRepository({1: "off", 2: "off"})
+    scheduler = LightScheduler(repository, resync_seconds=3600)
+
+    async def main():
+        await scheduler.start()  # no schedules yet: nothing due, the loop sleeps for the resync interval
+        repository.rules = {1: ALWAYS_ON, 2: ALWAYS_ON}
+
+        def edit_second_schedule():
+            repository.on_write = None
+            scheduler.reschedule(2)
+
+        repository.on_write = edit_second_schedule
+        scheduler.reschedule(1)
+        try:
+            for _ in range(100):
+                if repository.states[2] == "on":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
+
+    assert repository.writes == [{1: "on"}, {2: "on"}]
+    assert repository.rule_reads == [None, [1], [2]]
+
+
+def test_applied_transitions_reach_the_status_listeners(sqlite_db):
+    service = LightService(ThreadedLightRepository(SQLiteLightRepository()))
+    service.status_cache = StatusCache(redis_url="")
+    service.add_status_listener(service.status_cache.put)
+    pushed = []
+    service.add_status_listener(pushed.append)
+    scheduler = LightScheduler(service.repository, on_written=service.lights_written)
+
+    async def main():
+        before = await service.get_status(311)  # cached
+        await scheduler._apply({311: "off" if before["state"] == "on" else "on"})
+        return before, await service.get_status(311)
+
+    before, after = asyncio.run(main())
+
+    assert after["state"] != before["state"]
+    assert [status["state"] for status in pushed] == [after["state"]]
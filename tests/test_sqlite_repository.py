@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from app.database.db import get_connection
+from app.services.light_service import SQLiteLightRepository
+
+
+@pytest.fixture
+def repository(sqlite_db):
+    return SQLiteLightRepository()
+
+
+@pytest.fixture
+def failing_history(sqlite_db):
+    """Make history inserts for restaurant 599 fail on this thread's connection."""
+    with get_connection() as conn:
+        conn.execute(
+            """
+            CREATE TEMP TRIGGER fail_history BEFORE INSERT ON light_history
+            WHEN NEW.restaurant_id = 599 BEGIN SELECT RAISE(ABORT, 'history write failed'); END
+            """
+        )
+    yield 599
+    with get_connection() as conn:
+        conn.execute("DROP TRIGGER temp.fail_history")
+
+
+def _history(restaurant_id):
+    with get_connection() as conn:
+        return [dict(row) for row in conn.execute(
+            "SELECT action, timestamp FROM light_history WHERE restaurant_id = ? ORDER BY id", (restaurant_id,)
+        )]
+
+
+def test_toggle_creates_the_row_and_records_history_with_the_same_time(repository):
+    first = repository.toggle_light(501)
+    second = repository.toggle_light(501)
+
+    assert (first["state"], second["state"]) == ("on", "off")
+    assert first["brightness"] > 0 and second["brightness"] == 0
+    assert _history(501) == [
+        {"action": "toggle_on", "timestamp": first["last_updated"]},
+        {"action": "toggle_off", "timestamp": second["last_updated"]},
+    ]
+
+
+def test_set_schedule_updates_and_records_history(repository):
+    updated = repository.set_schedule(502, "18:00", "23:00")
+
+    assert (updated["schedule_on"], updated["schedule_off"]) == ("18:00", "23:00")
+    assert repository.get_or_create_light(502)["schedule_on"] == "18:00"
+    assert [row["timestamp"] for row in _history(502)] == [updated["last_updated"]]
+
+
+def test_failed_history_insert_rolls_back_the_toggle(repository, failing_history):
+    before = repository.get_or_create_light(failing_history)
+
+    with pytest.raises(sqlite3.DatabaseError):
+        repository.toggle_light(failing_history)
+
+    assert repository.get_or_create_light(failing_history) == before
+    assert _history(failing_history) == []
+
+
+def test_failed_history_insert_rolls_back_the_schedule(repository, failing_history):
+    before = repository.get_or_create_light(failing_history)
+
+    with pytest.raises(sqlite3.DatabaseError):
+        repository.set_schedule(failing_history, "06:00", "07:00")
+
+    assert repository.get_or_create_light(failing_history) == before
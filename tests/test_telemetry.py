@@ -0,0 +1,161 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app.services.telemetry as telemetry
+from app.services.telemetry import MongoTelemetryStore, Reading, TelemetryIngestor, decode_readings, reading_id
+
+RECEIVED_AT = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _reading(**fields):
+    item = {"deviceId": "ESP32_1", "V": 120.0, "I": 0.5, "P": 60.0, "uptime": 10}
+    item.update(fields)
+    return item
+
+
+def _errors(items):
+    readings, rejected = decode_readings(items, received_at=RECEIVED_AT)
+    return readings, {entry["index"]: entry["error"] for entry in rejected}
+
+
+def test_good_readings_are_decoded():
+    readings, errors = _errors(
+        [_reading(), _reading(timestamp=1767268800), _reading(timestamp="2026-01-01T07:00:00-05:00")]
+    )
+
+    assert errors == {}
+    assert [reading.timestamp for reading in readings] == [RECEIVED_AT] * 3  # default is the receive time
+    assert readings[0] == Reading("ESP32_1", RECEIVED_AT, 120.0, 0.5, 60.0, 10)
+
+
+def test_malformed_readings_are_rejected_one_by_one():
+    readings, errors = _errors(
+        [
+            "not an object",
+            _reading(deviceId=""),
+            _reading(V=True),
+            _reading(P=float("nan")),
+            _reading(uptime=-1),
+            _reading(),
+        ]
+    )
+
+    assert len(readings) == 1
+    assert errors == {
+        0: "reading must be an object",
+        1: "deviceId is required",
+        2: "V, I and P must be finite numbers",
+        3: "V, I and P must be finite numbers",
+        4: "uptime must be a non-negative integer",
+    }
+
+
+@pytest.mark.parametrize("timestamp", [1e20, 10**12, "0001-01-01T00:00:00+05:00", "yesterday", -1])
+def test_unrepresentable_timestamps_reject_only_their_reading(timestamp):
+    readings, errors = _errors([_reading(timestamp=timestamp), _reading()])
+
+    assert errors == {0: "timestamp must be ISO 8601 or epoch seconds"}
+    assert len(readings) == 1
+
+
+def test_timestamps_ahead_of_the_server_clock_have_their_own_error():
+    ahead = RECEIVED_AT + telemetry.TELEMETRY_MAX_CLOCK_SKEW + timedelta(seconds=1)
+
+    readings, errors = _errors([_reading(timestamp=ahead.isoformat())])
+
+    assert readings == []
+    assert errors == {0: "timestamp is ahead of the server clock"}
+
+
+def test_topic_device_id_overrides_the_payload():
+    readings, _rejected = decode_readings(_reading(deviceId="spoofed"), device_id="ESP32_7")
+
+    assert readings[0].device_id == "ESP32_7"
+
+
+def test_reading_id_is_stable_per_reading():
+    reading = Reading("ESP32_1", RECEIVED_AT, 120.0, 0.5, 60.0, 10)
+
+    assert reading_id(reading) == reading_id(reading._replace(voltage=119.0))
+    assert reading_id(reading) != reading_id(reading._replace(uptime=11))
+    assert reading_id(reading).generation_time == RECEIVED_AT
+
+
+def test_batch_endpoint_reports_rejections_without_failing_the_batch(client):
+    items = [_reading(deviceId="801", timestamp=1e20), _reading(deviceId="801")]
+
+    response = client.post("/telemetry/batch", json=items)
+
+    assert response.status_code == 202
+    assert response.json() == {
+        "accepted": 1,
+        "rejected": 1,
+        "errors": [{"index": 0, "error": "timestamp must be ISO 8601 or epoch seconds"}],
+    }
+
+
+class Store:
+    def __init__(self):
+        self.inserted = []
+        self.statuses = []
+
+    async def insert_readings(self, readings):
+        self.inserted.extend(readings)
+
+    async def update_device_status(self, latest):
+        self.statuses.append(dict(latest))
+
+
+def test_submit_times_out_only_before_anything_is_buffered():
+    readings = [Reading(f"ESP32_{i}", RECEIVED_AT, 120.0, 0.5, 60.0, i) for i in range(3)]
+
+    async def main():
+        ingestor = TelemetryIngestor(Store(), batch_size=2, max_pending=4)
+        ingestor.offer(readings[:2])
+        with pytest.raises(asyncio.TimeoutError):
+            await ingestor.submit(readings, timeout=0.05)
+        pending_after_timeout = ingestor.stats()["pending"]
+        await ingestor.start()
+        await ingestor.submit(readings, timeout=1)
+        await ingestor.close()
+        return ingestor, pending_after_timeout
+
+    ingestor, pending_after_timeout = asyncio.run(main())
+
+    assert pending_after_timeout == 2  # the timed-out batch left nothing behind
+    assert ingestor.stats()["accepted"] == 5
+    assert len(ingestor.store.inserted) == 5
+
+
+def test_device_status_is_refreshed_at_most_once_per_interval():
+    store = Store()
+    first = Reading("ESP32_1", RECEIVED_AT, 120.0, 0.5, 60.0, 10)
+    later = first._replace(timestamp=RECEIVED_AT + timedelta(seconds=5), uptime=15)
+
+    async def main():
+        ingestor = TelemetryIngestor(store, status_interval_seconds=60)
+        await ingestor.submit([first, later])
+        await ingestor.submit([later._replace(uptime=20)])
+
+    asyncio.run(main())
+
+    assert store.statuses == [{"ESP32_1": later}]
+    assert len(store.inserted) == 3
+
+
+def test_mongo_store_tags_readings_with_device_metadata(mongo_devices, monkeypatch):
+    monkeypatch.setattr(telemetry, "get_async_mongo_db", lambda: mongo_devices)
+    reading = Reading("ESP32_2", RECEIVED_AT, 120.0, 0.5, 60.0, 10)
+
+    async def main():
+        store = MongoTelemetryStore()
+        await store.insert_readings([reading])
+
+    asyncio.run(main())
+
+    stored = mongo_devices.sync.Time_Data.find_one()
+    assert stored["_id"] == reading_id(reading)
+    assert stored["metadata"] == {"deviceId": "ESP32_2", "restaurant": "Restaurant 2", "restaurantId": "mcd_2"}
+    assert stored["measurements"]["P"] == 60.0
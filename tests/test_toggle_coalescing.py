@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.services.async_repository import ThreadedLightRepository
+from app.services.light_service import LightService, SQLiteLightRepository
+
+
+@pytest.fixture
+def service(sqlite_db):
+    return LightService(ThreadedLightRepository(SQLiteLightRepository()), coalesce_window_ms=50)
+
+
+def _tap(service, restaurant_id, taps):
+    async def main():
+        before = await service.get_status(restaurant_id)
+        results = await asyncio.gather(*(service.toggle_light(restaurant_id) for _ in range(taps)))
+        history, _cursor = await service.get_history(restaurant_id)
+        return before, results, history
+
+    return asyncio.run(main())
+
+
+def test_odd_burst_is_one_toggle(service):
+    before, results, history = _tap(service, 301, 3)
+
+    assert {result["state"] for result in results} == {"off" if before["state"] == "on" else "on"}
+    assert len({result["lastUpdated"] for result in results}) == 1
+    assert len(history) == 1
+    assert service.toggles_coalesced == 2
+
+
+def test_even_burst_changes_nothing(service):
+    before, results, history = _tap(service, 302, 4)
+
+    assert all(result == before for result in results)
+    assert history == []
+
+
+def test_taps_in_separate_windows_each_toggle(service):
+    async def main():
+        first = await service.toggle_light(303)
+        second = await service.toggle_light(303)
+        history, _cursor = await service.get_history(303)
+        return first, second, history
+
+    first, second, history = asyncio.run(main())
+
+    assert first["state"] != second["state"]
+    assert len(history) == 2
+
+
+def test_no_window_toggles_every_tap(sqlite_db):
+    service = LightService(ThreadedLightRepository(SQLiteLightRepository()), coalesce_window_ms=0)
+
+    _before, _results, history = _tap(service, 304, 2)
+
+    assert len(history) == 2
+    assert service.toggles_coalesced == 0